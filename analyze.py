@@ -1,218 +1,298 @@
-from transformers import pipeline
-import pdfplumber
-from docx import Document
-from bs4 import BeautifulSoup
-from lxml import etree
 from collections import Counter
-from ocr import ocr
-import csv
-import json
-import pptx
-import zipfile
-import sqlite3
-from email import message_from_file
-import ebooklib
-import shutil
-import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from collections import Counter
-from transformers import pipeline
+from ner_engine import NEREngine, MAX_TOKENS, STRIDE
+from ner_backends import BACKENDS, create_backend
+from extract import extract_texts, IMAGE_EXTENSIONS, DEFAULT_MAX_CHARS
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+import multiprocessing
+import threading
+import contextlib
+import queue
+import functools
+import time
+import metrics
+import models
+import userspace_fs
+
+# Pipelines built for inference workers are kept per backend and handed to the workers of later calls
+_worker_pipelines = {}
+_worker_lock = threading.Lock()
+
+for _name in BACKENDS:
+    models.register(f"ner-{_name}", functools.partial(create_backend, _name))
+
+
+def load_ner_backend(backend="torch"):
+    # Loaded once per process and shared by every analysis call
+    return models.get(f"ner-{backend}")
 
 
-def analyze_file(file_path, ner_pipeline, score_threshold):
+@contextlib.contextmanager
+def worker_pipeline(backend="torch"):
+    # Every worker shares the model weights but needs its own tokenizer instance
+    with _worker_lock:
+        idle = _worker_pipelines.setdefault(backend, [])
+        ner_pipeline = idle.pop() if idle else None
+    if ner_pipeline is None:
+        ner_pipeline = load_ner_backend(backend).create_pipeline()
     try:
-        print(f"[INFO] Starting analysis of file: {file_path}")
-        if file_path.lower().endswith(".pdf"):
-            print(f"[INFO] Extracting text from PDF: {file_path}")
-            text = extract_text_from_pdf(file_path)
-        elif file_path.lower().endswith((".txt", ".log", ".eml")):
-            print(f"[INFO] Reading text from TXT/LOG/EML: {file_path}")
-            with open(file_path, "r", encoding="utf-8") as file:
-                text = file.read()
-        elif file_path.lower().endswith(".docx"):
-            print(f"[INFO] Extracting text from DOCX: {file_path}")
-            text = extract_text_from_docx(file_path)
-        elif file_path.lower().endswith((".html", ".xml")):
-            print(f"[INFO] Extracting text from HTML/XML: {file_path}")
-            text = extract_text_from_html(file_path)
-        elif file_path.lower().endswith(".csv"):
-            print(f"[INFO] Extracting text from CSV: {file_path}")
-            text = extract_text_from_csv(file_path)
-        elif file_path.lower().endswith(".json"):
-            print(f"[INFO] Extracting text from JSON: {file_path}")
-            text = extract_text_from_json(file_path)
-        elif file_path.lower().endswith(".pptx"):
-            print(f"[INFO] Extracting text from PPTX: {file_path}")
-            text = extract_text_from_pptx(file_path)
-        elif file_path.lower().endswith(".odt"):
-            print(f"[INFO] Extracting text from ODT: {file_path}")
-            text = extract_text_from_odt(file_path)
-        elif file_path.lower().endswith(".md"):
-            print(f"[INFO] Extracting text from Markdown: {file_path}")
-            text = extract_text_from_md(file_path)
-        elif file_path.lower().endswith(".msg"):
-            print(f"[INFO] Extracting text from MSG: {file_path}")
-            text = extract_text_from_msg(file_path)
-        elif file_path.lower().endswith(".epub"):
-            print(f"[INFO] Extracting text from EPUB: {file_path}")
-            text = extract_text_from_epub(file_path)
-        elif file_path.lower().endswith(".db") or file_path.lower().endswith(".sqlite"):
-            print(f"[INFO] Extracting text from Database: {file_path}")
-            text = extract_text_from_db(file_path)
-        elif file_path.lower().endswith((".png", ".jpeg", ".jpg")):
-            print(f"[INFO] Performing OCR on Image: {file_path}")
-            text = ocr(file_path)
-        else:
-            print(f"[WARNING] Unsupported file format: {file_path}")
-            return file_path, None  # Unsupported file format
-
-        print(f"[INFO] Running NER model on file: {file_path}")
-        ner_results = ner_pipeline(text)
-        filtered_results = [entity for entity in ner_results if entity['score'] >= score_threshold]
-        print(f"[INFO] Completed NER for file: {file_path} ({len(filtered_results)} entities detected)")
-        return file_path, filtered_results
-
-    except Exception as e:
-        print(f"[ERROR] Exception during analysis of file {file_path}: {e}")
-
-def analyze_files(file_paths, output_file, score_threshold=0.90, max_workers=4):
-    ner_pipeline = pipeline("token-classification", model='lakshyakh93/deberta_finetuned_pii', device=-1, aggregation_strategy="simple")
+        yield ner_pipeline
+    finally:
+        with _worker_lock:
+            _worker_pipelines[backend].append(ner_pipeline)
+
+
+def analysis_stage(backend="torch", max_chars=DEFAULT_MAX_CHARS, score_threshold=0.90):
+    # Inventory stage of the NER results: results are reused only under the settings that produced them
+    return f"analysis:{backend}:{max_chars}:{MAX_TOKENS}/{STRIDE}:{score_threshold}"
+
+
+def write_result(store, file_path, filtered_results):
+    if isinstance(filtered_results, list):
+        store.add_entities(file_path, filtered_results)
+    elif isinstance(filtered_results, str):
+        store.add_file_result(file_path, "analysis", "error", filtered_results)
+    else:
+        store.add_file_result(file_path, "analysis", "unsupported")
+
+
+def analyze_files(entries, store, score_threshold=0.90, extract_workers=4, inference_workers=1, queue_depth=32,
+                  on_result=None, cache=None, batch_size=16, ocr_batch_size=8, max_chars=DEFAULT_MAX_CHARS,
+                  detectors=None, on_detection=None, extractors=None, inference_slots=None, backend="torch", file_types=None,
+                  deadline=None, on_skip=None):
+    # detectors: name -> (function(text), select(file_path)), both picklable; a detector runs in the extraction processes
+    # on the already extracted text of the files it selects, and its results are reported per selected path through
+    # on_detection(name, file_path, result)
+    # extractors and inference_slots: process pool and semaphore shared by concurrent calls, so they stay within one budget
+    # deadline: time.monotonic() after which no new files are started; files already started are finished and
+    # the rest are reported through on_skip(file_path, "deadline")
+    load_ner_backend(backend)
+    stage = analysis_stage(backend, max_chars, score_threshold)
+    detectors = detectors or {}
     results = {}
+    known = {}        # digest -> (entities, detections) of content already analyzed in this run
+    waiting = {}      # digest -> paths sharing the content being analyzed
+    detected = {}     # digest -> detections of the content being analyzed
+    in_flight = {}    # future -> digests (or paths when the files were not hashed) of its batch
+    sizes = {}        # digest -> size in bytes of the content being analyzed
+    lock = threading.Lock()
+    extracted = queue.Queue(maxsize=queue_depth)
+    done = object()
+
+    def selected(file_path):
+        return [name for name, (_, select) in detectors.items() if select(file_path)]
+
+    def attach(file_path, filtered_results, detections):
+        results[file_path] = filtered_results
+        write_result(store, file_path, filtered_results)
+        if on_result:
+            on_result(file_path, filtered_results)
+        if on_detection:
+            for name in selected(file_path):
+                if name in detections:
+                    on_detection(name, file_path, detections[name])
+
+    def finish(key, filtered_results):
+        with lock:
+            file_paths = waiting.pop(key)
+            detections = detected.pop(key, {})
+            try:
+                if key != file_paths[0]:
+                    known[key] = (filtered_results, detections)
+                    if cache:
+                        cache.store_content_result(key, stage, filtered_results)
+                        for name, result in detections.items():
+                            cache.store_content_result(key, name, result)
+                for file_path in file_paths:
+                    attach(file_path, filtered_results, detections)
+                print(f"[INFO] Successfully wrote results for file: {file_paths[0]}"
+                      + (f" and {len(file_paths) - 1} duplicate(s)" if len(file_paths) > 1 else ""))
+            except Exception as e:
+                print(f"[ERROR] Exception while writing results for {file_paths[0]}: {e}")
+
+    def fail(key, error):
+        with lock:
+            file_paths = waiting.pop(key)
+            detected.pop(key, None)
+        print(f"[ERROR] Exception during analysis of file {file_paths[0]}: {error}")
+        for file_path in file_paths:
+            store.add_file_result(file_path, "analysis", "error", error)
+
+    def lookup(digest, file_path):
+        # Content counts as known only when the NER result and the result of every detector selecting file_path are
+        # known from this run or the cache
+        if digest not in known and cache:
+            stored = cache.content_result(digest, stage)
+            if stored["status"] == "done":
+                known[digest] = (stored["result"], {})
+        if digest not in known:
+            return False
+
+        detections = known[digest][1]
+        for name in selected(file_path):
+            if name not in detections and cache:
+                stored = cache.content_result(digest, name)
+                if stored["status"] == "done":
+                    detections[name] = stored["result"]
+        return all(name in detections for name in selected(file_path))
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_file = {executor.submit(analyze_file, file_path, ner_pipeline, score_threshold): file_path for file_path in file_paths}
-        with open(output_file, "a", encoding="utf-8") as result_file:
-            for future in as_completed(future_to_file):
-                file_path = future_to_file[future]
+    def forward(future):
+        keys = in_flight.pop(future)
+        try:
+            outputs = future.result()
+        except Exception as e:
+            outputs = [(None, str(e), {}, None)] * len(keys)
+
+        for key, (text, error, detections, stats) in zip(keys, outputs):
+            if stats:
+                # seconds and cpu_seconds add up the time of the extraction processes, not the wall time
+                with lock:
+                    file_path, size = waiting[key][0], sizes.pop(key, 0)
+                metrics.record(stats["stage"], metrics.extension_of(file_path), files=1, bytes=size,
+                               seconds=stats["seconds"], cpu_seconds=stats["cpu_seconds"],
+                               characters=stats["characters"], errors=int(error is not None))
+                metrics.observe("extraction_worker_peak_rss_bytes", stats["peak_rss_bytes"])
+                metrics.record("sniffing", stats["sniffed"], files=1, skipped=stats["skipped"])
+                if stats.get("ocr_batch_size"):
+                    metrics.observe("ocr_recognition_batch_size", stats["ocr_batch_size"])
+            if error is not None:
+                fail(key, error)
+                continue
+
+            with lock:
+                detected[key] = detections
+            if text is None:
+                finish(key, None)
+            else:
+                # Blocks while the inference workers are behind, which in turn stops new extractions
+                extracted.put((key, text))
+                metrics.observe("analysis_queue_depth", extracted.qsize())
+
+    def submit(batch):
+        future = extractors.submit(metrics.run_profiled, "extraction", metrics.profile_directory(),
+                                   extract_texts, [file_path for file_path, _ in batch], max_chars, detectors, file_types)
+        in_flight[future] = [key for _, key in batch]
+        metrics.observe("extraction_in_flight", len(in_flight))
+        if len(in_flight) >= extract_workers * 2:
+            completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in completed:
+                forward(future)
+
+    def discard(future):
+        # Releases the spilled texts of a batch that is never forwarded to the inference workers
+        if future.cancel():
+            return
+        try:
+            outputs = future.result()
+        except Exception:
+            return
+        for text, _, _, _ in outputs:
+            if text is not None:
+                text.release()
+
+    def documents():
+        # Only ends at the sentinel, so a worker that fails can drain the queue through the same generator
+        while (item := extracted.get()) is not done:
+            key, text = item
+            try:
+                content = text.read()
+            except OSError as e:
+                fail(key, str(e))
+                continue
+            finally:
+                text.release()
+            yield key, content
+
+    def infer():
+        stream = documents()
+        try:
+            with metrics.profiled("inference"), worker_pipeline(backend) as ner_pipeline:
+                engine = NEREngine(ner_pipeline, batch_size=batch_size, slots=inference_slots)
                 try:
-                    file_path, filtered_results = future.result()
-                    results[file_path] = filtered_results
-
-                    result_file.write(f"Analysis of file: {file_path}\n\n")
-                    if isinstance(filtered_results, list) and filtered_results:
-                        for entity in filtered_results:
-                            result_file.write(f"Entity: {entity['word']}\nType: {entity['entity_group']}\n"
-                                              f"Score: {entity['score']:.4f}\nStart: {entity['start']}\nEnd: {entity['end']}\n\n")
-                    elif isinstance(filtered_results, str):
-                        result_file.write(f"Error: {filtered_results}\n\n")
-                    else:
-                        result_file.write("No entities detected above the threshold.\n\n")
-                    result_file.write("-" * 50 + "\n\n")
-
-                    print(f"[INFO] Successfully wrote results for file: {file_path}")
-                except Exception as e:
-                    print(f"[ERROR] Exception while writing results for {file_path}: {e}")
+                    # A failing batch only fails its documents; the others keep going
+                    for key, entities in engine.run(stream, on_error=fail):
+                        filtered_results = [dict(entity, score=float(entity['score'])) for entity in entities if entity['score'] >= score_threshold]
+                        print(f"[INFO] Completed NER for file: {waiting[key][0]} ({len(filtered_results)} entities detected)")
+                        finish(key, filtered_results)
+                finally:
+                    metrics.record("ner", documents=engine.documents, windows=engine.windows, tokens=engine.tokens,
+                                   inference_seconds=engine.seconds)
+        except Exception as e:
+            # Keep draining so extraction is not blocked on a full queue. A new documents() would wait forever
+            # when this worker has already taken its sentinel.
+            for key, _ in stream:
+                fail(key, f"NER worker failed: {e}")
+            raise
+
+    with contextlib.ExitStack() as stack:
+        if extractors is None:
+            extractors = stack.enter_context(
+                ProcessPoolExecutor(max_workers=extract_workers, mp_context=multiprocessing.get_context("forkserver"),
+                                    initializer=userspace_fs.register_all, initargs=(userspace_fs.registered(),)))
+        inference = stack.enter_context(ThreadPoolExecutor(max_workers=inference_workers))
+        workers = [inference.submit(infer) for _ in range(inference_workers)]
+        images = []
+        expired = False
+
+        try:
+            for entry in entries:
+                if not expired and deadline is not None and time.monotonic() >= deadline:
+                    print("[WARNING] Time budget used up; remaining files are not analyzed.")
+                    expired = True
+                if expired:
+                    if on_skip:
+                        on_skip(entry.path, "deadline")
+                    continue
+
+                key = entry.digest or entry.path
+
+                with lock:
+                    if key in waiting:
+                        waiting[key].append(entry.path)
+                        continue
+
+                    if entry.digest and lookup(entry.digest, entry.path):
+                        print(f"[INFO] Reusing results of identical content for file: {entry.path}")
+                        attach(entry.path, *known[entry.digest])
+                        continue
+
+                    waiting[key] = [entry.path]
+                    sizes[key] = entry.size
+
+                if entry.path.lower().endswith(IMAGE_EXTENSIONS):
+                    # Images are recognized in batches so the OCR models run on several at once
+                    images.append((entry.path, key))
+                    if len(images) >= ocr_batch_size:
+                        submit(images)
+                        images = []
+                else:
+                    submit([(entry.path, key)])
+
+            if images:
+                submit(images)
+
+            for future in as_completed(list(in_flight)):
+                forward(future)
+        finally:
+            # Batches still in flight when the loop failed were never queued, so their texts are released here
+            for future in list(in_flight):
+                in_flight.pop(future)
+                discard(future)
+            for _ in workers:
+                extracted.put(done)
+
+        wait(workers)
+        # Texts an inference worker that failed outright left in the queue
+        while not extracted.empty():
+            item = extracted.get_nowait()
+            if item is not done:
+                item[1].release()
+        for worker in workers:
+            worker.result()
 
     print("[INFO] Completed analysis for all files.")
     return results
 
 
-def extract_text_from_pdf(pdf_path):
-    text = ""
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            text += page.extract_text() or ""
-    return text
-
-def extract_text_from_docx(docx_path):
-    text = ""
-    doc = Document(docx_path)
-    for paragraph in doc.paragraphs:
-        text += paragraph.text + "\n"
-    return text
-
-def extract_text_from_html(html_path):
-    with open(html_path, "r", encoding="utf-8") as file:
-        soup = BeautifulSoup(file, "html.parser")
-        return soup.get_text()
-    
-def extract_text_from_xml(xml_path):
-    with open(xml_path, "rb") as file:
-        tree = etree.parse(file)
-    return " ".join(tree.xpath("//text()"))
-
-def extract_text_from_csv(csv_path):
-    text = ""
-    with open(csv_path, "r", encoding="utf-8") as file:
-        reader = csv.reader(file)
-        for row in reader:
-            text += " ".join(row) + "\n"
-    return text
-
-def extract_text_from_json(json_path):
-    with open(json_path, "r", encoding="utf-8") as file:
-        data = json.load(file)
-    return json.dumps(data)
-
-def extract_text_from_pptx(pptx_path):
-    text = ""
-    presentation = pptx.Presentation(pptx_path)
-    for slide in presentation.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text"):
-                text += shape.text + "\n"
-    return text
-
-def extract_text_from_odt(odt_path):
-    text = ""
-    with zipfile.ZipFile(odt_path) as zf:
-        xml_content = zf.read("content.xml")
-        tree = etree.XML(xml_content)
-        text = " ".join(tree.xpath("//text:p//text()"))
-    return text
-
-def extract_text_from_md(md_path):
-    with open(md_path, "r", encoding="utf-8") as file:
-        return file.read()
-
-def extract_text_from_msg(msg_path):
-    with open(msg_path, "r", encoding="utf-8") as file:
-        content = file.read()
-    return content
-
-def extract_text_from_eml(eml_path):
-    with open(eml_path, "r", encoding="utf-8") as file:
-        msg = message_from_file(file)
-        return msg.get_payload(decode=True).decode("utf-8", errors="ignore")
-
-def extract_text_from_epub(epub_path):
-    book = ebooklib.epub.read_epub(epub_path)
-    text = ""
-    for item in book.get_items():
-        if item.get_type() == ebooklib.ITEM_DOCUMENT:
-            text += item.get_body_content().decode("utf-8")
-    return text
-
-def extract_text_from_db(db_path):
-    temp_folder = './temp'
-    os.makedirs(temp_folder, exist_ok=True)
-
-    db_name = os.path.basename(db_path)
-    db_copy_path = os.path.join(temp_folder, db_name)
-
-    shutil.copy(db_path, db_copy_path)
-
-    os.chmod(db_copy_path, 0o555)
-
-    text = ""
-    conn = sqlite3.connect(db_copy_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
-
-    for table in tables:
-        table_name = table[0]
-        cursor.execute(f"SELECT * FROM {table_name}")
-        rows = cursor.fetchall()
-        for row in rows:
-            text += " ".join(str(col) for col in row) + "\n"
-
-    conn.close()
-
-    os.remove(db_copy_path)
-
-    return text
-
 def count_entities(results):
     if results:
         entity_groups = []
@@ -0,0 +1,228 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import extract
+from ner_engine import NEREngine
+from paths import scan_partition, detect_users
+from email_finder import search_emails_in_files, EMAIL_EXTENSIONS
+from social_analyze import extract_social_media_data
+from findings import FindingsStore
+from synthetic_tree import build_tree
+
+# Extraction readers measured one by one, by file extension
+READERS = {
+    ".txt": extract.iter_text_from_plain,
+    ".pdf": extract.iter_text_from_pdf,
+    ".docx": extract.iter_text_from_docx,
+    ".csv": extract.iter_text_from_csv,
+    ".json": extract.iter_text_from_json,
+    ".db": extract.iter_text_from_db,
+}
+IMAGE_READERS = {".png": extract.iter_text_from_image, ".jpg": extract.iter_text_from_image}
+
+
+class StubTokenizer:
+    def __call__(self, text, **kwargs):
+        return {"offset_mapping": [match.span() for match in re.finditer(r"\S+", text)]}
+
+
+class StubPipeline:
+    # Stands in for the NER model: capitalized word pairs are names. Measures windowing and batching without a model.
+    pattern = re.compile(r"\b[A-Z][a-z]+ [A-Z][a-z]+\b")
+
+    def __init__(self):
+        self.tokenizer = StubTokenizer()
+
+    def __call__(self, texts, batch_size=1):
+        return [
+            [{"entity_group": "NAME", "word": match.group(), "score": 0.99, "start": match.start(), "end": match.end()}
+             for match in self.pattern.finditer(text)]
+            for text in texts
+        ]
+
+
+def measure(function, items=None, size=None):
+    started, cpu_started = time.perf_counter(), time.process_time()
+    result = function()
+    seconds = time.perf_counter() - started
+    stats = {"seconds": round(seconds, 4), "cpu_seconds": round(time.process_time() - cpu_started, 4)}
+    if items is not None:
+        stats["items"] = items(result) if callable(items) else items
+        stats["items_per_sec"] = round(stats["items"] / seconds, 2) if seconds else None
+    if size is not None:
+        stats["bytes"] = size
+        stats["bytes_per_sec"] = round(size / seconds, 1) if seconds else None
+    return result, stats
+
+
+def read_all(reader, file_paths):
+    characters = 0
+    for file_path in file_paths:
+        for segment in reader(file_path):
+            characters += len(segment.text)
+    return characters
+
+
+def create_ner_pipeline(backend, model):
+    if backend == "stub":
+        return StubPipeline()
+    from ner_backends import create_backend
+    return create_backend(backend, model).create_pipeline()
+
+
+def run_benchmarks(root, manifest, args, work_dir):
+    stages = {}
+
+    entries, stages["discovery"] = measure(lambda: list(scan_partition(root, True)), items=len)
+    files = [entry for entry in entries if entry.type == "file"]
+    by_extension = {}
+    for entry in files:
+        by_extension.setdefault(os.path.splitext(entry.name)[1].lower(), []).append(entry)
+
+    readers = dict(READERS, **(IMAGE_READERS if args.ocr else {}))
+    documents = []
+    for extension, reader in readers.items():
+        selected = by_extension.get(extension, [])
+        if not selected:
+            continue
+        characters, stages[f"extract{extension}"] = measure(lambda: read_all(reader, [entry.path for entry in selected]),
+                                                             items=len(selected), size=sum(entry.size for entry in selected))
+        stages[f"extract{extension}"]["characters"] = characters
+        documents.extend(selected)
+
+    texts = [(entry.path, extract.extract_text(entry.path)) for entry in documents[:args.ner_documents]]
+    texts = [(key, text) for key, text in texts if text]
+    engine = NEREngine(create_ner_pipeline(args.ner_backend, args.model), batch_size=args.batch_size)
+    list(engine.run(texts[:1]))
+    _, stages["ner"] = measure(lambda: list(engine.run(texts)), items=len(texts), size=sum(len(text) for _, text in texts))
+    stages["ner"]["backend"] = args.ner_backend
+
+    store = FindingsStore(root, os.path.join(work_dir, "findings.db"))
+    email_files = [entry for entry in files if entry.name.lower().endswith(tuple(EMAIL_EXTENSIONS))]
+    emails, stages["emails"] = measure(
+        lambda: search_emails_in_files([entry.path for entry in email_files], store=store, max_workers=args.workers),
+        items=len(email_files), size=sum(entry.size for entry in email_files)
+    )
+    stages["emails"]["emails_found"] = len(emails)
+
+    users = detect_users(root, "Linux")["users"]
+    social, stages["social"] = measure(lambda: extract_social_media_data(root, "Linux", users, store),
+                                       items=manifest["history_rows"])
+    store.close()
+
+    from generate_report import generate_pdf_report
+    report_path = os.path.join(work_dir, "report.pdf")
+    _, stages["report"] = measure(lambda: generate_pdf_report(
+        {root: {"status": "ok", "type": "Linux", "details": {}}}, {root: {"status": "ok", "users": users}}, root,
+        None, emails, [social], {"Name": "", "Surname": "", "Nr": "benchmark"},
+        output_path=report_path, store=store
+    ))
+    stages["report"]["bytes"] = os.path.getsize(report_path) if os.path.exists(report_path) else None
+    return stages
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, max_slowdown, min_seconds=0.05):
+    # Prints the time of every stage relative to a previous result file; returns the stages slower than max_slowdown.
+    # Stages shorter than min_seconds in both runs are too noisy to count as regressions.
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("arguments") != results["arguments"]:
+        print(f"[WARNING] {baseline_path} was measured with different arguments: {baseline.get('arguments')}")
+
+    regressions = []
+    for name, stats in results["stages"].items():
+        previous = baseline["stages"].get(name)
+        if not previous or not previous["seconds"]:
+            continue
+        ratio = stats["seconds"] / previous["seconds"]
+        print(f"[INFO] {name}: {stats['seconds']}s vs {previous['seconds']}s ({ratio:.2f}x)")
+        if ratio > max_slowdown and max(stats["seconds"], previous["seconds"]) >= min_seconds:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Benchmarks every stage on a synthetic partition tree, without a disk image. "
+            "The tree is generated from a seed, so runs with the same --seed and --scale see the same files."
+        )
+    )
+    parser.add_argument('--scale', type=int, default=1, help="Multiplies the number of generated files and history rows.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the generated tree.")
+    parser.add_argument('--users', type=int, default=2, help="Number of user home directories in the tree.")
+    parser.add_argument('--workers', type=int, default=4, help="Number of processes of the email stage.")
+    parser.add_argument('--ner-backend', choices=['stub', 'torch', 'onnx'], default='stub',
+                        help="NER implementation. 'stub' measures the engine without a model; the others load --model.")
+    parser.add_argument('--model', default=None, help="Model name or local model directory for the torch and onnx backends. Default: the PII model.")
+    parser.add_argument('--ner-documents', type=int, default=200, help="Maximum number of documents sent to the NER stage.")
+    parser.add_argument('--batch-size', type=int, default=16, help="Number of windows per NER batch.")
+    parser.add_argument('--ocr', action='store_true', help="Also benchmark OCR on the generated images (needs the OCR models).")
+    parser.add_argument('--tree', default=None, help="Where to build the tree. By default a temporary directory, removed afterwards.")
+    parser.add_argument('--output', default=None, help="Result file. Default: ./results/benchmark_<time>.json")
+    parser.add_argument('--baseline', default=None, help="Previous result file to compare the stage times with.")
+    parser.add_argument('--max-slowdown', type=float, default=1.25, help="Stage time ratio against --baseline reported as a regression.")
+    parser.add_argument('--verbose', action='store_true', help="Keep the per-file output of the stages.")
+    args = parser.parse_args()
+    if args.ner_backend != 'stub' and not args.model:
+        from ner_backends import MODEL_NAME
+        args.model = MODEL_NAME
+
+    work_dir = tempfile.mkdtemp(prefix="benchmark_", dir=os.path.abspath("./temp") if os.path.isdir("./temp") else None)
+    root = os.path.abspath(args.tree or os.path.join(work_dir, "tree"))
+    try:
+        print(f"[INFO] Building synthetic tree in {root} (scale {args.scale}, seed {args.seed})")
+        manifest, build = measure(lambda: build_tree(root, args.scale, args.seed, args.users))
+        print(f"[INFO] Built {sum(manifest['files'].values())} files in {build['seconds']}s")
+
+        # Per-file output would otherwise be measured as well
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            stages = run_benchmarks(root, manifest, args, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "started": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": current_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "arguments": {key: value for key, value in vars(args).items() if key not in ("tree", "output", "baseline", "max_slowdown", "verbose")},
+        "tree": manifest,
+        "stages": stages,
+    }
+    for name, stats in stages.items():
+        print(f"[INFO] {name}: {stats['seconds']}s" + (f", {stats['items_per_sec']} items/s" if stats.get("items_per_sec") else ""))
+
+    output = args.output or f"./results/benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"[INFO] Results written to: {output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.max_slowdown)
+        if regressions:
+            print(f"[ERROR] Slower than the baseline: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
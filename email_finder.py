@@ -1,108 +1,210 @@
 import re
 import os
-import json
-import csv
-import pdfplumber
+import mmap
+import contextlib
 import sqlite3
 import mailbox
-from email import message_from_file
+import threading
+import multiprocessing
+import metrics
+import userspace_fs
+from extract import iter_text_from_pdf, iter_text_from_db
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
-def search_emails_in_files(file_paths, output_file):
-    email_pattern = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
-    all_found_emails = set()
+EMAIL_PATTERN = re.compile(rb'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+# Any byte that can never be part of a match; chunks are only split on these
+SEPARATOR_PATTERN = re.compile(rb'[^a-zA-Z0-9._%+\-@]')
 
+# Formats whose text is not stored as plain bytes and has to be decoded first
+CONTAINER_EXTENSIONS = ("pdf", "mbox", "sqlite", "db")
+EMAIL_EXTENSIONS = [
+    '.txt', '.log', '.eml', '.csv', '.json', '.xml', '.html', '.htm', '.msg', '.md',
+    '.vcf', '.ics', '.mbox', '.pdf', '.sqlite', '.db',
+]
+
+CHUNK_SIZE = 64 * 1024 * 1024
+TASK_SIZE = 16 * 1024 * 1024
+
+
+def chunk_boundary(data, position):
+    if position <= 0:
+        return 0
+    match = SEPARATOR_PATTERN.search(data, position)
+    return match.start() if match else len(data)
+
+
+def scan_region(file_path, start, end):
+    if end <= start:
+        return set()
+    if userspace_fs.is_virtual(file_path):
+        return scan_virtual_region(file_path, start, end)
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        # Both ends are moved to the next separator, so a match never spans two chunks
+        start = chunk_boundary(data, start)
+        end = chunk_boundary(data, end) if end < len(data) else len(data)
+        return {match.group().decode('ascii') for match in EMAIL_PATTERN.finditer(data, start, end)}
+
+
+def scan_virtual_region(file_path, start, end):
+    # Same chunk rules for files inside an image: the region is read and extended up to the next separator
+    with userspace_fs.open_file(file_path) as f:
+        f.seek(start)
+        data = f.read(end - start)
+        while (tail := f.read(64 * 1024)):
+            data += tail
+            if SEPARATOR_PATTERN.search(tail):
+                break
+    end = chunk_boundary(data, end - start) if start + len(data) > end else len(data)
+    if start > 0:
+        # data begins at the chunk start itself, where chunk_boundary() would not move
+        match = SEPARATOR_PATTERN.search(data)
+        start = match.start() if match else len(data)
+    return {match.group().decode('ascii') for match in EMAIL_PATTERN.finditer(data, start, end)}
+
+
+def scan_text(text):
+    return {match.group().decode('ascii') for match in EMAIL_PATTERN.finditer(text.encode('utf-8', errors='ignore'))}
+
+
+def find_emails(text):
+    # Detector run by the analysis stage on text it has already extracted
+    return sorted(scan_text(text))
+
+
+def needs_decoding(file_path):
+    return file_path.lower().split('.')[-1] in CONTAINER_EXTENSIONS
+
+
+def scan_container(file_path, file_extension):
+    found_emails = set()
+
+    if file_extension == "pdf":
+        for segment in iter_text_from_pdf(file_path):
+            found_emails.update(scan_text(segment.text))
+
+    elif file_extension == "mbox":
+        with userspace_fs.local_path(file_path) as path:
+            for message in mailbox.mbox(path):
+                found_emails.update(EMAIL_PATTERN.findall(message.as_bytes()))
+        found_emails = {email.decode('ascii') for email in found_emails}
+
+    elif file_extension in ["sqlite", "db"]:
+        for segment in iter_text_from_db(file_path):
+            found_emails.update(scan_text(segment.text))
+
+    return found_emails
+
+
+def scan_tasks(tasks):
+    # Runs inside the scanner processes; a task is (path, start, end) or (path, extension, None) for containers
+    outputs = []
+    for file_path, start, end in tasks:
+        try:
+            if end is None:
+                outputs.append((file_path, scan_container(file_path, start), None))
+            else:
+                outputs.append((file_path, scan_region(file_path, start, end), None))
+        except (IOError, OSError, ValueError, sqlite3.DatabaseError) as e:
+            outputs.append((file_path, set(), str(e)))
+    return outputs
+
+
+def plan_tasks(file_paths):
+    # Small files are grouped into one task, large text files are split into chunks
+    batch, batch_size = [], 0
     for file_path in file_paths:
         file_extension = file_path.lower().split('.')[-1]
-        found_emails = set()
         try:
-            if file_extension in ["txt", "log", "eml"]:
-                # Text files
-                with open(file_path, 'r', errors='ignore') as f:
-                    content = f.read()
-                    found_emails = set(email_pattern.findall(content))
-
-            elif file_extension == "csv":
-                # CSV files
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    reader = csv.reader(f)
-                    for row in reader:
-                        line = ' '.join(row)
-                        found_emails.update(email_pattern.findall(line))
-
-            elif file_extension == "json":
-                # JSON files
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    data = json.load(f)
-                    content = json.dumps(data)
-                    found_emails.update(email_pattern.findall(content))
-
-            elif file_extension == "xml":
-                # XML files
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                    found_emails.update(email_pattern.findall(content))
-
-            elif file_extension == "html":
-                # HTML files
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                    found_emails.update(email_pattern.findall(content))
-
-            elif file_extension == "pdf":
-                # PDF files
-                with pdfplumber.open(file_path) as pdf:
-                    for page in pdf.pages:
-                        content = page.extract_text() or ""
-                        found_emails.update(email_pattern.findall(content))
-
-            elif file_extension == "eml":
-                # EML files
-                with open(file_path, 'r', errors='ignore') as f:
-                    msg = message_from_file(f)
-                    content = msg.as_string()
-                    found_emails.update(email_pattern.findall(content))
-
-            elif file_extension == "mbox":
-                # MBOX files
-                mbox = mailbox.mbox(file_path)
-                for message in mbox:
-                    content = message.as_string()
-                    found_emails.update(email_pattern.findall(content))
-
-            elif file_extension in ["sqlite", "db"]:
-                # SQLite/DB files
-                conn = sqlite3.connect(file_path)
-                cursor = conn.cursor()
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-                tables = cursor.fetchall()
-                for table in tables:
-                    table_name = table[0]
-                    try:
-                        cursor.execute(f"SELECT * FROM {table_name}")
-                        rows = cursor.fetchall()
-                        for row in rows:
-                            line = ' '.join(str(col) for col in row)
-                            found_emails.update(email_pattern.findall(line))
-                    except sqlite3.DatabaseError:
-                        continue
-                conn.close()
-
-            elif file_extension == "msg":
-                # MSG files
-                with open(file_path, 'r', errors='ignore') as f:
-                    content = f.read()
-                    found_emails.update(email_pattern.findall(content))
-
-            all_found_emails.update(found_emails)
-
-            if found_emails:
-                with open(output_file, "a", encoding="utf-8") as result_file:
-                    result_file.write(f"Analysis of file: {file_path}\n")
-                    for email in sorted(found_emails):
-                        result_file.write(f"{email}\n")
-                    result_file.write("\n")
-
-        except (IOError, OSError, json.JSONDecodeError, sqlite3.DatabaseError) as e:
+            size = userspace_fs.getsize(file_path)
+        except OSError as e:
             print(f"[ERROR] Cannot open file: {file_path}. Error: {e}")
+            continue
+        metrics.record("emails", metrics.extension_of(file_path), files=1, bytes=size)
+
+        if file_extension in CONTAINER_EXTENSIONS:
+            yield file_path, 1, [(file_path, file_extension, None)]
+            continue
+
+        chunks = max(1, -(-size // CHUNK_SIZE))
+        if chunks > 1:
+            for start in range(0, size, CHUNK_SIZE):
+                yield file_path, chunks, [(file_path, start, min(start + CHUNK_SIZE, size))]
+            continue
+
+        batch.append((file_path, 0, size))
+        batch_size += size
+        if len(batch) >= 256 or batch_size >= TASK_SIZE:
+            yield None, 1, batch
+            batch, batch_size = [], 0
+
+    if batch:
+        yield None, 1, batch
+
+
+class EmailCollector:
+    # Shared by the email stage and the analysis detectors, so every hit goes through one place
+    def __init__(self, store, on_result=None):
+        self.store = store
+        self.on_result = on_result
+        self.found_emails = set()
+        self.lock = threading.Lock()
+
+    def add(self, file_path, found_emails):
+        with self.lock:
+            self.found_emails.update(found_emails)
+        self.store.add_emails(file_path, sorted(found_emails))
+        if self.on_result:
+            self.on_result(file_path, sorted(found_emails))
+
+
+def search_emails_in_files(file_paths, store=None, on_result=None, max_workers=4, collector=None, executor=None):
+    # executor: process pool shared with other stages; one is created for this call when not given
+    if collector is None:
+        collector = EmailCollector(store, on_result)
+    in_flight = set()
+    partial = {}   # path -> [chunks left, emails found so far, failed] for files split into chunks
+
+    def collect(future):
+        in_flight.discard(future)
+        try:
+            outputs = future.result()
+        except Exception as e:
+            print(f"[ERROR] Email scanner failed: {e}")
+            return
+
+        for file_path, found_emails, error in outputs:
+            if error:
+                print(f"[ERROR] Cannot open file: {file_path}. Error: {error}")
+            failed = bool(error)
+            if file_path in partial:
+                state = partial[file_path]
+                state[0] -= 1
+                state[1].update(found_emails)
+                state[2] = state[2] or failed
+                if state[0] > 0:
+                    continue
+                _, found_emails, failed = partial.pop(file_path)
+            if not failed:
+                collector.add(file_path, found_emails)
+
+    with contextlib.ExitStack() as stack:
+        if executor is None:
+            executor = stack.enter_context(
+                ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("forkserver"),
+                                    initializer=userspace_fs.register_all, initargs=(userspace_fs.registered(),)))
+
+        for file_path, chunks, tasks in plan_tasks(file_paths):
+            if chunks > 1 and file_path not in partial:
+                partial[file_path] = [chunks, set(), False]
+            in_flight.add(executor.submit(metrics.run_profiled, "email_scan", metrics.profile_directory(), scan_tasks, tasks))
+            metrics.observe("email_tasks_in_flight", len(in_flight))
+
+            if len(in_flight) >= max_workers * 4:
+                completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    collect(future)
+
+        for future in as_completed(list(in_flight)):
+            collect(future)
 
-    return all_found_emails
\ No newline at end of file
+    return collector.found_emails
@@ -0,0 +1,332 @@
+# Parsers and the OCR stack are imported by the readers that use them, so a run only loads what its file types need
+from collections import namedtuple
+import csv
+import itertools
+import zipfile
+from sqlite_reader import iter_text_rows
+from userspace_fs import open_file, local_path
+from sniff import route
+import os
+import time
+import resource
+import uuid
+
+
+IMAGE_EXTENSIONS = (".png", ".jpeg", ".jpg")
+DEFAULT_MAX_CHARS = 2_000_000
+CHUNK_SIZE = 1024 * 1024
+
+SCRATCH_DIR = './temp/extracted'
+SPILL_CHARS = 256 * 1024
+
+# offset locates the segment in its source: character offset, page, paragraph or row number
+Segment = namedtuple("Segment", ["offset", "text"])
+
+
+class ExtractedText:
+    # Small texts travel in memory; large ones are spilled to the scratch store and passed around by path
+    def __init__(self, text, spill_chars=SPILL_CHARS, scratch_dir=SCRATCH_DIR):
+        self.length = len(text)
+        self.text = text
+        self.path = None
+        if self.length > spill_chars:
+            os.makedirs(scratch_dir, exist_ok=True)
+            self.path = os.path.join(scratch_dir, f"{uuid.uuid4().hex}.txt")
+            with open(self.path, "w", encoding="utf-8", errors="surrogatepass") as f:
+                f.write(text)
+            self.text = None
+
+    def __len__(self):
+        return self.length
+
+    def read(self):
+        if self.path is None:
+            return self.text
+        with open(self.path, "r", encoding="utf-8", errors="surrogatepass") as f:
+            return f.read()
+
+    def release(self):
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+
+def iter_text(file_path, max_chars=DEFAULT_MAX_CHARS, file_type=None, encoding="utf-8"):
+    # file_type: extension of the format to read the file as, e.g. from content sniffing; defaults to the file's own
+    file_type = file_type or os.path.splitext(file_path)[1].lower()
+    if file_type == ".pdf":
+        print(f"[INFO] Extracting text from PDF: {file_path}")
+        return iter_text_from_pdf(file_path)
+    elif file_type in (".txt", ".log", ".eml"):
+        print(f"[INFO] Reading text from TXT/LOG/EML: {file_path}")
+        return iter_text_from_plain(file_path, encoding)
+    elif file_type == ".docx":
+        print(f"[INFO] Extracting text from DOCX: {file_path}")
+        return iter_text_from_docx(file_path)
+    elif file_type == ".html":
+        print(f"[INFO] Extracting text from HTML: {file_path}")
+        return iter_text_from_html(file_path, max_chars, encoding)
+    elif file_type == ".xml":
+        print(f"[INFO] Extracting text from XML: {file_path}")
+        return iter_text_from_xml(file_path)
+    elif file_type == ".csv":
+        print(f"[INFO] Extracting text from CSV: {file_path}")
+        return iter_text_from_csv(file_path, encoding)
+    elif file_type == ".json":
+        print(f"[INFO] Extracting text from JSON: {file_path}")
+        return iter_text_from_json(file_path, encoding)
+    elif file_type == ".pptx":
+        print(f"[INFO] Extracting text from PPTX: {file_path}")
+        return iter_text_from_pptx(file_path)
+    elif file_type == ".odt":
+        print(f"[INFO] Extracting text from ODT: {file_path}")
+        return iter_text_from_odt(file_path)
+    elif file_type == ".md":
+        print(f"[INFO] Extracting text from Markdown: {file_path}")
+        return iter_text_from_md(file_path, encoding)
+    elif file_type == ".msg":
+        print(f"[INFO] Extracting text from MSG: {file_path}")
+        return iter_text_from_msg(file_path, encoding)
+    elif file_type == ".epub":
+        print(f"[INFO] Extracting text from EPUB: {file_path}")
+        return iter_text_from_epub(file_path)
+    elif file_type in (".db", ".sqlite"):
+        print(f"[INFO] Extracting text from Database: {file_path}")
+        return iter_text_from_db(file_path)
+    elif file_type in IMAGE_EXTENSIONS:
+        print(f"[INFO] Performing OCR on Image: {file_path}")
+        return iter_text_from_image(file_path)
+    else:
+        print(f"[WARNING] Unsupported file format: {file_path}")
+        return None  # Unsupported file format
+
+
+def extract_text(file_path, max_chars=DEFAULT_MAX_CHARS, file_type=None, encoding="utf-8", on_overflow=None):
+    # Collects segments up to the per-file budget, so memory does not grow with the file size.
+    # on_overflow(segments): gets the rest of the file, from the segment that crossed the budget on, for readers
+    # that need all of it
+    print(f"[INFO] Starting analysis of file: {file_path}")
+    segments = iter_text(file_path, max_chars, file_type, encoding)
+    if segments is None:
+        return None
+
+    parts = []
+    total = 0
+    try:
+        for segment in segments:
+            if total + len(segment.text) > max_chars:
+                parts.append(segment.text[:max_chars - total])
+                print(f"[WARNING] Text budget of {max_chars} characters reached, truncating: {file_path}")
+                if on_overflow:
+                    on_overflow(itertools.chain([segment], segments))
+                break
+            parts.append(segment.text)
+            total += len(segment.text)
+    finally:
+        segments.close()
+    return "".join(parts)
+
+
+def join_segments(segments, size=CHUNK_SIZE):
+    # Whole segments joined into pieces of about size characters
+    parts = []
+    total = 0
+    for segment in segments:
+        parts.append(segment.text)
+        total += len(segment.text)
+        if total >= size:
+            yield "".join(parts)
+            parts = []
+            total = 0
+    if parts:
+        yield "".join(parts)
+
+
+def extract_texts(file_paths, max_chars=DEFAULT_MAX_CHARS, detectors=None, allowed=None):
+    # Runs inside the extraction processes; returns (ExtractedText, error, detections, stats) per file.
+    # Every detector sees the same extracted text, so each file is parsed once per run; past max_chars the detectors
+    # still read the rest of the file, in pieces of whole segments, while only the budgeted text goes to NER.
+    # Files are read as the format their first bytes show (sniff.route); binary data, formats without an extractor
+    # and formats outside allowed are skipped before any parsing.
+    # stats: stage ("ocr" or "extraction"), seconds and cpu_seconds spent in this process, characters extracted,
+    # the sniffed type, whether the file was skipped, the peak RSS of this process and, for images, the size of
+    # the recognition batch
+    routes = {}
+    for file_path in file_paths:
+        try:
+            routes[file_path] = route(file_path, allowed)
+        except (OSError, ValueError) as e:
+            routes[file_path] = e
+
+    images = [file_path for file_path, target in routes.items()
+              if not isinstance(target, Exception) and target[0] in IMAGE_EXTENSIONS]
+    texts = {}
+    ocr_stats = {}
+    if images:
+        from ocr import ocr_batch
+        print(f"[INFO] Performing OCR on {len(images)} image(s)")
+        started, cpu_started = time.perf_counter(), time.process_time()
+        texts.update(zip(images, ocr_batch(images)))
+        # The batch is recognized at once, so its time is split evenly between the images
+        ocr_stats = {"seconds": (time.perf_counter() - started) / len(images),
+                     "cpu_seconds": (time.process_time() - cpu_started) / len(images)}
+
+    outputs = []
+    for file_path in file_paths:
+        started, cpu_started = time.perf_counter(), time.process_time()
+        stats = {"stage": "extraction", "characters": 0, "sniffed": None, "skipped": 0}
+        try:
+            if isinstance(routes[file_path], Exception):
+                raise routes[file_path]
+            file_type, encoding, stats["sniffed"] = routes[file_path]
+            selected = {name: detector for name, (detector, select) in (detectors or {}).items() if select(file_path)}
+            overflow = {name: {} for name in selected}
+
+            def detect_overflow(segments):
+                for piece in join_segments(segments):
+                    for name, detector in selected.items():
+                        overflow[name].update(dict.fromkeys(detector(piece)))
+
+            if file_path in texts:
+                stats.update(ocr_stats, stage="ocr")
+                text, error, stats["ocr_batch_size"] = texts[file_path]
+                if error:
+                    raise ValueError(error)
+            elif file_type is None:
+                print(f"[INFO] Skipping {stats['sniffed']} content: {file_path}")
+                stats["skipped"] = 1
+                text = None
+            else:
+                text = extract_text(file_path, max_chars, file_type, encoding, detect_overflow if selected else None)
+
+            if text is None:
+                outputs.append((None, None, {}, finish_stats(stats, started, cpu_started)))
+                continue
+
+            detections = {name: list(dict.fromkeys(detector(text)) | overflow[name]) for name, detector in selected.items()}
+            stats["characters"] = len(text)
+            outputs.append((ExtractedText(text), None, detections, finish_stats(stats, started, cpu_started)))
+        except Exception as e:
+            outputs.append((None, str(e), {}, finish_stats(stats, started, cpu_started)))
+
+    return outputs
+
+
+def finish_stats(stats, started, cpu_started):
+    if stats["stage"] == "extraction":
+        stats["seconds"] = time.perf_counter() - started
+        stats["cpu_seconds"] = time.process_time() - cpu_started
+    stats["peak_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return stats
+
+
+def iter_text_from_pdf(pdf_path):
+    import pdfplumber
+    with open_file(pdf_path) as file, pdfplumber.open(file) as pdf:
+        for number, page in enumerate(pdf.pages):
+            yield Segment(number, (page.extract_text() or "") + "\n")
+            page.close()
+
+def iter_text_from_plain(text_path, encoding="utf-8"):
+    offset = 0
+    with open_file(text_path, "r", encoding=encoding) as file:
+        while chunk := file.read(CHUNK_SIZE):
+            yield Segment(offset, chunk)
+            offset += len(chunk)
+
+def iter_text_from_docx(docx_path):
+    from docx import Document
+    with open_file(docx_path) as file:
+        doc = Document(file)
+    for number, paragraph in enumerate(doc.paragraphs):
+        yield Segment(number, paragraph.text + "\n")
+
+def iter_text_from_html(html_path, max_chars=DEFAULT_MAX_CHARS, encoding="utf-8"):
+    # The parser needs the whole document, so only the budgeted prefix is parsed
+    from bs4 import BeautifulSoup
+    with open_file(html_path, "r", encoding=encoding) as file:
+        soup = BeautifulSoup(file.read(max_chars), "html.parser")
+    offset = 0
+    for string in soup.strings:
+        yield Segment(offset, string)
+        offset += len(string)
+
+def iter_text_from_xml(xml_path):
+    # Streams the text in document order: text before a tag is complete when the tag is parsed, so it is read at the
+    # next start or end event. Finished elements are cleared and dropped, so memory does not grow with the file
+    from lxml import etree
+    offset = 0
+    with open_file(xml_path) as file:
+        events = etree.iterparse(file, events=("start", "end"), recover=True, huge_tree=True,
+                                 resolve_entities=False, no_network=True, remove_comments=True, remove_pis=True)
+        for event, element in events:
+            if event == "start":
+                parent, previous = element.getparent(), element.getprevious()
+                if previous is not None:
+                    text = previous.tail
+                    parent.remove(previous)
+                else:
+                    text = parent.text if parent is not None else None
+            else:
+                text = element[-1].tail if len(element) else element.text
+                element.clear(keep_tail=True)
+            if text and not text.isspace():
+                yield Segment(offset, text + " ")
+                offset += len(text) + 1
+
+def iter_text_from_csv(csv_path, encoding="utf-8"):
+    with open_file(csv_path, "r", encoding=encoding) as file:
+        reader = csv.reader(file)
+        for number, row in enumerate(reader):
+            yield Segment(number, " ".join(row) + "\n")
+
+def iter_text_from_json(json_path, encoding="utf-8"):
+    # Raw JSON text keeps every string value and can be read incrementally
+    return iter_text_from_plain(json_path, encoding)
+
+def iter_text_from_pptx(pptx_path):
+    import pptx
+    with open_file(pptx_path) as file:
+        presentation = pptx.Presentation(file)
+    for number, slide in enumerate(presentation.slides):
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                yield Segment(number, shape.text + "\n")
+
+def iter_text_from_odt(odt_path):
+    from lxml import etree
+    with open_file(odt_path) as file, zipfile.ZipFile(file) as zf:
+        with zf.open("content.xml") as content:
+            offset = 0
+            for _, element in etree.iterparse(content, events=("end",), tag="{urn:oasis:names:tc:opendocument:xmlns:text:1.0}p"):
+                text = " ".join(element.itertext()) + "\n"
+                yield Segment(offset, text)
+                offset += len(text)
+                element.clear()
+
+def iter_text_from_md(md_path, encoding="utf-8"):
+    return iter_text_from_plain(md_path, encoding)
+
+def iter_text_from_msg(msg_path, encoding="utf-8"):
+    return iter_text_from_plain(msg_path, encoding)
+
+def iter_text_from_epub(epub_path):
+    import ebooklib
+    import ebooklib.epub
+    with local_path(epub_path) as path:
+        book = ebooklib.epub.read_epub(path)
+    for number, item in enumerate(book.get_items()):
+        if item.get_type() == ebooklib.ITEM_DOCUMENT:
+            yield Segment(number, item.get_body_content().decode("utf-8"))
+
+def iter_text_from_image(image_path):
+    from ocr import ocr
+    yield Segment(0, ocr(image_path))
+
+def iter_text_from_db(db_path, batch_size=1000):
+    with local_path(db_path) as path:
+        for number, (_, values) in enumerate(iter_text_rows(path, batch_size)):
+            yield Segment(number, " ".join(values) + "\n")
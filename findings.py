@@ -0,0 +1,172 @@
+import os
+import queue
+import sqlite3
+import threading
+import metrics
+
+
+class FindingsStore:
+    # Structured results of every stage. Stages only enqueue rows; one writer thread inserts them in batched transactions.
+    def __init__(self, image_path, db_path='./results/findings.db', batch_size=500, flush_interval=1.0):
+        self.image = os.path.realpath(image_path)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=batch_size * 8)
+        self.done = object()
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS file_results (
+                image TEXT, path TEXT, stage TEXT,
+                status TEXT, message TEXT,
+                PRIMARY KEY (image, path, stage)
+            );
+            CREATE TABLE IF NOT EXISTS entities (
+                image TEXT, path TEXT,
+                entity_group TEXT, word TEXT, score REAL, start INTEGER, end INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS entities_path ON entities (image, path);
+            CREATE TABLE IF NOT EXISTS emails (
+                image TEXT, path TEXT, email TEXT,
+                PRIMARY KEY (image, path, email)
+            );
+            CREATE INDEX IF NOT EXISTS emails_email ON emails (image, email);
+            CREATE TABLE IF NOT EXISTS social (
+                image TEXT, browser TEXT, file TEXT, host TEXT, domain TEXT,
+                title TEXT, visit_count INTEGER, last_visit_time INTEGER,
+                cookie_name TEXT, cookie_value TEXT
+            );
+            CREATE INDEX IF NOT EXISTS social_file ON social (image, file);
+        """)
+        self.conn.commit()
+
+        self.writer = threading.Thread(target=self.write_batches, daemon=True)
+        self.writer.start()
+
+    def __str__(self):
+        return f"{self.db_path} ({self.image})"
+
+    def write_batches(self):
+        finished = False
+        while not finished:
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            metrics.observe("findings_queue_depth", len(batch) + self.queue.qsize())
+            if batch[-1] is self.done:
+                batch.pop()
+                finished = True
+            try:
+                with self.conn:
+                    for query, params in batch:
+                        self.conn.execute(query, params)
+            except sqlite3.Error as e:
+                print(f"[ERROR] Cannot store {len(batch)} finding(s): {e}")
+
+    def put(self, query, params):
+        self.queue.put((query, params))
+
+    def add_file_result(self, path, stage, status, message=None):
+        self.put(
+            "INSERT OR REPLACE INTO file_results (image, path, stage, status, message) VALUES (?, ?, ?, ?, ?)",
+            (self.image, path, stage, status, message)
+        )
+
+    def add_entities(self, path, entities):
+        # A file analyzed again replaces its previous entities
+        self.put("DELETE FROM entities WHERE image=? AND path=?", (self.image, path))
+        for entity in entities:
+            self.put(
+                "INSERT INTO entities (image, path, entity_group, word, score, start, end) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.image, path, entity['entity_group'], entity['word'], float(entity['score']), entity['start'], entity['end'])
+            )
+        self.add_file_result(path, "analysis", "ok")
+
+    def add_emails(self, path, emails):
+        for email in emails:
+            self.put("INSERT OR IGNORE INTO emails (image, path, email) VALUES (?, ?, ?)", (self.image, path, email))
+        self.add_file_result(path, "emails", "ok")
+
+    def add_social(self, results):
+        # Rows of a browser file analyzed again replace the previous ones
+        for browser, file in dict.fromkeys((result["browser"], result["file"]) for result in results):
+            self.put("DELETE FROM social WHERE image=? AND browser=? AND file=?", (self.image, browser, file))
+        for result in results:
+            self.put(
+                "INSERT INTO social (image, browser, file, host, domain, title, visit_count, last_visit_time, cookie_name, cookie_value) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.image, result["browser"], result["file"], result["host"], result.get("domain"),
+                 result.get("title"), result.get("visit_count"), result.get("last_visit_time"),
+                 result.get("cookie_name"), result.get("cookie_value"))
+            )
+
+    def query(self, query, params=()):
+        # Reads through a separate connection, so queries never wait on the writer's transactions
+        conn = sqlite3.connect(self.db_path, timeout=60)
+        try:
+            yield from conn.execute(query, params)
+        finally:
+            conn.close()
+
+    def entity_counts(self):
+        return dict(self.query(
+            "SELECT entity_group, COUNT(*) FROM entities WHERE image=? GROUP BY entity_group ORDER BY entity_group",
+            (self.image,)
+        ))
+
+    def email_counts(self, limit=-1):
+        # (email, number of files) with the most widespread addresses first; limit -1 returns all
+        return self.query(
+            "SELECT email, COUNT(*) AS files FROM emails WHERE image=? GROUP BY email ORDER BY files DESC, email LIMIT ?",
+            (self.image, limit)
+        )
+
+    def email_total(self):
+        return next(self.query("SELECT COUNT(DISTINCT email) FROM emails WHERE image=?", (self.image,)))[0]
+
+    def social_counts(self, limit=-1):
+        # (browser, host, count) with the most frequent hosts first; limit -1 returns all
+        return self.query(
+            "SELECT browser, host, COUNT(*) AS visits FROM social WHERE image=? GROUP BY browser, host "
+            "ORDER BY visits DESC, browser, host LIMIT ?",
+            (self.image, limit)
+        )
+
+    def social_total(self):
+        return next(self.query("SELECT COUNT(*) FROM (SELECT DISTINCT browser, host FROM social WHERE image=?)", (self.image,)))[0]
+
+    def stored_paths(self, stage):
+        # Committed paths with a result of stage; lets results restored from the inventory fill in what is missing
+        return {path for (path,) in self.query("SELECT path FROM file_results WHERE image=? AND stage=?", (self.image, stage))}
+
+    def has_social(self, partition):
+        prefix = os.path.join(partition, "")
+        return next(self.query(
+            "SELECT COUNT(*) FROM social WHERE image=? AND substr(file, 1, ?) = ?",
+            (self.image, len(prefix), prefix)
+        ))[0] > 0
+
+    def forget(self, path):
+        # Drops the findings of a file that changed or is gone, queued behind anything written for it before
+        for table in ("file_results", "entities", "emails"):
+            self.put(f"DELETE FROM {table} WHERE image=? AND path=?", (self.image, path))
+
+    def reset(self):
+        with self.conn:
+            for table in ("file_results", "entities", "emails", "social"):
+                self.conn.execute(f"DELETE FROM {table} WHERE image=?", (self.image,))
+
+    def close(self):
+        self.queue.put(self.done)
+        self.writer.join()
+        self.conn.close()
@@ -1,7 +1,29 @@
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from collections import Counter
 from datetime import datetime
 from textwrap import wrap
+from scheduler import NOT_COVERED, coverage_lines, not_covered_rows
+import os
+
+# Sections longer than this are summarized in the PDF; the full lists go to the appendix file
+TOP_N = 200
+
+_glyph_widths = {}
+
+
+def text_width(text, font_name, font_size):
+    # Widths are additive for the standard fonts, so each glyph is measured once per font and size
+    widths = _glyph_widths.setdefault((font_name, font_size), {})
+    total = 0
+    for char in text:
+        width = widths.get(char)
+        if width is None:
+            width = widths[char] = stringWidth(char, font_name, font_size)
+        total += width
+    return total
+
 
 def draw_wrapped_text(pdf, text, x, y, max_width, font_name="Helvetica", font_size=12, line_height=15):
     pdf.setFont(font_name, font_size)
@@ -9,13 +31,19 @@ def draw_wrapped_text(pdf, text, x, y, max_width, font_name="Helvetica", font_si
     lines = []
     words = text.split()
     current_line = ""
+    current_width = 0
+    space_width = text_width(" ", font_name, font_size)
 
     for word in words:
-        if pdf.stringWidth(current_line + " " + word, font_name, font_size) <= max_width:
-            current_line += " " + word if current_line else word
+        word_width = text_width(word, font_name, font_size)
+        if not current_line:
+            current_line, current_width = word, word_width
+        elif current_width + space_width + word_width <= max_width:
+            current_line += " " + word
+            current_width += space_width + word_width
         else:
             lines.append(current_line)
-            current_line = word
+            current_line, current_width = word, word_width
 
     if current_line:
         lines.append(current_line)
@@ -27,8 +55,22 @@ def draw_wrapped_text(pdf, text, x, y, max_width, font_name="Helvetica", font_si
     return y
 
 
+def write_appendix(appendix_path, sections):
+    # sections: (title, total, rows) with rows streamed straight into the file
+    with open(appendix_path, "w", encoding="utf-8") as f:
+        for title, total, rows in sections:
+            f.write(f"{title} ({total})\n")
+            for row in rows:
+                f.write("\t".join(str(value) for value in row) + "\n")
+            f.write("\n")
+    print(f"[INFO] Report appendix saved at {appendix_path}")
+
+
 def generate_pdf_report(partition_data, users, disk_image_name, personal_data, email_results, social_results, author, 
-                        output_path='./results/report.pdf', start_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S")):
+                        output_path='./results/report.pdf', start_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                        store=None, top_n=TOP_N, coverage=None):
+    # With a findings store, the sections are read from it in bounded queries instead of the in-memory results
+    # coverage: scheduler.CoverageReport summary; files the analysis did not cover are listed in the appendix
     try:
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
@@ -101,6 +143,27 @@ def generate_pdf_report(partition_data, users, disk_image_name, personal_data, e
         y_position -= 10
         check_page_break()
 
+        if store:
+            personal_data = store.entity_counts()
+            email_total = store.email_total()
+            email_rows = lambda limit: store.email_counts(limit)
+            social_total = store.social_total()
+            social_rows = lambda limit: store.social_counts(limit)
+        else:
+            email_total = len(email_results or ())
+            email_rows = lambda limit: ((email, 1) for email in sorted(email_results)[:limit if limit >= 0 else None])
+            social_counter = Counter()
+            for social_data in social_results or []:
+                for browser, hosts in (social_data or {}).items():
+                    if isinstance(hosts, dict):
+                        social_counter.update({(browser, host): count for host, count in hosts.items()})
+            social_total = len(social_counter)
+            social_rows = lambda limit: ((browser, host, count) for (browser, host), count
+                                         in social_counter.most_common(limit if limit >= 0 else None))
+
+        appendix_path = os.path.splitext(output_path)[0] + "_appendix.txt"
+        appendix = []
+
         # Personal Data section
         if personal_data:
             pdf.setFont("Helvetica-Bold", 14)
@@ -116,32 +179,66 @@ def generate_pdf_report(partition_data, users, disk_image_name, personal_data, e
 
 
         # Emails section
-        if email_results:
+        if email_total:
             pdf.setFont("Helvetica-Bold", 14)
             y_position = draw_wrapped_text(pdf, "Emails Found", 50, y_position, max_width=width - 100)
             pdf.setFont("Helvetica", 12)
-            for email in sorted(email_results):
-                check_page_break()
-                y_position = draw_wrapped_text(pdf, email, 50, y_position, max_width=width - 100)
+            if email_total > top_n:
+                appendix.append(("Emails (address, files)", email_total, email_rows(-1)))
+                y_position = draw_wrapped_text(
+                    pdf, f"{email_total} unique addresses found. The {top_n} found in the most files are listed below; "
+                         f"the full list is in {os.path.basename(appendix_path)}.",
+                    50, y_position, max_width=width - 100, font_size=10, line_height=12)
+                for email, files in email_rows(top_n):
+                    check_page_break()
+                    y_position = draw_wrapped_text(pdf, f"{email} (files: {files})", 50, y_position, max_width=width - 100)
+            else:
+                for email, _ in sorted(email_rows(-1)):
+                    check_page_break()
+                    y_position = draw_wrapped_text(pdf, email, 50, y_position, max_width=width - 100)
 
         y_position -= 10
         check_page_break()
 
         # Social Media section
-        if social_results:
+        if social_total:
             pdf.setFont("Helvetica-Bold", 14)
             y_position = draw_wrapped_text(pdf, "Social Media Accounts Found", 50, y_position, max_width=width - 100)
             pdf.setFont("Helvetica", 12)
-            for social_data in social_results:
-                if social_data:
-                    for browser, hosts in social_data.items():
-                        if isinstance(hosts, dict):
-                            for host, count in hosts.items():
-                                display_host = host if len(host) <= 50 else host[:50] + "..."
-                                text = f"Browser: {browser}, Host: {display_host}, Count: {count}"
-                                
-                                check_page_break()
-                                y_position = draw_wrapped_text(pdf, text, 50, y_position, max_width=width - 100)
+            if social_total > top_n:
+                appendix.append(("Social media (browser, host, count)", social_total, social_rows(-1)))
+                y_position = draw_wrapped_text(
+                    pdf, f"{social_total} browser hosts found. The {top_n} most frequent are listed below; "
+                         f"the full list is in {os.path.basename(appendix_path)}.",
+                    50, y_position, max_width=width - 100, font_size=10, line_height=12)
+            for browser, host, count in social_rows(top_n):
+                display_host = host if len(host) <= 50 else host[:50] + "..."
+                text = f"Browser: {browser}, Host: {display_host}, Count: {count}"
+
+                check_page_break()
+                y_position = draw_wrapped_text(pdf, text, 50, y_position, max_width=width - 100)
+
+        y_position -= 10
+        check_page_break()
+
+        # Coverage section
+        if coverage:
+            pdf.setFont("Helvetica-Bold", 14)
+            y_position = draw_wrapped_text(pdf, "Analysis Coverage", 50, y_position, max_width=width - 100)
+            pdf.setFont("Helvetica", 12)
+            for line in coverage_lines(coverage):
+                check_page_break()
+                y_position = draw_wrapped_text(pdf, line, 50, y_position, max_width=width - 100)
+
+            missing = sum(values["totals"][status]["files"] for values in coverage["partitions"].values() for status in NOT_COVERED)
+            if missing:
+                appendix.append(("Not analyzed (partition, reason, path, bytes, score)", missing, not_covered_rows(coverage)))
+                y_position = draw_wrapped_text(
+                    pdf, f"The files that were not analyzed are listed in {os.path.basename(appendix_path)}, highest value first.",
+                    50, y_position, max_width=width - 100, font_size=10, line_height=12)
+
+        if appendix:
+            write_appendix(appendix_path, appendix)
 
         # Save the PDF
         pdf.save()
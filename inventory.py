@@ -0,0 +1,245 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from paths import file_digest
+
+
+class FileInventory:
+    def __init__(self, image_path, db_path='./results/inventory.db', commit_every=500, journal=None):
+        self.image = os.path.realpath(image_path)
+        self.db_path = db_path
+        # Completions are also appended to the journal, which is flushed far more often than the inventory commits
+        self.journal = journal
+        self.commit_every = commit_every
+        self.pending_writes = 0
+        self.lock = threading.Lock()
+        # partition -> {relative path: unchanged since the last run} of the files this run's discovery found
+        self.seen = {}
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS files (
+                image TEXT, partition TEXT, path TEXT,
+                inode INTEGER, size INTEGER, mtime REAL, digest TEXT,
+                PRIMARY KEY (image, partition, path)
+            );
+            CREATE TABLE IF NOT EXISTS file_stages (
+                image TEXT, partition TEXT, path TEXT, stage TEXT,
+                result TEXT, completed_at REAL,
+                PRIMARY KEY (image, partition, path, stage)
+            );
+            CREATE TABLE IF NOT EXISTS content_results (
+                digest TEXT, stage TEXT,
+                result TEXT, completed_at REAL,
+                PRIMARY KEY (digest, stage)
+            );
+            CREATE TABLE IF NOT EXISTS partition_stages (
+                image TEXT, partition TEXT, stage TEXT,
+                result TEXT, completed_at REAL,
+                PRIMARY KEY (image, partition, stage)
+            );
+        """)
+        self.conn.commit()
+
+    def __str__(self):
+        return f"{self.db_path} ({self.image})"
+
+    @staticmethod
+    def partition_key(partition):
+        return os.path.basename(os.path.normpath(partition))
+
+    @staticmethod
+    def relative_path(partition, path):
+        return os.path.relpath(path, partition).replace("\\", "/")
+
+    def _write(self, query, params):
+        with self.lock:
+            self.conn.execute(query, params)
+            self.pending_writes += 1
+            if self.pending_writes >= self.commit_every:
+                self.conn.commit()
+                self.pending_writes = 0
+
+    def record(self, partition, entries, on_changed=None):
+        # Passes discovery entries through, dropping stage state of files that changed since the last run
+        # and attaching the stored content digest of the unchanged ones. on_changed(path) is called for a changed
+        # file before its entry is passed on, so results derived from its old content can be dropped first
+        key = self.partition_key(partition)
+        seen = self.seen[key] = {}
+        for entry in entries:
+            path = self.relative_path(partition, entry.path)
+            with self.lock:
+                row = self.conn.execute(
+                    "SELECT inode, size, mtime, digest FROM files WHERE image=? AND partition=? AND path=?",
+                    (self.image, key, path)
+                ).fetchone()
+
+            unchanged = row is not None and row[:3] == (entry.inode, entry.size, entry.mtime)
+            seen[path] = unchanged
+            if not unchanged:
+                self._write(
+                    "INSERT OR REPLACE INTO files (image, partition, path, inode, size, mtime, digest) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (self.image, key, path, entry.inode, entry.size, entry.mtime, None)
+                )
+            if row is not None and not unchanged:
+                self._write(
+                    "DELETE FROM file_stages WHERE image=? AND partition=? AND path=?",
+                    (self.image, key, path)
+                )
+                if on_changed:
+                    on_changed(entry.path)
+            yield entry._replace(digest=row[3] if unchanged else None)
+
+    def verified(self, partition, results):
+        # Splits results of earlier runs, read before discovery, into those of files this run found unchanged and
+        # those of files it did not find at all (deleted, or outside this run's scope); changed files are in neither
+        seen = self.seen.get(self.partition_key(partition), {})
+        unchanged, missing = {}, {}
+        for file_path, result in results.items():
+            state = seen.get(self.relative_path(partition, file_path))
+            if state:
+                unchanged[file_path] = result
+            elif state is None:
+                missing[file_path] = result
+        return unchanged, missing
+
+    def hash_entries(self, partition, entries, workers=4, lookahead=64, deadline=None):
+        # Attaches a content digest to the entries that have none. Hashing runs in a thread pool of the consuming
+        # stage, not in the shared discovery pass; entries keep their order and at most lookahead are hashed ahead.
+        # Past deadline (time.monotonic()) entries pass through unhashed, since no new files are analyzed then
+        key = self.partition_key(partition)
+
+        def attach_digest(entry):
+            if entry.digest is not None or (deadline is not None and time.monotonic() >= deadline):
+                return entry
+            try:
+                digest = file_digest(entry.path)
+            except OSError as e:
+                print(f"[ERROR] Cannot hash file: {entry.path}. Error: {e}")
+                return entry
+            self._write(
+                "UPDATE files SET digest=? WHERE image=? AND partition=? AND path=?",
+                (digest, self.image, key, self.relative_path(partition, entry.path))
+            )
+            return entry._replace(digest=digest)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            window = deque()
+            for entry in entries:
+                window.append(executor.submit(attach_digest, entry))
+                if len(window) >= lookahead:
+                    yield window.popleft().result()
+            while window:
+                yield window.popleft().result()
+
+    def is_pending(self, partition, file_path, stage):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM file_stages WHERE image=? AND partition=? AND path=? AND stage=?",
+                (self.image, self.partition_key(partition), self.relative_path(partition, file_path), stage)
+            ).fetchone()
+        return row is None
+
+    def pending(self, partition, entries, stage):
+        for entry in entries:
+            if self.is_pending(partition, entry.path, stage):
+                yield entry
+
+    def mark_done(self, partition, file_path, stage, result=None):
+        key, path = self.partition_key(partition), self.relative_path(partition, file_path)
+        self._mark_file(key, path, stage, json.dumps(result))
+        if self.journal:
+            self.journal.append({"kind": "file", "partition": key, "path": path, "stage": stage, "result": result})
+
+    def _mark_file(self, key, path, stage, result):
+        self._write(
+            "INSERT OR REPLACE INTO file_stages (image, partition, path, stage, result, completed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (self.image, key, path, stage, result, time.time())
+        )
+
+    def results(self, partition, stage):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT path, result FROM file_stages WHERE image=? AND partition=? AND stage=?",
+                (self.image, self.partition_key(partition), stage)
+            ).fetchall()
+        return {os.path.join(partition, path): json.loads(result) for path, result in rows}
+
+    def content_result(self, digest, stage):
+        # Shared across images: identical content found on another image is not analyzed again
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT result FROM content_results WHERE digest=? AND stage=?",
+                (digest, stage)
+            ).fetchone()
+        if row is None:
+            return {"status": "pending"}
+        return {"status": "done", "result": json.loads(row[0])}
+
+    def store_content_result(self, digest, stage, result=None):
+        self._write(
+            "INSERT OR REPLACE INTO content_results (digest, stage, result, completed_at) VALUES (?, ?, ?, ?)",
+            (digest, stage, json.dumps(result), time.time())
+        )
+        if self.journal:
+            self.journal.append({"kind": "content", "digest": digest, "stage": stage, "result": result})
+
+    def partition_result(self, partition, stage):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT result FROM partition_stages WHERE image=? AND partition=? AND stage=?",
+                (self.image, self.partition_key(partition), stage)
+            ).fetchone()
+        if row is None:
+            return {"status": "pending"}
+        return {"status": "done", "result": json.loads(row[0])}
+
+    def mark_partition_done(self, partition, stage, result=None):
+        key = self.partition_key(partition)
+        self._mark_partition(key, stage, json.dumps(result))
+        if self.journal:
+            self.journal.append({"kind": "partition", "partition": key, "stage": stage, "result": result})
+
+    def _mark_partition(self, key, stage, result):
+        self._write(
+            "INSERT OR REPLACE INTO partition_stages (image, partition, stage, result, completed_at) VALUES (?, ?, ?, ?, ?)",
+            (self.image, key, stage, result, time.time())
+        )
+
+    def replay(self, records):
+        # Restores completions from a journal, including those the inventory had not committed yet
+        replayed = 0
+        for record in records:
+            if record["kind"] == "file":
+                self._mark_file(record["partition"], record["path"], record["stage"], json.dumps(record["result"]))
+            elif record["kind"] == "content":
+                self._write(
+                    "INSERT OR REPLACE INTO content_results (digest, stage, result, completed_at) VALUES (?, ?, ?, ?)",
+                    (record["digest"], record["stage"], json.dumps(record["result"]), record["time"])
+                )
+            elif record["kind"] == "partition":
+                self._mark_partition(record["partition"], record["stage"], json.dumps(record["result"]))
+            else:
+                continue
+            replayed += 1
+        with self.lock:
+            self.conn.commit()
+            self.pending_writes = 0
+        return replayed
+
+    def reset(self):
+        with self.lock:
+            for table in ("files", "file_stages", "partition_stages"):
+                self.conn.execute(f"DELETE FROM {table} WHERE image=?", (self.image,))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
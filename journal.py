@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+def journal_path(image_path, directory="./results"):
+    # One journal per image, like the inventory and the findings store; the hash tells apart images with the same name
+    image = os.path.realpath(image_path)
+    name = os.path.splitext(os.path.basename(image))[0]
+    return os.path.join(directory, f"journal_{name}_{hashlib.sha1(image.encode()).hexdigest()[:8]}.jsonl")
+
+
+def drop_incomplete_record(path, block_size=65536):
+    # A killed run can leave its last record cut off; appending after it would glue the next record onto it
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        end = 0
+        position = size
+        while position > 0:
+            start = max(0, position - block_size)
+            f.seek(start)
+            index = f.read(position - start).rfind(b"\n")
+            if index != -1:
+                end = start + index + 1
+                break
+            position = start
+        if end < size:
+            print(f"[WARNING] Journal {path} ends with an incomplete record, dropping it.")
+            f.truncate(end)
+
+
+class RunJournal:
+    # Append-only JSONL log of completed work; it survives a killed run and is replayed by --resume
+    def __init__(self, path, image_path, flush_every=200, flush_interval=5.0, resume=False):
+        self.path = path
+        self.image = os.path.realpath(image_path)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if resume:
+            drop_incomplete_record(path)
+        self.file = open(path, "a" if resume else "w", encoding="utf-8")
+        self.append({"kind": "run", "image": self.image, "resume": resume})
+        self.flush()
+
+        # Completions that trickle in slowly are still flushed within flush_interval
+        self.flusher = threading.Thread(target=self.flush_periodically, daemon=True)
+        self.flusher.start()
+
+    def __str__(self):
+        return self.path
+
+    def append(self, record):
+        line = json.dumps(dict(record, time=time.time())) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.pending += 1
+            if self.pending >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def flush(self):
+        with self.lock:
+            if not self.file.closed:
+                self._flush()
+
+    def flush_periodically(self):
+        while not self.stopped.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self.stopped.set()
+        self.flusher.join()
+        with self.lock:
+            if not self.file.closed:
+                self._flush()
+                self.file.close()
+
+
+def read_journal(path, image_path):
+    # Yields the records of image_path; lines cut off by a crash are skipped
+    image = os.path.realpath(image_path)
+    if not os.path.exists(path):
+        return
+
+    current_image = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"[WARNING] Journal {path} has an incomplete record, skipping it.")
+                continue
+            if record.get("kind") == "run":
+                current_image = record.get("image")
+                continue
+            if current_image == image:
+                yield record
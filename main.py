@@ -1,12 +1,48 @@
 import argparse
 import os
 from mount_disc import DiskImageManager
-from paths import get_path, detect_operating_system, detect_users
-from analyze import analyze_files, count_entities
+from paths import scan_partition, select_entries, matches_extensions, broadcast, detect_operating_system, detect_users
+from analyze import analyze_files, analysis_stage, count_entities, write_result
 from generate_report import generate_pdf_report
-from email_finder import search_emails_in_files
+from email_finder import search_emails_in_files, find_emails, needs_decoding, EmailCollector, EMAIL_EXTENSIONS
 from social_analyze import extract_social_media_data
+from inventory import FileInventory
+from journal import RunJournal, journal_path, read_journal
+from findings import FindingsStore
+from ner_backends import BACKENDS
+from scheduler import CoverageReport, prioritize, cap_sizes, write_coverage, coverage_lines
+import metrics
+import models
+import userspace_fs
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+import threading
+import time
+import functools
+
+def run_stage(name, stage, entries, label=None):
+    try:
+        with metrics.stage(name, label):
+            return stage(entries)
+    finally:
+        # Keep the shared discovery pass flowing for the other stages
+        for _ in entries:
+            pass
+
+
+def count_discovered(entries, label=None):
+    # Counted locally and recorded once, so the discovery pass does not take the metrics lock per file
+    counts = {}
+    with metrics.stage("discovery", label):
+        for entry in entries:
+            if entry.type == "file":
+                count = counts.setdefault(metrics.extension_of(entry.name), [0, 0])
+                count[0] += 1
+                count[1] += entry.size
+            yield entry
+    for extension, (files, size) in counts.items():
+        metrics.record("discovery", extension, files=files, bytes=size)
 
 def main():
     parser = argparse.ArgumentParser(
@@ -57,7 +93,15 @@ def main():
         action='store_true', 
         help=(
             "Enable AI-powered analysis of more files. "
-            "Analyzed file types include additionally .html, .xml, .log, .eml, .csv, json, .pptx, .odt, .md, .msg, .epub, .db, .sqlite"
+            "Analyzed file types include additionally .html, .xml, .log, .eml, .csv, .json, .pptx, .odt, .md, .msg, .epub, .db, .sqlite"
+        )
+    )
+    parser.add_argument(
+        '--sniff-all', 
+        action='store_true', 
+        help=(
+            "Send every file to the analysis, not only files with an analyzed extension. "
+            "The type is recognized from the first bytes, so renamed documents are read and binary files are skipped unparsed."
         )
     )
     parser.add_argument(
@@ -92,18 +136,142 @@ def main():
             "By default, system directories are excluded for efficiency."
         )
     )
+    parser.add_argument(
+        '--extract-workers', 
+        type=int, 
+        default=4, 
+        help="Number of processes extracting text and scanning files for emails, shared by all partitions."
+    )
+    parser.add_argument(
+        '--inference-workers', 
+        type=int, 
+        default=1, 
+        help="Number of NER batches running at once, shared by all partitions."
+    )
+    parser.add_argument(
+        '--partition-workers', 
+        type=int, 
+        default=2, 
+        help="Number of partitions processed at the same time. Workers are shared, not multiplied."
+    )
+    parser.add_argument(
+        '--queue-depth', 
+        type=int, 
+        default=32, 
+        help="Maximum number of extracted documents waiting for the NER model. Bounds memory use."
+    )
+    parser.add_argument(
+        '--max-chars-per-file', 
+        type=int, 
+        default=2_000_000, 
+        help="Maximum number of characters extracted from a single file for the analysis. Longer text is truncated."
+    )
+    parser.add_argument(
+        '--rescan', 
+        action='store_true', 
+        help=(
+            "Ignore the stored file inventory for this image and process everything again. "
+            "By default, files and stages completed by a previous run are skipped and their results reused."
+        )
+    )
+    parser.add_argument(
+        '--resume', 
+        action='store_true', 
+        help=(
+            "Continue an interrupted run: completed files and findings are restored from the run journal "
+            "of the image (./results/journal_<image>_<hash>.jsonl) and only unfinished work is processed."
+        )
+    )
+    parser.add_argument(
+        '--userspace', 
+        action='store_true', 
+        help=(
+            "Read the filesystems directly from the image file instead of attaching a loop device and mounting it. "
+            "Needs no root privileges. Supported filesystems: ext2/3/4, FAT12/16/32 and exFAT."
+        )
+    )
+    parser.add_argument(
+        '--social-full-scan', 
+        action='store_true', 
+        help=(
+            "Search the whole partition for browser history and cookie files. "
+            "By default, only the browser profile directories of the detected users are checked."
+        )
+    )
+    parser.add_argument(
+        '--ner-backend', 
+        choices=list(BACKENDS), 
+        default='torch', 
+        help=(
+            "Runtime of the NER model. 'onnx' runs an int8-quantized ONNX export of the model with ONNX Runtime on the CPU; "
+            "the export is made on first use and cached in ./models/onnx."
+        )
+    )
+    parser.add_argument(
+        '--profile', 
+        action='store_true', 
+        help=(
+            "Profile every stage with cProfile. Profiles are written to ./results/profile_<nr>/ "
+            "as <stage>_<partition>.prof with a text summary next to each. The threads driving a stage mostly dispatch work, "
+            "so the NER inference threads and the extraction and email scanning processes are profiled as well, "
+            "into inference.prof, extraction.prof and email_scan.prof merged over all workers."
+        )
+    )
+    parser.add_argument(
+        '--metrics-textfile', 
+        type=str, 
+        default=None, 
+        help=(
+            "Where to write the run metrics in the Prometheus textfile format, e.g. into the node_exporter textfile directory. "
+            "Default: ./results/metrics_<nr>.prom. A JSON run summary is always written to ./results/metrics_<nr>.json."
+        )
+    )
+    parser.add_argument(
+        '--time-budget', 
+        type=float, 
+        default=None, 
+        help=(
+            "Wall-clock budget of the whole run in minutes. Files are analyzed highest value first: user profiles, "
+            "document types, recently modified and small files. Once the budget is used up no new files are started; "
+            "the skipped files are listed in ./results/coverage_<nr>.json and analyzed by a later --resume."
+        )
+    )
+    parser.add_argument(
+        '--max-file-size', 
+        type=float, 
+        default=None, 
+        help="Files larger than this many megabytes are not analyzed and are listed as not covered."
+    )
+    parser.add_argument(
+        '--preload-models', 
+        action='store_true', 
+        help=(
+            "Load the NER model in the background while the image is mounted and the files are discovered. "
+            "By default, the model is loaded when the analysis receives its first file."
+        )
+    )
     args = parser.parse_args()
+    if args.resume and args.rescan:
+        parser.error("--resume and --rescan cannot be used together")
+
+    analysis_enabled = args.analyze or args.ocr
+    # The budget covers the whole run, mounting and discovery included
+    deadline = time.monotonic() + args.time_budget * 60 if args.time_budget else None
+    max_file_size = int(args.max_file_size * 1024 * 1024) if args.max_file_size else None
+    coverage = CoverageReport(args.time_budget * 60 if args.time_budget else None, max_file_size)
+    if analysis_enabled and args.preload_models:
+        models.preload([f"ner-{args.ner_backend}"])
     
     extensions = []
 
     if args.analyze:
         extensions.extend(['.txt', '.pdf', '.docx', '.doc'])
     if args.extend:
-        extensions.extend(['.html', '.xml', '.log', '.eml', '.csv', 'json', '.pptx', '.odt', '.md', '.msg', '.epub', '.db', 'sqlite'])
+        extensions.extend(['.html', '.xml', '.log', '.eml', '.csv', '.json', '.pptx', '.odt', '.md', '.msg', '.epub', '.db', '.sqlite'])
     if args.ocr:
         extensions.extend(['.png', '.jpeg', '.jpg'])
 
-    disk = DiskImageManager(str(args.image_path))
+    disk = DiskImageManager(str(args.image_path), userspace=args.userspace)
 
     author = {
         'Name': args.name,
@@ -120,23 +288,39 @@ def main():
     if not os.path.exists('./results'):
         os.makedirs('./results')
 
-    files_to_remove = [
-        f"./results/analyze_results_{author['Nr']}.txt",
-        f"./results/email_results_{author['Nr']}.txt",
-        f"./results/social_results_{author['Nr']}.txt",
-    ]
+    journal = RunJournal(journal_path(str(args.image_path)), str(args.image_path), resume=args.resume)
+    inventory = FileInventory(str(args.image_path), journal=journal)
+    print(f"[INFO] Using file inventory: {inventory}")
+    print(f"[INFO] Writing run journal: {journal}")
 
-    for file_path in files_to_remove:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    if args.resume:
+        replayed = inventory.replay(read_journal(journal.path, str(args.image_path)))
+        print(f"[INFO] Resuming: {replayed} completed item(s) restored from the journal.")
+
+    if args.profile:
+        metrics.enable_profiling(f"./results/profile_{author['Nr']}")
+
+    store = FindingsStore(str(args.image_path))
+    print(f"[INFO] Writing findings to: {store}")
+
+    if args.rescan:
+        inventory.reset()
+        store.reset()
 
     start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    for partition in disk.mount_points:
+    def process_partition(partition):
+        # Runs in a partition thread; results are returned and merged in partition order by the caller
+        outcome = {"os": None, "users": None, "analysis": {}, "emails": set(), "social": None}
+
         print(f"[INFO] Processing partition: {partition}")
 
         print("[INFO] Detecting operating system...")
-        os_system = detect_operating_system(partition)
+        label = os.path.basename(partition.rstrip("/"))
+        with metrics.stage("os_detection", label):
+            os_system = detect_operating_system(partition)
+        os_type = None
+        detected_users = []
         if os_system["status"] == "ok":
             os_type = os_system["type"]
             print(f"[INFO] Detected operating system: {os_type}")
@@ -144,43 +328,222 @@ def main():
             print("[INFO] Detecting users...")
             users_info = detect_users(partition, os_type)
             if users_info["status"] == "ok":
+                detected_users = users_info["users"]
                 print(f"[INFO] Detected users: {', '.join(users_info['users'])}")
             else:
                 print(f"[ERROR] User detection error: {users_info['message']}")
 
-            users[partition] = users_info
+            outcome["users"] = users_info
         else:
             print(f"[ERROR] OS detection error: {os_system['message']}")
 
-        os_results[partition] = os_system
+        outcome["os"] = os_system
 
-        print("[INFO] Searching for files...")
-        paths = get_path(partition, extensions, args.sys_dir_analysis)
+        stages = []
+        # Results of earlier runs; read before discovery, which drops those of changed files, and restored after it
+        earlier = {}
 
-        if args.analyze or args.ocr:
-            print("[INFO] Starting file analysis...")
-            analyze_results.update(analyze_files(paths, f"./results/analyze_results_{author['Nr']}.txt"))
+        def restore(stage, results, write):
+            # Only results of files this run's discovery found unchanged are restored; findings of files it did not
+            # find are dropped. The report reads the store, so restored results the store lacks (a run killed before
+            # the store committed them, or a removed findings database) are written to it again
+            unchanged, missing = inventory.verified(partition, results)
+            for file_path in missing:
+                store.forget(file_path)
+            stored = store.stored_paths(stage)
+            for file_path, result in unchanged.items():
+                if file_path not in stored:
+                    write(file_path, result)
+            return unchanged
 
         if args.emails:
-            print("[INFO] Searching for email addresses...")
-            email_results.update(search_emails_in_files(paths, f"./results/email_results_{author['Nr']}.txt"))
+            earlier["emails"] = inventory.results(partition, "emails")
+            email_collector = EmailCollector(
+                store,
+                on_result=lambda file_path, result: inventory.mark_done(partition, file_path, "emails", result)
+            )
+
+        def extracted_by_analysis(entry):
+            # Containers the analysis parses anyway get their emails from the same extracted text
+            return analysis_enabled and args.emails and needs_decoding(entry.path) and matches_extensions(entry, extensions)
+
+        if analysis_enabled:
+            ner_stage = analysis_stage(args.ner_backend, args.max_chars_per_file)
+            earlier["analysis"] = inventory.results(partition, ner_stage)
+
+            def record_result(file_path, result):
+                inventory.mark_done(partition, file_path, ner_stage, result)
+                coverage.mark(partition, file_path, "analyzed" if result is not None else "no_text")
+
+            def run_analysis(entries):
+                print("[INFO] Starting file analysis...")
+                # With --sniff-all every file is a candidate; the extraction processes read the type from its content
+                candidates = (entry for entry in entries if entry.type == "file") if args.sniff_all else select_entries(entries, extensions)
+                pending = (
+                    entry for entry in candidates
+                    if inventory.is_pending(partition, entry.path, ner_stage)
+                    or (extracted_by_analysis(entry) and inventory.is_pending(partition, entry.path, "emails"))
+                )
+                pending = cap_sizes(coverage.track(partition, pending), max_file_size,
+                                    lambda entry: coverage.mark(partition, entry.path, "size_cap"))
+                if deadline is not None:
+                    # Ordering needs the whole candidate list, so the analysis starts once discovery is done
+                    pending, scores = prioritize(pending, partition, os_type, detected_users)
+                    coverage.rank(partition, scores)
+                    print(f"[INFO] Scheduled {len(pending)} file(s) by value score.")
+                # Hashed for deduplication here, off the shared discovery pass and after the size cap
+                pending = inventory.hash_entries(partition, pending, workers=args.extract_workers, deadline=deadline)
+                pending = coverage.first_file(partition, pending)
+                return analyze_files(
+                    pending,
+                    store,
+                    on_result=record_result,
+                    cache=inventory,
+                    extract_workers=args.extract_workers,
+                    inference_workers=args.inference_workers,
+                    queue_depth=args.queue_depth,
+                    max_chars=args.max_chars_per_file,
+                    # Only containers: other files are scanned by the email stage itself
+                    detectors={"emails": (find_emails, needs_decoding)} if args.emails else None,
+                    on_detection=lambda name, file_path, result: email_collector.add(file_path, set(result)),
+                    extractors=extractors,
+                    inference_slots=inference_slots,
+                    backend=args.ner_backend,
+                    file_types=extensions,
+                    deadline=deadline,
+                    on_skip=lambda file_path, reason: coverage.mark(partition, file_path, reason)
+                )
+            stages.append(("analysis", run_analysis))
+
+        if args.emails:
+            handed_over = []
+
+            def own_entries(entries):
+                for entry in entries:
+                    if extracted_by_analysis(entry):
+                        handed_over.append(entry.path)
+                    else:
+                        yield entry
+
+            def run_emails(entries):
+                print("[INFO] Searching for email addresses...")
+                selected = own_entries(select_entries(entries, EMAIL_EXTENSIONS))
+                return search_emails_in_files(
+                    (entry.path for entry in inventory.pending(partition, selected, "emails")),
+                    max_workers=args.extract_workers,
+                    collector=email_collector,
+                    executor=extractors
+                )
+            stages.append(("emails", run_emails))
 
         if args.social:
-            print("[INFO] Extracting social media data...")
-            social_results.append(extract_social_media_data(partition, f"./results/social_results_{author['Nr']}.txt"))
+            previous = inventory.partition_result(partition, "social")
+            # Only the host counts are kept in the inventory, so without the browser rows in the store the extraction runs again
+            if previous["status"] == "done" and (not previous["result"] or store.has_social(partition)):
+                print("[INFO] Social media data already extracted for this partition, reusing results.")
+                outcome["social"] = previous["result"]
+            elif args.social_full_scan:
+                def run_social(entries):
+                    print("[INFO] Extracting social media data...")
+                    return extract_social_media_data(partition, os_type, detected_users, store, entries=entries)
+                stages.append(("social", run_social))
+            else:
+                print("[INFO] Extracting social media data from browser profiles...")
+                with metrics.stage("social", label):
+                    outcome["social"] = extract_social_media_data(partition, os_type, detected_users, store)
+                inventory.mark_partition_done(partition, "social", outcome["social"])
+
+        if not stages:
+            return outcome
+
+        print("[INFO] Searching for files...")
+        entries = inventory.record(partition, count_discovered(scan_partition(partition, args.sys_dir_analysis), label),
+                                   on_changed=store.forget)
+        streams = broadcast(entries, len(stages))
+
+        with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+            futures = {name: executor.submit(run_stage, name, stage, stream, label) for (name, stage), stream in zip(stages, streams)}
+
+        if "analysis" in futures:
+            analyzed = futures["analysis"].result()
+            restored = restore("analysis", {file_path: result for file_path, result in earlier["analysis"].items()
+                                            if file_path not in analyzed}, functools.partial(write_result, store))
+            for file_path in restored:
+                coverage.mark(partition, file_path, "earlier_run")
+            outcome["analysis"].update(restored)
+            outcome["analysis"].update(analyzed)
+        if "emails" in futures:
+            futures["emails"].result()
+            # Containers the analysis did not extract (size cap, deadline, no text, failure) are scanned here instead
+            leftovers = [file_path for file_path in handed_over if inventory.is_pending(partition, file_path, "emails")]
+            if leftovers:
+                print(f"[INFO] Searching for email addresses in {len(leftovers)} file(s) the analysis did not extract...")
+                with metrics.stage("emails", label):
+                    search_emails_in_files(leftovers, max_workers=args.extract_workers, collector=email_collector, executor=extractors)
+            for found_emails in restore("emails", earlier["emails"], store.add_emails).values():
+                outcome["emails"].update(found_emails)
+            outcome["emails"].update(email_collector.found_emails)
+        if "social" in futures:
+            outcome["social"] = futures["social"].result()
+            inventory.mark_partition_done(partition, "social", outcome["social"])
+        return outcome
+
+    # One process pool and one set of inference slots for the whole image, however many partitions run at once
+    inference_slots = threading.BoundedSemaphore(args.inference_workers)
+    # Workers get the userspace volumes so they can read files from the image themselves
+    with ProcessPoolExecutor(max_workers=args.extract_workers, mp_context=multiprocessing.get_context("forkserver"),
+                             initializer=userspace_fs.register_all, initargs=(userspace_fs.registered(),)) as extractors, \
+            ThreadPoolExecutor(max_workers=max(1, args.partition_workers)) as partitions:
+        outcomes = list(partitions.map(process_partition, disk.mount_points))
+
+    for partition, outcome in zip(disk.mount_points, outcomes):
+        os_results[partition] = outcome["os"]
+        if outcome["users"] is not None:
+            users[partition] = outcome["users"]
+        for file_path in sorted(outcome["analysis"]):
+            analyze_results[file_path] = outcome["analysis"][file_path]
+        email_results.update(outcome["emails"])
+        if outcome["social"] is not None:
+            social_results.append(outcome["social"])
+
+    # Everything queued for the findings store is committed before the report reads it
+    store.close()
+
+    coverage_summary = None
+    if analysis_enabled:
+        coverage_summary = coverage.summary()
+        for line in coverage_lines(coverage_summary):
+            print(f"[INFO] Coverage: {line}")
+        write_coverage(f"./results/coverage_{author['Nr']}.json", coverage_summary)
 
     print("[INFO] Generating final report...")
-    generate_pdf_report(
-        os_results,
-        users,
-        str(args.image_path),
-        count_entities(analyze_results),
-        email_results,
-        social_results,
-        author,
-        output_path=f"./results/report_{author['Nr']}.pdf",
-        start_time=start_time
-    )
+    with metrics.stage("report"):
+        generate_pdf_report(
+            os_results,
+            users,
+            str(args.image_path),
+            count_entities(analyze_results),
+            email_results,
+            social_results,
+            author,
+            output_path=f"./results/report_{author['Nr']}.pdf",
+            start_time=start_time,
+            store=store,
+            coverage=coverage_summary
+        )
+
+    inventory.close()
+    journal.close()
+    metrics.merge_profiles()
+
+    run_summary = metrics.summary()
+    for name, values in run_summary["stages"].items():
+        rates = ", ".join(f"{key} {values[key]}" for key in ("files_per_sec", "bytes_per_sec", "tokens_per_sec") if key in values)
+        seconds = values.get("seconds", values.get("inference_seconds", 0))
+        print(f"[INFO] Stage {name}: {round(seconds, 2)}s" + (f", {rates}" if rates else ""))
+    metrics.write_json(f"./results/metrics_{author['Nr']}.json", run_summary)
+    metrics.write_prometheus(args.metrics_textfile or f"./results/metrics_{author['Nr']}.prom", run_summary)
+    print(f"[INFO] Run metrics written to: ./results/metrics_{author['Nr']}.json")
 
     print("[INFO] Cleaning up disk mounts...")
     disk.cleanup()
@@ -0,0 +1,227 @@
+import os
+import time
+import json
+import resource
+import threading
+import contextlib
+
+# Process-wide run metrics. Stages add counters as they go; the summary derives rates from them at the end.
+_lock = threading.Lock()
+_stages = {}      # stage -> {"runs", "seconds", "cpu_seconds", counters...}
+_extensions = {}  # (stage, extension) -> {"files", "bytes", ...}
+_gauges = {}      # name -> {"last", "max", "samples", "total"}
+_profile_dir = None
+_profilers = {}   # (process, thread, name) -> profiler kept across the calls of profiled()
+_started = time.time()
+
+
+def enable_profiling(directory):
+    global _profile_dir
+    os.makedirs(directory, exist_ok=True)
+    _profile_dir = directory
+
+
+def profile_directory():
+    # Passed to worker processes, which do not share this module's state
+    return _profile_dir
+
+
+def _add(target, values):
+    for key, value in values.items():
+        target[key] = target.get(key, 0) + value
+
+
+def record(stage, extension=None, **values):
+    # Adds numeric counters (files, bytes, tokens, seconds ...) to a stage and, with extension, to its breakdown
+    with _lock:
+        _add(_stages.setdefault(stage, {}), values)
+        if extension is not None:
+            _add(_extensions.setdefault((stage, extension or "(none)"), {}), values)
+
+
+def observe(name, value):
+    # Gauge sampled at the call sites, e.g. queue depths
+    with _lock:
+        gauge = _gauges.setdefault(name, {"last": 0, "max": 0, "samples": 0, "total": 0})
+        gauge["last"] = value
+        gauge["max"] = max(gauge["max"], value)
+        gauge["samples"] += 1
+        gauge["total"] += value
+
+
+def extension_of(path):
+    return os.path.splitext(path)[1].lower()
+
+
+@contextlib.contextmanager
+def stage(name, label=None):
+    # Wall time of the calling thread and CPU time of the whole process while the stage runs; with profiling
+    # enabled, the calling thread is also profiled into <profile dir>/<name>[_<label>].prof
+    profiler = None
+    if _profile_dir:
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Only one profiler can be active at a time on newer interpreters
+            print(f"[WARNING] Cannot profile stage {name} while another stage is profiled: {e}")
+            profiler = None
+
+    started, cpu_started = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        record(name, runs=1, seconds=time.perf_counter() - started, cpu_seconds=time.process_time() - cpu_started)
+        if profiler:
+            profiler.disable()
+            save_profile(profiler, f"{name}_{label}" if label is not None else name)
+
+
+@contextlib.contextmanager
+def profiled(name, directory=None):
+    # stage() only profiles the thread driving a stage; the inference threads and the worker processes, where the
+    # analysis spends its time, profile themselves through this. Each thread accumulates one profile per name and
+    # rewrites it to <profile dir>/<name>.part.<pid>.<thread>.prof after every block; merge_profiles() joins the parts
+    directory = directory or _profile_dir
+    profiler = None
+    if directory:
+        import cProfile
+        key = (os.getpid(), threading.get_ident(), name)
+        profiler = _profilers.get(key) or _profilers.setdefault(key, cProfile.Profile())
+        try:
+            profiler.enable()
+        except ValueError as e:
+            print(f"[WARNING] Cannot profile {name} while another profiler is active: {e}")
+            profiler = None
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(os.path.join(directory, f"{name}.part.{os.getpid()}.{threading.get_ident()}.prof"))
+
+
+def run_profiled(name, directory, function, *args):
+    # Submitted to worker processes in place of function, so their share of a stage is profiled as well
+    with profiled(name, directory):
+        return function(*args)
+
+
+def merge_profiles():
+    # Joins the part files of every name written by profiled() into <name>.prof
+    if not _profile_dir:
+        return
+    import pstats
+    parts = {}
+    for file_name in sorted(os.listdir(_profile_dir)):
+        if ".part." in file_name and file_name.endswith(".prof"):
+            parts.setdefault(file_name.split(".part.")[0], []).append(os.path.join(_profile_dir, file_name))
+    for name, paths in parts.items():
+        stats = pstats.Stats(*paths)
+        save_profile(stats, name, sources=len(paths))
+        for path in paths:
+            os.remove(path)
+
+
+def save_profile(profile, name, sources=None):
+    # profile: a cProfile.Profile or pstats.Stats
+    import pstats
+    path = os.path.join(_profile_dir, f"{name}.prof".replace(os.sep, "_"))
+    stats = profile if isinstance(profile, pstats.Stats) else pstats.Stats(profile)
+    stats.dump_stats(path)
+    with open(path[:-len(".prof")] + ".txt", "w", encoding="utf-8") as f:
+        stats.stream = f
+        stats.sort_stats("cumulative").print_stats(40)
+    print(f"[INFO] Profile of {name} written to: {path}" + (f" (merged from {sources} threads/processes)" if sources else ""))
+
+
+def rates(values, seconds):
+    derived = {}
+    if seconds:
+        for key in ("files", "bytes"):
+            if key in values:
+                derived[f"{key}_per_sec"] = round(values[key] / seconds, 2)
+    if values.get("tokens") and values.get("inference_seconds"):
+        derived["tokens_per_sec"] = round(values["tokens"] / values["inference_seconds"], 2)
+    return derived
+
+
+def peak_rss():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def summary():
+    with _lock:
+        stages = {}
+        for name, values in _stages.items():
+            stages[name] = dict(values, **rates(values, values.get("seconds")), extensions={})
+        for (name, extension), values in sorted(_extensions.items()):
+            stages[name]["extensions"][extension] = dict(values, **rates(values, _stages[name].get("seconds")))
+        gauges = {
+            name: {"last": gauge["last"], "max": gauge["max"], "mean": round(gauge["total"] / gauge["samples"], 2)}
+            for name, gauge in _gauges.items()
+        }
+
+    # Worker processes report their CPU time and peak RSS through the stage counters and gauges
+    return {
+        "started": _started,
+        "seconds": round(time.time() - _started, 3),
+        "cpu_seconds": round(time.process_time(), 3),
+        "peak_rss_bytes": peak_rss(),
+        "stages": stages,
+        "gauges": gauges,
+    }
+
+
+def write_json(path, run_summary):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(run_summary, f, indent=2, default=str)
+
+
+def label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_lines(run_summary, prefix="disk_analysis"):
+    def labels(**values):
+        if not values:
+            return ""
+        return "{" + ",".join(f'{key}="{label_value(value)}"' for key, value in values.items()) + "}"
+
+    metrics = {}
+
+    def add(name, help_text, label_values, value):
+        if isinstance(value, (int, float)):
+            metrics.setdefault(name, (help_text, []))[1].append(f"{prefix}_{name}{labels(**label_values)} {value}")
+
+    add("run_seconds", "Wall time of the run.", {}, run_summary["seconds"])
+    add("run_cpu_seconds", "CPU time of the main process.", {}, run_summary["cpu_seconds"])
+    add("peak_rss_bytes", "Peak resident set size of the main process.", {}, run_summary["peak_rss_bytes"])
+    for stage_name, values in run_summary["stages"].items():
+        for key, value in values.items():
+            if key != "extensions":
+                add(f"stage_{key}", f"Stage {key.replace('_', ' ')}.", {"stage": stage_name}, value)
+        for extension, extension_values in values["extensions"].items():
+            for key, value in extension_values.items():
+                add(f"extension_{key}", f"Per file extension {key.replace('_', ' ')}.",
+                    {"stage": stage_name, "extension": extension}, value)
+    for gauge_name, gauge in run_summary["gauges"].items():
+        for key, value in gauge.items():
+            add(f"gauge_{key}", f"Sampled gauge, {key} value.", {"name": gauge_name}, value)
+
+    lines = []
+    for name, (help_text, samples) in metrics.items():
+        lines.append(f"# HELP {prefix}_{name} {help_text}")
+        lines.append(f"# TYPE {prefix}_{name} gauge")
+        lines.extend(samples)
+    return lines
+
+
+def write_prometheus(path, run_summary):
+    # Written to a temporary file and renamed, so the textfile collector never reads a partial file
+    partial_path = path + ".partial"
+    with open(partial_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(prometheus_lines(run_summary)) + "\n")
+    os.replace(partial_path, path)
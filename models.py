@@ -0,0 +1,43 @@
+import threading
+
+# Process-wide registry of heavy models: each one is loaded at most once per process, on first use or by preload()
+_loaders = {}
+_models = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+
+def register(name, loader):
+    with _registry_lock:
+        _loaders[name] = loader
+        _locks.setdefault(name, threading.Lock())
+
+
+def get(name):
+    # Callers arriving while the model loads (e.g. from a preload thread) wait for that load instead of starting another
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _locks[name]:
+        if name not in _models:
+            print(f"[INFO] Loading model: {name}")
+            _models[name] = _loaders[name]()
+        return _models[name]
+
+
+def is_loaded(name):
+    return name in _models
+
+
+def preload(names):
+    # Loads the models in a background thread so mounting and discovery are not kept waiting
+    def load():
+        for name in names:
+            try:
+                get(name)
+            except Exception as e:
+                print(f"[ERROR] Cannot preload model {name}: {e}")
+
+    thread = threading.Thread(target=load, daemon=True)
+    thread.start()
+    return thread
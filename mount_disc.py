@@ -1,14 +1,23 @@
 import os
 import subprocess
 import sys
+import struct
+import posixpath
+import userspace_fs
+from partition_table import read_partitions, is_readable
 
 class DiskImageManager:
-    def __init__(self, image_path, mount_base='/tmp/disk_mount/'):
+    def __init__(self, image_path, mount_base='/tmp/disk_mount/', userspace=False):
         self.image_path = image_path
         self.loop_device = None
         self.mount_points = []
         self.mount_base = mount_base
-        self.mount_all_partitions()
+        # Userspace mode reads the filesystems straight from the image file: no losetup, mount or root
+        self.userspace = userspace
+        if userspace:
+            self.attach_userspace()
+        else:
+            self.mount_all_partitions()
         
     def __del__(self):
         self.cleanup()
@@ -18,19 +27,25 @@ class DiskImageManager:
 
     def setup_loop_device(self):
         try:
-            subprocess.run(['sudo', 'losetup', '-fP', self.image_path], check=True)
-            self.loop_device = subprocess.check_output(['losetup', '-j', self.image_path]).decode().split(':')[0]
+            # --show prints the device that was attached, so a second image on the same host cannot be picked up
+            self.loop_device = subprocess.check_output(['sudo', 'losetup', '-fP', '--show', self.image_path]).decode().strip()
             print(f"[INFO] Loop device attached: {self.loop_device}")
         except subprocess.CalledProcessError as e:
             print(f"[ERROR] Error while setting up the loop device: {e}")
             sys.exit(1)
 
-    def is_valid_filesystem(self, partition):
+    def read_partitions(self):
+        # Partition table and filesystems are read from the image itself, before any device is touched
         try:
-            output = subprocess.check_output(['sudo', 'blkid', partition])
-            return 'TYPE=' in output.decode()
-        except subprocess.CalledProcessError:
-            return False
+            partitions = read_partitions(self.image_path)
+        except (OSError, struct.error) as e:
+            print(f"[ERROR] Cannot read the partition table of {self.image_path}: {e}")
+            return []
+
+        for partition in partitions:
+            print(f"[INFO] Partition {partition.number}: offset {partition.offset}, size {partition.size}, "
+                  f"type {partition.type}, filesystem {partition.fs_type}, label {partition.label}")
+        return partitions
 
     def mount_partition(self, partition, mount_point):
         try:
@@ -43,24 +58,51 @@ class DiskImageManager:
             return False
 
     def mount_all_partitions(self):
+        partitions = [partition for partition in self.read_partitions() if self.is_supported(partition)]
+        if not partitions:
+            return self.mount_points
+
         if not self.loop_device:
             self.setup_loop_device()
 
         os.makedirs(self.mount_base, exist_ok=True)
 
-        partitions = [f"/dev/{part}" for part in os.listdir('/dev') if part.startswith(os.path.basename(self.loop_device))]
-        
-        for i, partition in enumerate(partitions):
-            if self.is_valid_filesystem(partition):
-                print(f"\n[INFO] Partition {partition} has a valid filesystem, attempting to mount...")
-                temp_mount_point = os.path.join(self.mount_base, f"part{i}")
-                os.makedirs(temp_mount_point, exist_ok=True)
-                self.mount_partition(partition, temp_mount_point)
-            else:
-                print(f"\n[WARNING] Partition {partition} does not have a valid filesystem. Skipping.")
+        for partition in partitions:
+            device = self.loop_device if partition.number == 0 else f"{self.loop_device}p{partition.number}"
+            print(f"\n[INFO] Partition {device} has a {partition.fs_type} filesystem, attempting to mount...")
+            temp_mount_point = os.path.join(self.mount_base, f"part{partition.number}")
+            os.makedirs(temp_mount_point, exist_ok=True)
+            self.mount_partition(device, temp_mount_point)
+        return self.mount_points
+
+    def is_supported(self, partition):
+        if not is_readable(partition):
+            print(f"\n[WARNING] Partition {partition.number} does not have a readable filesystem. Skipping.")
+            return False
+        if self.userspace and partition.fs_type not in userspace_fs.FILESYSTEM_FAMILIES:
+            print(f"\n[WARNING] Partition {partition.number} has a {partition.fs_type} filesystem, "
+                  "which cannot be read in userspace. Skipping.")
+            return False
+        return True
+
+    def attach_userspace(self):
+        for partition in self.read_partitions():
+            if not self.is_supported(partition):
+                continue
+            root = posixpath.join(userspace_fs.USERSPACE_ROOT, f"part{partition.number}")
+            userspace_fs.register(root, self.image_path, partition.offset, partition.size,
+                                  userspace_fs.FILESYSTEM_FAMILIES[partition.fs_type])
+            print(f"[INFO] Partition {partition.number} ({partition.fs_type}) opened in userspace at {root}.")
+            self.mount_points.append(root)
         return self.mount_points
 
     def unmount_all(self):
+        if self.userspace:
+            for mount_point in self.mount_points:
+                userspace_fs.unregister(mount_point)
+            self.mount_points.clear()
+            return
+
         for mount_point in self.mount_points:
             try:
                 subprocess.run(['sudo', 'umount', mount_point], check=True)
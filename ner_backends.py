@@ -0,0 +1,133 @@
+import os
+import copy
+
+MODEL_NAME = 'lakshyakh93/deberta_finetuned_pii'
+ONNX_DIR = './models/onnx'
+
+
+class NERBackend:
+    # Loads the model once; create_pipeline() returns token-classification pipelines sharing its weights,
+    # each with its own tokenizer, producing entity_group/score/word/start/end entities
+    name = None
+
+    def __init__(self, model_name=MODEL_NAME):
+        self.model_name = model_name
+        self.tokenizer = None
+        self.model = None
+        self.load()
+
+    def __str__(self):
+        return f"{self.name} ({self.model_name})"
+
+    def load(self):
+        raise NotImplementedError
+
+    def create_pipeline(self):
+        raise NotImplementedError
+
+
+class TorchBackend(NERBackend):
+    name = "torch"
+
+    def load(self):
+        from transformers import AutoTokenizer, AutoModelForTokenClassification
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self.model = AutoModelForTokenClassification.from_pretrained(self.model_name)
+        self.model.eval()
+
+    def create_pipeline(self):
+        from transformers import pipeline
+        return pipeline("token-classification", model=self.model, tokenizer=copy.deepcopy(self.tokenizer),
+                        device=-1, aggregation_strategy="simple")
+
+
+class OnnxTokenClassifier:
+    # Stands in for the torch model inside the transformers pipeline, so pre- and post-processing stay the same
+    def __init__(self, session, config):
+        import torch
+        self.session = session
+        self.config = config
+        self.device = torch.device("cpu")
+        self.input_names = [model_input.name for model_input in session.get_inputs()]
+
+    def can_generate(self):
+        return False
+
+    def __call__(self, **inputs):
+        import torch
+        feed = {name: inputs[name].numpy() for name in self.input_names}
+        return {"logits": torch.from_numpy(self.session.run(["logits"], feed)[0])}
+
+
+class OnnxBackend(NERBackend):
+    # The model is exported to ONNX and quantized to int8 (dynamic quantization) once; later runs load the cached file
+    name = "onnx"
+
+    def __init__(self, model_name=MODEL_NAME, onnx_dir=ONNX_DIR):
+        self.onnx_path = os.path.join(onnx_dir, model_name.strip("/").replace("/", "--"), "model_int8.onnx")
+        super().__init__(model_name)
+
+    def load(self):
+        import onnxruntime
+        from transformers import AutoConfig, AutoTokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        if not os.path.exists(self.onnx_path):
+            self.export()
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = onnxruntime.InferenceSession(self.onnx_path, options, providers=["CPUExecutionProvider"])
+        self.model = OnnxTokenClassifier(session, AutoConfig.from_pretrained(self.model_name))
+
+    def create_pipeline(self):
+        from transformers import TokenClassificationPipeline
+
+        class OnnxTokenClassificationPipeline(TokenClassificationPipeline):
+            def check_model_type(self, supported_models):
+                # The graph was exported from a supported token classification model
+                pass
+
+        return OnnxTokenClassificationPipeline(model=self.model, tokenizer=copy.deepcopy(self.tokenizer),
+                                               framework="pt", device=-1, aggregation_strategy="simple")
+
+    def export(self):
+        import torch
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+        from transformers import AutoModelForTokenClassification
+
+        print(f"[INFO] Exporting {self.model_name} to ONNX: {self.onnx_path}")
+        model = AutoModelForTokenClassification.from_pretrained(self.model_name)
+        model.eval()
+        model.config.return_dict = False
+
+        sample = self.tokenizer("Export sample text", return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        axes = {0: "batch", 1: "sequence"}
+
+        os.makedirs(os.path.dirname(self.onnx_path), exist_ok=True)
+        full_path = self.onnx_path.replace("_int8.onnx", "_fp32.onnx")
+        prepared_path = self.onnx_path.replace("_int8.onnx", "_prepared.onnx")
+        partial_path = self.onnx_path + ".partial"
+        try:
+            with torch.no_grad():
+                torch.onnx.export(model, tuple(sample[name] for name in input_names), full_path, input_names=input_names,
+                                  output_names=["logits"], dynamic_axes={name: axes for name in [*input_names, "logits"]},
+                                  opset_version=14, dynamo=False)
+            quant_pre_process(full_path, prepared_path, skip_symbolic_shape=True)
+            quantize_dynamic(prepared_path, partial_path, weight_type=QuantType.QInt8)
+            # Only a complete file is ever found at onnx_path
+            os.replace(partial_path, self.onnx_path)
+        finally:
+            for path in (full_path, prepared_path, partial_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+BACKENDS = {backend.name: backend for backend in (TorchBackend, OnnxBackend)}
+
+
+def create_backend(name, model_name=MODEL_NAME):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown NER backend: {name}")
+    return BACKENDS[name](model_name)
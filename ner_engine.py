@@ -0,0 +1,130 @@
+import time
+import contextlib
+from collections import namedtuple
+
+MAX_TOKENS = 480
+STRIDE = 64
+
+Window = namedtuple("Window", ["key", "index", "start", "end", "own_start", "own_end", "tokens"])
+
+
+class NEREngine:
+    def __init__(self, ner_pipeline, max_tokens=MAX_TOKENS, stride=STRIDE, batch_size=16, pool_batches=8, slots=None):
+        if stride >= max_tokens:
+            raise ValueError("stride must be smaller than max_tokens")
+        self.ner_pipeline = ner_pipeline
+        self.tokenizer = ner_pipeline.tokenizer
+        self.max_tokens = max_tokens
+        self.stride = stride
+        self.batch_size = batch_size
+        self.pool_size = batch_size * pool_batches
+        # Optional semaphore limiting how many batches run on the CPU at once across engines
+        self.slots = slots or contextlib.nullcontext()
+        # Work done so far, for the run metrics; seconds counts only the time spent in the model
+        self.documents = 0
+        self.windows = 0
+        self.tokens = 0
+        self.seconds = 0.0
+
+    def split(self, key, text):
+        offsets = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                                 verbose=False)["offset_mapping"]
+        if not offsets:
+            return []
+
+        step = self.max_tokens - self.stride
+        starts = list(range(0, max(len(offsets) - self.stride, 1), step))
+        windows = []
+        for index, first in enumerate(starts):
+            last = min(first + self.max_tokens, len(offsets))
+            # Overlapping windows split the shared tokens in half, so every entity is reported once
+            own_start = 0 if index == 0 else offsets[first + self.stride // 2][0]
+            own_end = len(text) if index == len(starts) - 1 else offsets[starts[index + 1] + self.stride // 2][0]
+            windows.append(Window(key, index, offsets[first][0], offsets[last - 1][1], own_start, own_end, last - first))
+        return windows
+
+    def run_batch(self, windows, texts):
+        with self.slots:
+            started = time.perf_counter()
+            outputs = self.ner_pipeline([texts[(w.key, w.index)] for w in windows], batch_size=len(windows))
+            self.seconds += time.perf_counter() - started
+        self.windows += len(windows)
+        self.tokens += sum(window.tokens for window in windows)
+        if windows and outputs and isinstance(outputs[0], dict):
+            outputs = [outputs]
+        for window, entities in zip(windows, outputs):
+            for entity in entities:
+                start = entity["start"] + window.start
+                if window.own_start <= start < window.own_end:
+                    yield window.key, dict(entity, start=start, end=entity["end"] + window.start)
+
+    def run(self, documents, on_error=None):
+        # documents: iterable of (key, text); yields (key, entities) as soon as all windows of a document are done.
+        # With on_error, a document whose windows fail is reported through on_error(key, message) and not yielded;
+        # without it, the error is raised.
+        pool = []
+        texts = {}
+        remaining = {}
+        found = {}
+        failed = {}
+        order = []
+
+        def run_windows(batch):
+            try:
+                return list(self.run_batch(batch, texts))
+            except Exception as e:
+                if on_error is None:
+                    raise
+                if len(batch) == 1:
+                    failed.setdefault(batch[0].key, str(e))
+                    return []
+            # Retried one window at a time, so only the documents with failing windows are lost
+            return [result for window in batch for result in run_windows([window])]
+
+        def flush():
+            pool.sort(key=lambda w: w.tokens)
+            for i in range(0, len(pool), self.batch_size):
+                batch = pool[i:i + self.batch_size]
+                for key, entity in run_windows(batch):
+                    found[key].append(entity)
+                for window in batch:
+                    del texts[(window.key, window.index)]
+                    remaining[window.key] -= 1
+            pool.clear()
+
+        def completed():
+            for key in [key for key in order if remaining[key] == 0]:
+                order.remove(key)
+                del remaining[key]
+                entities = found.pop(key)
+                if key in failed:
+                    on_error(key, failed.pop(key))
+                    continue
+                yield key, sorted(entities, key=lambda entity: entity["start"])
+
+        for key, text in documents:
+            self.documents += 1
+            try:
+                windows = self.split(key, text or "")
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(key, str(e))
+                continue
+            order.append(key)
+            remaining[key] = len(windows)
+            found[key] = []
+            for window in windows:
+                texts[(key, window.index)] = text[window.start:window.end]
+                pool.append(window)
+
+            if len(pool) >= self.pool_size:
+                flush()
+            yield from completed()
+
+        flush()
+        yield from completed()
+
+    def analyze(self, text):
+        for _, entities in self.run([(None, text)]):
+            return entities
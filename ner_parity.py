@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import sys
+import time
+from ner_engine import NEREngine
+from ner_backends import BACKENDS, MODEL_NAME, create_backend
+from extract import extract_text, DEFAULT_MAX_CHARS
+
+
+def load_documents(paths, max_chars=DEFAULT_MAX_CHARS):
+    # (path, text) of every readable file under paths, extracted the same way as in the analysis
+    documents = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        else:
+            files = [path]
+        for file_path in files:
+            try:
+                text = extract_text(file_path, max_chars)
+            except Exception as e:
+                print(f"[WARNING] Skipping {file_path}: {e}")
+                continue
+            if text:
+                documents.append((file_path, text))
+    return documents
+
+
+def run_backend(backend, documents, batch_size=16, score_threshold=0.90):
+    engine = NEREngine(backend.create_pipeline(), batch_size=batch_size)
+    # One warm-up document, so one-time initialization is not part of the measurement
+    list(engine.run(documents[:1]))
+
+    started = time.perf_counter()
+    results = {
+        key: [dict(entity, score=float(entity["score"])) for entity in entities if entity["score"] >= score_threshold]
+        for key, entities in engine.run(documents)
+    }
+    elapsed = time.perf_counter() - started
+    characters = sum(len(text) for _, text in documents)
+    return results, {
+        "documents": len(documents),
+        "seconds": round(elapsed, 3),
+        "docs_per_sec": round(len(documents) / elapsed, 3) if elapsed else None,
+        "chars_per_sec": round(characters / elapsed, 1) if elapsed else None,
+    }
+
+
+def compare_entities(reference, candidate):
+    # Entities match when their group and span are equal; matched entities are also compared by score
+    matched = 0
+    reference_total = 0
+    candidate_total = 0
+    identical_documents = 0
+    max_score_delta = 0.0
+
+    for key, reference_entities in reference.items():
+        expected = {(e["entity_group"], e["start"], e["end"]): e["score"] for e in reference_entities}
+        found = {(e["entity_group"], e["start"], e["end"]): e["score"] for e in candidate.get(key, [])}
+        common = expected.keys() & found.keys()
+        matched += len(common)
+        reference_total += len(expected)
+        candidate_total += len(found)
+        identical_documents += expected.keys() == found.keys()
+        for span in common:
+            max_score_delta = max(max_score_delta, abs(expected[span] - found[span]))
+
+    precision = matched / candidate_total if candidate_total else 1.0
+    recall = matched / reference_total if reference_total else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "reference_entities": reference_total,
+        "candidate_entities": candidate_total,
+        "matched_entities": matched,
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(f1, 4),
+        "identical_documents": identical_documents,
+        "max_score_delta": round(max_score_delta, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Runs the NER backends on the same documents, checks that their entities agree with the reference backend "
+            "and records the throughput of each backend."
+        )
+    )
+    parser.add_argument('paths', nargs='+', help="Files or directories with sample documents.")
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), default=list(BACKENDS), help="Backends to measure.")
+    parser.add_argument('--reference', choices=list(BACKENDS), default='torch', help="Backend the others are compared to.")
+    parser.add_argument('--model', default=MODEL_NAME, help="Model name or local model directory.")
+    parser.add_argument('--batch-size', type=int, default=16, help="Number of windows per NER batch.")
+    parser.add_argument('--score-threshold', type=float, default=0.90, help="Minimum score of a reported entity, as in the analysis.")
+    parser.add_argument('--max-chars-per-file', type=int, default=DEFAULT_MAX_CHARS, help="Maximum number of characters read from a file.")
+    parser.add_argument('--min-f1', type=float, default=0.98, help="Lowest entity F1 against the reference that passes the check.")
+    parser.add_argument('--output', default='./results/ner_backends.json', help="Where the measurements are written.")
+    args = parser.parse_args()
+
+    documents = load_documents(args.paths, args.max_chars_per_file)
+    if not documents:
+        print("[ERROR] No documents with text found.")
+        sys.exit(1)
+    print(f"[INFO] Loaded {len(documents)} document(s).")
+
+    backends = [args.reference] + [name for name in args.backends if name != args.reference]
+    results = {}
+    report = {"model": args.model, "score_threshold": args.score_threshold, "backends": {}}
+    for name in backends:
+        print(f"[INFO] Running backend: {name}")
+        results[name], report["backends"][name] = run_backend(create_backend(name, args.model), documents,
+                                                               args.batch_size, args.score_threshold)
+        print(f"[INFO] {name}: {report['backends'][name]['docs_per_sec']} docs/sec")
+
+    passed = True
+    for name in backends[1:]:
+        parity = compare_entities(results[args.reference], results[name])
+        parity["passed"] = parity["f1"] >= args.min_f1
+        passed = passed and parity["passed"]
+        report["backends"][name]["parity"] = parity
+        status = "[INFO]" if parity["passed"] else "[ERROR]"
+        print(f"{status} {name} vs {args.reference}: F1 {parity['f1']}, "
+              f"{parity['identical_documents']}/{len(documents)} identical documents, max score delta {parity['max_score_delta']}")
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[INFO] Measurements written to: {args.output}")
+    if not passed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,98 @@
-import cv2
-import easyocr
-import tempfile
+import models
+from userspace_fs import local_path
 
-def ocr(image_path):
-    image = cv2.imread(image_path)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
-    _, thresh = cv2.threshold(gray, 120, 255, cv2.THRESH_BINARY)
-    
-    with tempfile.NamedTemporaryFile(delete=True, suffix=".jpg") as temp_file:
-        temp_file_path = temp_file.name
-        cv2.imwrite(temp_file_path, thresh)
+class OCREngine:
+    def __init__(self, languages=('en', 'pl'), max_side=1600, batch_size=16, bucket=256):
+        self.languages = list(languages)
+        self.max_side = max_side
+        self.batch_size = batch_size
+        # Images are padded up to a multiple of bucket pixels, so images of similar size can be recognized together
+        self.bucket = bucket
+        self.reader = None
+
+    def load(self):
+        # Detection and recognition models are loaded once and reused for every image
+        if self.reader is None:
+            import easyocr
+            self.reader = easyocr.Reader(self.languages)
+        return self.reader
+
+    def preprocess(self, image_path):
+        import cv2
+        with local_path(image_path) as path:
+            image = cv2.imread(path)
+        if image is None:
+            raise ValueError(f"Cannot decode image: {image_path}")
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        height, width = gray.shape
+        scale = self.max_side / max(height, width)
+        if scale < 1:
+            gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+        _, thresh = cv2.threshold(gray, 120, 255, cv2.THRESH_BINARY)
+        return thresh
+
+    def bucket_shape(self, shape):
+        height, width = shape
+        return -(-height // self.bucket) * self.bucket, -(-width // self.bucket) * self.bucket
+
+    def pad(self, image, shape):
+        # Padding on the bottom and right keeps the text positions; the border colour is taken as background
+        import numpy as np
+        border = np.concatenate([image[0], image[-1], image[:, 0], image[:, -1]])
+        height, width = image.shape
+        return np.pad(image, ((0, shape[0] - height), (0, shape[1] - width)), constant_values=int(np.median(border)))
+
+    def read_batch(self, image_paths):
+        # Returns (text, error, batch) per image, batch being the number of images recognized together with it;
+        # images in the same size bucket are padded to one shape and share recognition batches
+        reader = self.load()
+        outputs = [(None, None, 0)] * len(image_paths)
+        by_shape = {}
+
+        for index, image_path in enumerate(image_paths):
+            try:
+                image = self.preprocess(image_path)
+                by_shape.setdefault(self.bucket_shape(image.shape), []).append((index, image))
+            except Exception as e:
+                outputs[index] = (None, str(e), 0)
+
+        for shape, group in by_shape.items():
+            try:
+                if len(group) > 1:
+                    results = reader.readtext_batched([self.pad(image, shape) for _, image in group], batch_size=self.batch_size)
+                else:
+                    results = [reader.readtext(group[0][1], batch_size=self.batch_size)]
+                for (index, _), result in zip(group, results):
+                    outputs[index] = (" ".join([item[1] for item in result]), None, len(group))
+            except Exception as e:
+                for index, _ in group:
+                    outputs[index] = (None, str(e), 0)
+
+        return outputs
+
+
+def create_engine():
+    engine = OCREngine()
+    engine.load()
+    return engine
+
+
+models.register("ocr", create_engine)
+
+
+def get_engine():
+    return models.get("ocr")
+
+
+def ocr(image_path):
+    text, error, _ = get_engine().read_batch([image_path])[0]
+    if error:
+        raise ValueError(error)
+    return text
 
-        reader = easyocr.Reader(['en', 'pl'])
-        results = reader.readtext(temp_file_path)
 
-    extracted_text = " ".join([result[1] for result in results])
-    return extracted_text
+def ocr_batch(image_paths):
+    return get_engine().read_batch(image_paths)
@@ -0,0 +1,178 @@
+import os
+import uuid
+import struct
+from collections import namedtuple
+
+# number follows the kernel's numbering of loop partitions (loopNp<number>); 0 is a filesystem on the whole image
+Partition = namedtuple("Partition", ["number", "offset", "size", "scheme", "type", "fs_type", "label"])
+
+MBR_TYPES = {
+    0x01: "FAT12", 0x04: "FAT16", 0x06: "FAT16", 0x07: "NTFS/exFAT", 0x0B: "FAT32", 0x0C: "FAT32 (LBA)",
+    0x0E: "FAT16 (LBA)", 0x27: "Windows recovery", 0x82: "Linux swap", 0x83: "Linux", 0x8E: "Linux LVM",
+    0xA5: "FreeBSD", 0xAF: "HFS/HFS+", 0xEE: "GPT protective", 0xEF: "EFI System", 0xFD: "Linux RAID",
+}
+EXTENDED_TYPES = (0x05, 0x0F, 0x85)
+
+GPT_TYPES = {
+    "c12a7328-f81f-11d2-ba4b-00a0c93ec93b": "EFI System",
+    "21686148-6449-6e6f-744e-656564454649": "BIOS boot",
+    "e3c9e316-0b5c-4db8-817d-f92df00215ae": "Microsoft reserved",
+    "ebd0a0a2-b9e5-4433-87c0-68b6b72699c7": "Microsoft basic data",
+    "de94bba4-06d1-4d40-a16a-bfd50179d6ac": "Windows recovery",
+    "0fc63daf-8483-4772-8e79-3d69d8477de4": "Linux filesystem",
+    "0657fd6d-a4ab-43c4-84e5-0933c84b4f4f": "Linux swap",
+    "e6d6d379-f507-44c2-a23c-238f2a3df928": "Linux LVM",
+    "4f68bce3-e8cd-4db1-96e7-fbcaf984b709": "Linux root (x86-64)",
+    "933ac7e1-2eb4-4f13-b844-0e14e2aef915": "Linux home",
+    "48465300-0000-11aa-aa11-00306543ecac": "Apple HFS+",
+    "7c3457ef-0000-11aa-aa11-00306543ecac": "Apple APFS",
+}
+
+# Filesystems that carry no user files or cannot be read without extra steps
+UNREADABLE_TYPES = ("swap", "luks", "lvm")
+
+
+def read_at(f, offset, size):
+    f.seek(offset)
+    return f.read(size)
+
+
+def decode_label(raw, encoding="utf-8"):
+    label = raw.decode(encoding, errors="replace").split("\x00")[0].strip()
+    return label or None
+
+
+def detect_filesystem(f, offset):
+    # Returns (fs_type, label) from the superblock magic at offset, or (None, None)
+    head = read_at(f, offset, 4096)
+    if len(head) < 512:
+        return None, None
+
+    if head[3:11] == b"EXFAT   ":
+        return "exfat", None
+    if head[3:11] == b"NTFS    ":
+        return "ntfs", None
+    if head[0:6] == b"LUKS\xba\xbe":
+        return "luks", None
+    if head[0:4] == b"XFSB":
+        return "xfs", decode_label(head[108:120])
+    if head[32:36] == b"NXSB":
+        return "apfs", None
+    if head[512:520] == b"LABELONE":
+        return "lvm", None
+
+    if head[510:512] == b"\x55\xaa":
+        if head[82:87] == b"FAT32":
+            label = decode_label(head[71:82], "cp437")
+            return "fat32", None if label == "NO NAME" else label
+        if head[54:59] in (b"FAT12", b"FAT16"):
+            label = decode_label(head[43:54], "cp437")
+            return head[54:59].decode().lower(), None if label == "NO NAME" else label
+
+    superblock = head[1024:2048]
+    if len(superblock) >= 256 and struct.unpack_from("<H", superblock, 56)[0] == 0xEF53:
+        compat, incompat = struct.unpack_from("<II", superblock, 92)
+        fs_type = "ext4" if incompat & (0x40 | 0x80 | 0x200) else "ext3" if compat & 0x4 else "ext2"
+        return fs_type, decode_label(superblock[120:136])
+    if superblock[0:2] in (b"H+", b"HX"):
+        return "hfsplus", None
+
+    if head[4086:4096] in (b"SWAPSPACE2", b"SWAP-SPACE"):
+        return "swap", decode_label(head[1052:1068])
+    btrfs = read_at(f, offset + 0x10000, 0x200)
+    if btrfs[0x40:0x48] == b"_BHRfS_M":
+        return "btrfs", decode_label(btrfs[0x12B:0x12B + 256])
+    if read_at(f, offset + 0x8001, 5) == b"CD001":
+        return "iso9660", None
+    return None, None
+
+
+def read_gpt(f, sector_size):
+    header = read_at(f, sector_size, 92)
+    entries_lba, count, entry_size = struct.unpack_from("<QII", header, 72)
+    table = read_at(f, entries_lba * sector_size, count * entry_size)
+
+    partitions = []
+    for index in range(count):
+        entry = table[index * entry_size:(index + 1) * entry_size]
+        if len(entry) < 128 or entry[0:16] == bytes(16):
+            continue
+        type_guid = str(uuid.UUID(bytes_le=entry[0:16]))
+        first, last = struct.unpack_from("<QQ", entry, 32)
+        name = decode_label(entry[56:128], "utf-16-le")
+        offset = first * sector_size
+        fs_type, label = detect_filesystem(f, offset)
+        partitions.append(Partition(index + 1, offset, (last - first + 1) * sector_size, "gpt",
+                                    GPT_TYPES.get(type_guid, type_guid), fs_type, label or name))
+    return partitions
+
+
+def mbr_entries(sector):
+    for slot in range(4):
+        status, partition_type, start, sectors = struct.unpack_from("<B3xB3xII", sector, 446 + slot * 16)
+        yield slot, status, partition_type, start, sectors
+
+
+def read_mbr(f, sector_size, image_size):
+    partitions = []
+    mbr = read_at(f, 0, 512)
+    for slot, status, partition_type, start, sectors in mbr_entries(mbr):
+        if partition_type == 0 or sectors == 0:
+            continue
+        if partition_type in EXTENDED_TYPES:
+            partitions.extend(read_logical(f, start, sector_size, image_size))
+            continue
+        offset = start * sector_size
+        fs_type, label = detect_filesystem(f, offset)
+        partitions.append(Partition(slot + 1, offset, sectors * sector_size, "mbr",
+                                    MBR_TYPES.get(partition_type, f"0x{partition_type:02x}"), fs_type, label))
+    return partitions
+
+
+def read_logical(f, extended_start, sector_size, image_size):
+    # Logical partitions form a chain of EBRs; the kernel numbers them from 5
+    partitions = []
+    number = 5
+    next_ebr = extended_start
+    seen = set()
+    while next_ebr not in seen and next_ebr * sector_size < image_size:
+        seen.add(next_ebr)
+        ebr = read_at(f, next_ebr * sector_size, 512)
+        if len(ebr) < 512 or ebr[510:512] != b"\x55\xaa":
+            break
+        entries = list(mbr_entries(ebr))
+        _, _, partition_type, start, sectors = entries[0]
+        if partition_type and sectors:
+            offset = (next_ebr + start) * sector_size
+            fs_type, label = detect_filesystem(f, offset)
+            partitions.append(Partition(number, offset, sectors * sector_size, "mbr",
+                                        MBR_TYPES.get(partition_type, f"0x{partition_type:02x}"), fs_type, label))
+            number += 1
+        _, _, link_type, link_start, _ = entries[1]
+        if link_type not in EXTENDED_TYPES or not link_start:
+            break
+        next_ebr = extended_start + link_start
+    return partitions
+
+
+def read_partitions(image_path):
+    # Reads the partition table straight from the image file; an image without a table is one partition
+    image_size = os.path.getsize(image_path)
+    with open(image_path, "rb") as f:
+        for sector_size in (512, 4096):
+            if read_at(f, sector_size, 8) == b"EFI PART":
+                return read_gpt(f, sector_size)
+
+        mbr = read_at(f, 0, 512)
+        whole_fs, whole_label = detect_filesystem(f, 0)
+        # A FAT/NTFS boot sector carries the same signature as an MBR, so a filesystem at offset 0 wins
+        valid_mbr = mbr[510:512] == b"\x55\xaa" and all(status in (0x00, 0x80) for _, status, *_ in mbr_entries(mbr))
+        if valid_mbr and whole_fs is None:
+            return read_mbr(f, 512, image_size)
+        if whole_fs is None:
+            return []
+        return [Partition(0, 0, image_size, None, None, whole_fs, whole_label)]
+
+
+def is_readable(partition):
+    return partition.fs_type is not None and partition.fs_type not in UNREADABLE_TYPES
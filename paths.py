@@ -1,46 +1,136 @@
 import os
 import subprocess
 import plistlib
+import hashlib
+import queue
+import stat
+import threading
+import userspace_fs
+from collections import namedtuple
+
+FileEntry = namedtuple("FileEntry", ["path", "name", "type", "size", "mtime", "inode", "digest"], defaults=[None])
+
+# Relative to the partition root, compared case-insensitively (NTFS)
+SYSTEM_PATHS = [
+    "proc", "sys", "dev", "run", "var/lib", "var/run",  # Linux
+    "Windows", "Program Files", "Program Files (x86)",  # Windows
+    "usr", "boot", "etc",  # Linux
+]
+
+
+def list_directory(directory):
+    # Yields (name, path, type, size, mtime, inode) for mounted and userspace partitions alike
+    if userspace_fs.is_virtual(directory):
+        yield from userspace_fs.scandir(directory)
+        return
+
+    with os.scandir(directory) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    yield entry.name, entry.path, "dir", 0, 0, entry.inode()
+                    continue
+
+                info = entry.stat(follow_symlinks=False)
+                if stat.S_ISREG(info.st_mode):
+                    entry_type = "file"
+                elif stat.S_ISLNK(info.st_mode):
+                    entry_type = "symlink"
+                else:
+                    continue
+                yield entry.name, entry.path, entry_type, info.st_size, info.st_mtime, info.st_ino
+            except OSError:
+                continue
+
+
+def scan_partition(partition, skip_system_paths=True):
+    excluded = {path.lower() for path in SYSTEM_PATHS} if skip_system_paths else set()
 
-import os
+    print(f"[INFO] Searching in the partition: {partition}")
 
-def get_path(partition, extensions=[".txt"], skip_system_paths=True):
-    file_paths = []
+    stack = [(partition, "")]
+    while stack:
+        directory, relative = stack.pop()
+        subdirs = []
+        try:
+            for name, path, entry_type, size, mtime, inode in list_directory(directory):
+                relative_path = f"{relative}/{name}" if relative else name
+                if entry_type == "dir":
+                    if relative_path.lower() in excluded:
+                        print(f"[INFO] Skipping system path: {path}")
+                    else:
+                        subdirs.append((path, relative_path))
+                    continue
+                yield FileEntry(path, name, entry_type, size, mtime, inode)
+        except OSError as e:
+            print(f"[ERROR] Cannot list directory: {directory}. Error: {e}")
 
-    system_paths = [
-        "/proc", "/sys", "/dev", "/run", "/var/lib", "/var/run",  # Linux
-        "C:\\Windows", "C:\\Program Files", "C:\\Program Files (x86)",  # Windows
-        "/usr", "/boot", "/etc",  # Linux
-    ]
+        stack.extend(reversed(subdirs))
 
-    print(f"[INFO] Searching in the partition: {partition}")
 
-    for root, dirs, files in os.walk(partition):
-        root = root.replace("\\", "/")
+def matches_extensions(entry, extensions):
+    return entry.type == "file" and any(entry.name.endswith(ext) for ext in extensions)
+
+
+def select_entries(entries, extensions):
+    for entry in entries:
+        if matches_extensions(entry, extensions):
+            yield entry
+
 
-        if skip_system_paths and any(system_path in root for system_path in system_paths):
-            print(f"[INFO] Skipping system path: {root}")
-            continue
+def select_files(entries, extensions):
+    for entry in select_entries(entries, extensions):
+        yield entry.path
 
-        for file in files:
-            if any(file.endswith(ext) for ext in extensions):
-                file_paths.append(os.path.join(root, file))
 
-    return file_paths
+def file_digest(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with userspace_fs.open_file(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_path(partition, extensions=[".txt"], skip_system_paths=True):
+    return select_files(scan_partition(partition, skip_system_paths), extensions)
+
+
+def broadcast(entries, consumers, maxsize=1024):
+    # Fans a single discovery pass out to several stages; the slowest consumer sets the pace
+    done = object()
+    queues = [queue.Queue(maxsize=maxsize) for _ in range(consumers)]
+
+    def feed():
+        try:
+            for entry in entries:
+                for q in queues:
+                    q.put(entry)
+        finally:
+            for q in queues:
+                q.put(done)
+
+    def consume(q):
+        while True:
+            entry = q.get()
+            if entry is done:
+                return
+            yield entry
 
+    threading.Thread(target=feed, daemon=True).start()
+    return [consume(q) for q in queues]
 
 
 def detect_operating_system(partition_path):
-    if not os.path.exists(partition_path):
+    if not userspace_fs.exists(partition_path):
         return {"status": "error", "message": "Partition not found"}
     
     os_info = {"status": "ok", "type": "Unknown", "details": {}}
 
     # Linux
-    if os.path.exists(os.path.join(partition_path, "etc/os-release")):
+    if userspace_fs.exists(os.path.join(partition_path, "etc/os-release")):
         os_info["type"] = "Linux"
         try:
-            with open(os.path.join(partition_path, "etc/os-release")) as f:
+            with userspace_fs.open_file(os.path.join(partition_path, "etc/os-release"), "r") as f:
                 for line in f:
                     key, _, value = line.partition("=")
                     os_info["details"][key.strip()] = value.strip().strip('"')
@@ -48,14 +138,14 @@ def detect_operating_system(partition_path):
             os_info["details"]["error"] = f"Failed to read os-release: {e}"
     
     # Windows
-    elif os.path.exists(os.path.join(partition_path, "Windows/System32/ntoskrnl.exe")):
+    elif userspace_fs.exists(os.path.join(partition_path, "Windows/System32/ntoskrnl.exe")):
         os_info["type"] = "Windows"
         os_info["details"]["hint"] = "System32 detected"
         try:
             # Windows version
             winver_path = os.path.join(partition_path, "Windows/System32/license.rtf")
-            if os.path.exists(winver_path):
-                with open(winver_path, "r", errors="ignore") as f:
+            if userspace_fs.exists(winver_path):
+                with userspace_fs.open_file(winver_path, "r", errors="ignore") as f:
                     for line in f:
                         if "Windows" in line:
                             os_info["details"]["version"] = line.strip()
@@ -64,11 +154,11 @@ def detect_operating_system(partition_path):
             os_info["details"]["error"] = f"Failed to extract Windows version: {e}"
 
     # macOS
-    elif os.path.exists(os.path.join(partition_path, "System/Library/CoreServices/SystemVersion.plist")):
+    elif userspace_fs.exists(os.path.join(partition_path, "System/Library/CoreServices/SystemVersion.plist")):
         os_info["type"] = "MacOS"
         try:
             plist_path = os.path.join(partition_path, "System/Library/CoreServices/SystemVersion.plist")
-            with open(plist_path, "rb") as f:
+            with userspace_fs.open_file(plist_path, "rb") as f:
                 plist_data = plistlib.load(f)
                 os_info["details"] = {key: plist_data[key] for key in plist_data}
         except Exception as e:
@@ -88,8 +178,8 @@ def detect_users(partition_path, os_type):
         # Detect Linux users
         if os_type == "Linux":
             passwd_path = os.path.join(partition_path, "etc/passwd")
-            if os.path.exists(passwd_path):
-                with open(passwd_path, "r") as f:
+            if userspace_fs.exists(passwd_path):
+                with userspace_fs.open_file(passwd_path, "r") as f:
                     for line in f:
                         parts = line.split(":")
                         if len(parts) > 1:
@@ -104,10 +194,10 @@ def detect_users(partition_path, os_type):
         # Detect Windows users
         elif os_type == "Windows":
             users_dir = os.path.join(partition_path, "Users")
-            if os.path.exists(users_dir):
+            if userspace_fs.exists(users_dir):
                 users_info["users"] = [
-                    user for user in os.listdir(users_dir) 
-                    if os.path.isdir(os.path.join(users_dir, user)) and not user.startswith("Default")
+                    user for user in userspace_fs.listdir(users_dir) 
+                    if userspace_fs.isdir(os.path.join(users_dir, user)) and not user.startswith("Default")
                 ]
             else:
                 users_info["status"] = "error"
@@ -116,11 +206,11 @@ def detect_users(partition_path, os_type):
         # Detect macOS users
         elif os_type == "MacOS":
             plist_path = os.path.join(partition_path, "var/db/dslocal/nodes/Default/users")
-            if os.path.exists(plist_path):
-                for file in os.listdir(plist_path):
+            if userspace_fs.exists(plist_path):
+                for file in userspace_fs.listdir(plist_path):
                     if file.endswith(".plist"):
                         user_path = os.path.join(plist_path, file)
-                        with open(user_path, "rb") as f:
+                        with userspace_fs.open_file(user_path, "rb") as f:
                             plist_data = plistlib.load(f)
                             if "home" in plist_data:
                                 users_info["users"].append(file.replace(".plist", ""))
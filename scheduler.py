@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import threading
+from paths import SYSTEM_PATHS
+from social_analyze import HOME_DIRECTORIES
+
+# Value of a file type for personal data: documents people write first, exports and pictures next
+TYPE_WEIGHTS = {
+    ".docx": 3, ".doc": 3, ".odt": 3, ".pdf": 3, ".eml": 3, ".msg": 3,
+    ".txt": 2, ".md": 2, ".csv": 2, ".pptx": 2, ".png": 2, ".jpg": 2, ".jpeg": 2,
+    ".json": 1, ".html": 1, ".xml": 1, ".epub": 1, ".db": 1, ".sqlite": 1,
+}
+
+# Recency is measured from the newest candidate, not the current time, since images are analyzed long after capture
+RECENT_SECONDS = 30 * 86400
+STALE_SECONDS = 3 * 365 * 86400
+SMALL_FILE_SIZE = 1024 * 1024
+
+SYSTEM_PREFIXES = [path.lower() for path in SYSTEM_PATHS]
+
+COVERED = ("analyzed", "no_text", "earlier_run")
+NOT_COVERED = ("deadline", "size_cap", "failed")
+
+
+def profile_prefixes(os_type, users):
+    # Relative paths of the detected user profiles (home/<user>, Users/<user>) and of the directory holding them
+    home_base = HOME_DIRECTORIES.get(os_type)
+    if not home_base:
+        return [], None
+    return [f"{home_base}/{user}/".lower() for user in users], f"{home_base}/".lower()
+
+
+def value_score(entry, relative_path, profiles, home_base, newest_mtime):
+    path = relative_path.lower()
+    if any(path.startswith(profile) for profile in profiles):
+        location = 4
+    elif home_base and path.startswith(home_base):
+        # Profile of a user that detect_users did not report
+        location = 3
+    elif any(path == system or path.startswith(system + "/") for system in SYSTEM_PREFIXES):
+        location = 0
+    else:
+        location = 1
+
+    kind = TYPE_WEIGHTS.get(os.path.splitext(path)[1], 0)
+
+    age = max(newest_mtime - entry.mtime, 0)
+    recency = 2 * min(1, max(0, 1 - (age - RECENT_SECONDS) / (STALE_SECONDS - RECENT_SECONDS)))
+
+    # Larger files cost more time per file, so they are worth less per second spent
+    size = 1 if entry.size <= SMALL_FILE_SIZE else SMALL_FILE_SIZE / entry.size
+    return round(location + kind + recency + size, 3)
+
+
+def prioritize(entries, partition, os_type=None, users=()):
+    # Materializes the candidates and returns them highest value first, with path -> score
+    entries = list(entries)
+    profiles, home_base = profile_prefixes(os_type, users)
+    newest_mtime = max((entry.mtime for entry in entries), default=0)
+    scores = {
+        entry.path: value_score(entry, os.path.relpath(entry.path, partition).replace(os.sep, "/"), profiles, home_base, newest_mtime)
+        for entry in entries
+    }
+    entries.sort(key=lambda entry: (-scores[entry.path], entry.path))
+    return entries, scores
+
+
+def cap_sizes(entries, max_file_size=None, on_skip=None):
+    for entry in entries:
+        if max_file_size is not None and entry.size > max_file_size:
+            if on_skip:
+                on_skip(entry)
+            continue
+        yield entry
+
+
+class CoverageReport:
+    # What the analysis did and did not cover, per partition and file; shared by the partition threads
+    def __init__(self, time_budget=None, max_file_size=None):
+        self.time_budget = time_budget
+        self.max_file_size = max_file_size
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.files = {}  # partition -> {path: [status, size, score]}
+        self.waited = {}  # partition -> seconds of the run gone when its analysis got the first file
+
+    def track(self, partition, entries):
+        # Candidates count as failed until a result or a skip reason is recorded for them
+        for entry in entries:
+            with self.lock:
+                self.files.setdefault(partition, {})[entry.path] = ["failed", entry.size, None]
+            yield entry
+
+    def first_file(self, partition, entries):
+        # Discovery, ranking and hashing happen before the first file and count against the budget too
+        waiting = True
+        for entry in entries:
+            if waiting:
+                with self.lock:
+                    self.waited[partition] = round(time.monotonic() - self.started, 3)
+                waiting = False
+            yield entry
+
+    def rank(self, partition, scores):
+        with self.lock:
+            for path, score in scores.items():
+                self.files[partition][path][2] = score
+
+    def mark(self, partition, path, status, size=0):
+        with self.lock:
+            files = self.files.setdefault(partition, {})
+            files.setdefault(path, [status, size, None])[0] = status
+
+    def summary(self):
+        with self.lock:
+            partitions = {}
+            for partition, files in self.files.items():
+                totals = {status: {"files": 0, "bytes": 0} for status in COVERED + NOT_COVERED}
+                covered = {status: [] for status in COVERED}
+                not_covered = {status: [] for status in NOT_COVERED}
+                for path, (status, size, score) in sorted(files.items()):
+                    totals[status]["files"] += 1
+                    totals[status]["bytes"] += size
+                    if status in covered:
+                        covered[status].append(path)
+                    else:
+                        not_covered[status].append({"path": path, "bytes": size, "score": score})
+                for paths in not_covered.values():
+                    paths.sort(key=lambda item: -(item["score"] or 0))
+                partitions[partition] = {"totals": totals, "covered": covered, "not_covered": not_covered,
+                                         "analysis_started_seconds": self.waited.get(partition)}
+
+        return {
+            "time_budget_seconds": self.time_budget,
+            "max_file_size": self.max_file_size,
+            "elapsed_seconds": round(time.monotonic() - self.started, 3),
+            "deadline_reached": any(values["totals"]["deadline"]["files"] for values in partitions.values()),
+            "partitions": partitions,
+        }
+
+
+def write_coverage(path, coverage):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(coverage, f, indent=2)
+    print(f"[INFO] Coverage report written to: {path}")
+
+
+def coverage_lines(coverage):
+    # Plain-text summary for the console and the report
+    lines = []
+    if coverage["time_budget_seconds"]:
+        outcome = "used up before every file was started" if coverage["deadline_reached"] else "every scheduled file was started"
+        lines.append(f"Time budget: {round(coverage['time_budget_seconds'] / 60, 2)} min, {outcome}.")
+    for partition, values in coverage["partitions"].items():
+        totals = values["totals"]
+        total = sum(counts["files"] for counts in totals.values())
+        covered = sum(totals[status]["files"] for status in COVERED)
+        missing = ", ".join(f"{status.replace('_', ' ')} {totals[status]['files']}" for status in NOT_COVERED if totals[status]["files"])
+        line = f"{partition}: {covered} of {total} file(s) covered" + (f"; not covered: {missing}" if missing else "")
+        if values["analysis_started_seconds"] is not None:
+            line += f"; first file analyzed after {values['analysis_started_seconds']} s"
+        lines.append(line)
+    return lines
+
+
+def not_covered_rows(coverage):
+    # (partition, reason, path, bytes, score) of every file the analysis did not cover
+    for partition, values in coverage["partitions"].items():
+        for status, files in values["not_covered"].items():
+            for item in files:
+                yield partition, status, item["path"], item["bytes"], item["score"]
@@ -0,0 +1,123 @@
+import os
+import struct
+import zipfile
+from userspace_fs import open_file
+
+HEAD_SIZE = 4096
+
+OLE_SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+ZIP_MIMETYPES = {
+    b"application/vnd.oasis.opendocument.text": "odt",
+    b"application/epub+zip": "epub",
+}
+OOXML_PARTS = {"word/": "docx", "ppt/": "pptx", "xl/": "xlsx"}
+
+# Extensions whose parser reads text; text content keeps one of these, anything else is read as plain text
+TEXT_EXTENSIONS = (".txt", ".log", ".md", ".csv", ".json", ".html", ".xml", ".eml", ".msg")
+
+# Sniffed type -> extractor, as the extension the extractors are dispatched on; the file's own extension is kept
+# when it belongs to the same family
+TYPE_EXTENSIONS = {
+    "pdf": (".pdf",),
+    "docx": (".docx",),
+    "pptx": (".pptx",),
+    "odt": (".odt",),
+    "epub": (".epub",),
+    "sqlite": (".db", ".sqlite"),
+    "png": (".png",),
+    "jpeg": (".jpg", ".jpeg"),
+}
+
+
+def text_encoding(head):
+    # Returns the encoding of text-like content, or None for binary data
+    if head.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    if head.startswith((b"\xff\xfe", b"\xfe\xff")):
+        return "utf-16"
+
+    if b"\x00" in head:
+        # UTF-16 without a BOM: every other byte of ASCII-range text is zero
+        even, odd = head[0::2], head[1::2]
+        if odd.count(0) > 0.4 * len(odd) and even.count(0) < 0.05 * len(even):
+            return "utf-16-le"
+        if even.count(0) > 0.4 * len(even) and odd.count(0) < 0.05 * len(odd):
+            return "utf-16-be"
+        return None
+
+    # A multi-byte character may be cut off at the end of the sample
+    for cut in range(4):
+        try:
+            text = head[:len(head) - cut].decode("utf-8")
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        return None
+
+    controls = sum(1 for char in text if ord(char) < 32 and char not in "\t\n\r\f\x1b")
+    return "utf-8" if controls <= 0.02 * max(len(text), 1) else None
+
+
+def zip_type(head, f):
+    # ODF and EPUB store their mimetype first and uncompressed; OOXML is recognized by its part names
+    name_length, extra_length = struct.unpack_from("<HH", head, 26) if len(head) >= 30 else (0, 0)
+    if head[30:30 + name_length] == b"mimetype":
+        content = head[30 + name_length + extra_length:]
+        for mimetype, file_type in ZIP_MIMETYPES.items():
+            if content.startswith(mimetype):
+                return file_type
+
+    try:
+        f.seek(0)
+        names = zipfile.ZipFile(f).namelist()
+    except (zipfile.BadZipFile, OSError, ValueError):
+        return "zip"
+    for prefix, file_type in OOXML_PARTS.items():
+        if any(name.startswith(prefix) for name in names):
+            return file_type
+    return "zip"
+
+
+def sniff(file_path, head_size=HEAD_SIZE):
+    # Returns (type, encoding) from the first bytes of the file; type is "binary" when nothing matches
+    with open_file(file_path, "rb") as f:
+        head = f.read(head_size)
+        if not head:
+            return "empty", None
+        if head.startswith(b"%PDF-") or head.find(b"%PDF-", 0, 1024) >= 0:
+            return "pdf", None
+        if head.startswith(b"PK\x03\x04"):
+            return zip_type(head, f), None
+        if head.startswith(OLE_SIGNATURE):
+            return "ole", None
+        if head.startswith(b"SQLite format 3\x00"):
+            return "sqlite", None
+        if head.startswith(b"\x89PNG\r\n\x1a\n"):
+            return "png", None
+        if head.startswith(b"\xff\xd8\xff"):
+            return "jpeg", None
+
+    encoding = text_encoding(head)
+    return ("text", encoding) if encoding else ("binary", None)
+
+
+def route(file_path, allowed=None):
+    # Returns (extractor extension, encoding, sniffed type); the extension is None when the file is not analyzed:
+    # binary data, formats without an extractor and types outside allowed
+    file_type, encoding = sniff(file_path)
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if file_type == "text":
+        # Text in a format that is not analyzed is still read as plain text
+        readable = extension in TEXT_EXTENSIONS and (allowed is None or extension in allowed)
+        target = extension if readable else ".txt"
+    elif file_type in TYPE_EXTENSIONS:
+        family = TYPE_EXTENSIONS[file_type]
+        target = extension if extension in family else family[0]
+    else:
+        target = None
+
+    if target is not None and allowed is not None and target not in allowed:
+        target = None
+    return target, encoding, file_type
@@ -1,147 +1,295 @@
 import os
-import sqlite3
-import shutil
-
-def extract_social_media_data(partition_path, output_file='social_media_analysis.txt'):
-
-    social_media_domains = [
-        'facebook.com', 'twitter.com', 'instagram.com', 'linkedin.com',
-        'tiktok.com', 'pinterest.com', 'reddit.com', 'snapchat.com',
-        'tumblr.com', 'vk.com', 'whatsapp.com', 'youtube.com', 'discord.com',
-        'flickr.com', 'wechat.com', 'viber.com', 'zoom.us', 'skype.com',
-        'myspace.com', 'periscope.tv', 'xing.com', 'soundcloud.com', 'spotify.com',
-        'yahoo.com', 'meetup.com', 'foursquare.com', 'quora.com', 'mix.com',
-        'plurk.com', 'behance.net', 'dribbble.com', 'medium.com', 'slack.com',
-        'telegram.org', 'line.me', 'weibo.com', 'snapchat.com', 'reddit.com',
-        'clubhouse.com', 'kakao.com', 'ok.ru', 'twitch.tv', 'dailymotion.com',
-        'badoo.com', 'match.com', 'grindr.com', 'taringa.net', 'ask.fm', 'vimeo.com',
-        'foursquare.com', 'periscope.tv', 'stumbleupon.com', 'livejournal.com', 'icq.com',
-        'yandex.ru', 'turing.com', 'baidu.com', 'qq.com', 'bilibili.com', 'douyin.com',
-        'koubei.com', 'renren.com', 'douban.com', 'qqmail.com', 'zhihu.com', 'whatsapp.com'
-    ]
-
-    browser_files = {
-        'chrome': {
-            'history': ['History'],
-            'cookies': ['Cookies']
-        },
-        'firefox': {
-            'history': ['places.sqlite'],
-            'cookies': ['cookies.sqlite']
-        },
-        'edge': {
-            'history': ['History'],
-            'cookies': ['Cookies']
-        },
-        'opera': {
-            'history': ['History'],
-            'cookies': ['Cookies']
-        },
-        'safari': {
-            'history': ['History.db'],
-            'cookies': ['Cookies.binarycookies']
-        }
+from urllib.parse import urlsplit
+from sqlite_reader import connect_readonly, iter_rows
+import metrics
+import userspace_fs
+
+SOCIAL_MEDIA_DOMAINS = list(dict.fromkeys([
+    'facebook.com', 'twitter.com', 'instagram.com', 'linkedin.com',
+    'tiktok.com', 'pinterest.com', 'reddit.com', 'snapchat.com',
+    'tumblr.com', 'vk.com', 'whatsapp.com', 'youtube.com', 'discord.com',
+    'flickr.com', 'wechat.com', 'viber.com', 'zoom.us', 'skype.com',
+    'myspace.com', 'periscope.tv', 'xing.com', 'soundcloud.com', 'spotify.com',
+    'yahoo.com', 'meetup.com', 'foursquare.com', 'quora.com', 'mix.com',
+    'plurk.com', 'behance.net', 'dribbble.com', 'medium.com', 'slack.com',
+    'telegram.org', 'line.me', 'weibo.com', 'snapchat.com', 'reddit.com',
+    'clubhouse.com', 'kakao.com', 'ok.ru', 'twitch.tv', 'dailymotion.com',
+    'badoo.com', 'match.com', 'grindr.com', 'taringa.net', 'ask.fm', 'vimeo.com',
+    'foursquare.com', 'periscope.tv', 'stumbleupon.com', 'livejournal.com', 'icq.com',
+    'yandex.ru', 'turing.com', 'baidu.com', 'qq.com', 'bilibili.com', 'douyin.com',
+    'koubei.com', 'renren.com', 'douban.com', 'qqmail.com', 'zhihu.com', 'whatsapp.com'
+]))  # duplicates collapsed, order kept
+
+
+class DomainMatcher:
+    # Reversed-label trie: "www.m.facebook.com" walks com -> facebook and stops at the first listed domain,
+    # so every host is classified in one pass over its labels, whatever the number of domains
+    def __init__(self, domains):
+        self.domains = [domain.lower() for domain in domains]
+        self.trie = {}
+        for domain in domains:
+            node = self.trie
+            for label in reversed(domain.lower().split('.')):
+                node = node.setdefault(label, {})
+            node[None] = domain
+
+    def match_host(self, host):
+        if not host:
+            return None
+        node = self.trie
+        for label in reversed(host.lower().strip('.').split('.')):
+            node = node.get(label)
+            if node is None:
+                return None
+            if None in node:
+                return node[None]
+        return None
+
+    def match_url(self, url):
+        if not url:
+            return None
+        try:
+            host = urlsplit(url if '://' in url else f"//{url}").hostname
+        except ValueError:
+            return None
+        return self.match_host(host)
+
+    # SQL predicates that let SQLite drop unrelated rows before they reach Python;
+    # they only preselect candidates, match_url/match_host still decide
+
+    def rev_host_predicate(self, column):
+        # Firefox stores hosts reversed with a trailing dot ("moc.koobecaf.www."), so the domain
+        # and all its subdomains form one indexed range [rev + ".", rev + "/")
+        clauses, params = [], []
+        for domain in self.domains:
+            reversed_domain = domain[::-1]
+            clauses.append(f"({column} >= ? AND {column} < ?)")
+            params.extend([reversed_domain + ".", reversed_domain + "/"])
+        return " OR ".join(clauses), params
+
+    def host_predicate(self, column):
+        clauses, params = [], []
+        for domain in self.domains:
+            clauses.append(f"{column} = ? OR {column} LIKE ?")
+            params.extend([domain, "%." + domain])
+        return " OR ".join(clauses), params
+
+    def url_predicate(self, column):
+        clauses, params = [], []
+        for domain in self.domains:
+            clauses.append(f"{column} LIKE ? OR {column} LIKE ?")
+            params.extend(["%://" + domain + "%", "%." + domain + "%"])
+        return " OR ".join(clauses), params
+
+
+SOCIAL_MEDIA_MATCHER = DomainMatcher(SOCIAL_MEDIA_DOMAINS)
+
+
+# Files relative to a profile directory; newer Chromium keeps cookies under Network/
+BROWSER_FILES = {
+    'chrome': {
+        'history': ['History'],
+        'cookies': ['Cookies', 'Network/Cookies']
+    },
+    'firefox': {
+        'history': ['places.sqlite'],
+        'cookies': ['cookies.sqlite']
+    },
+    'edge': {
+        'history': ['History'],
+        'cookies': ['Cookies', 'Network/Cookies']
+    },
+    'opera': {
+        'history': ['History'],
+        'cookies': ['Cookies', 'Network/Cookies']
+    },
+    'safari': {
+        'history': ['History.db'],
+        'cookies': ['Cookies.binarycookies']
     }
+}
+
+# Browser data roots relative to a user's home; profiles are the root itself or its direct subdirectories
+BROWSER_PROFILE_ROOTS = {
+    'Windows': {
+        'chrome': ['AppData/Local/Google/Chrome/User Data'],
+        'edge': ['AppData/Local/Microsoft/Edge/User Data'],
+        'opera': ['AppData/Roaming/Opera Software/Opera Stable'],
+        'firefox': ['AppData/Roaming/Mozilla/Firefox/Profiles'],
+    },
+    'Linux': {
+        'chrome': ['.config/google-chrome', '.config/chromium'],
+        'edge': ['.config/microsoft-edge'],
+        'opera': ['.config/opera'],
+        'firefox': ['.mozilla/firefox', 'snap/firefox/common/.mozilla/firefox'],
+    },
+    'MacOS': {
+        'chrome': ['Library/Application Support/Google/Chrome'],
+        'edge': ['Library/Application Support/Microsoft Edge'],
+        'opera': ['Library/Application Support/com.operasoftware.Opera'],
+        'firefox': ['Library/Application Support/Firefox/Profiles'],
+        'safari': ['Library/Safari', 'Library/Cookies'],
+    },
+}
+
+HOME_DIRECTORIES = {
+    'Windows': 'Users',
+    'Linux': 'home',
+    'MacOS': 'Users',
+}
+
+
+def list_directories(path):
+    try:
+        return [os.path.join(path, name) for name in userspace_fs.listdir(path) if userspace_fs.isdir(os.path.join(path, name))]
+    except OSError:
+        return []
+
+
+def resolve_browser_files(partition_path, os_type, users):
+    # Yields (browser, kind, path) for the known profile layouts of every detected user
+    os_types = [os_type] if os_type in BROWSER_PROFILE_ROOTS else list(BROWSER_PROFILE_ROOTS)
 
+    for current_os in os_types:
+        home_base = os.path.join(partition_path, HOME_DIRECTORIES[current_os])
+        if users and current_os == os_type:
+            homes = [os.path.join(home_base, user) for user in users]
+        else:
+            homes = list_directories(home_base)
+
+        for home in homes:
+            for browser, roots in BROWSER_PROFILE_ROOTS[current_os].items():
+                for root in roots:
+                    root_path = os.path.join(home, root)
+                    if not userspace_fs.isdir(root_path):
+                        continue
+                    for profile in [root_path] + list_directories(root_path):
+                        for kind, file_names in BROWSER_FILES[browser].items():
+                            for file_name in file_names:
+                                file_path = os.path.join(profile, file_name)
+                                if userspace_fs.isfile(file_path):
+                                    yield browser, kind, file_path
+
+
+def extract_social_media_data(partition_path, os_type=None, users=None, store=None, entries=None):
+    # entries: optional discovery pass over the whole partition, used as an opt-in fallback
+    # for browser files outside the known profile layouts
     results = []
+    analyzed = set()
 
-    for root, dirs, files in os.walk(partition_path):
-        for file in files:
-            for browser, file_types in browser_files.items():
-                if file in file_types['history']:
-                    analyze_history_file(os.path.join(root, file), social_media_domains, results, browser)
-                if file in file_types['cookies']:
-                    analyze_cookies_file(os.path.join(root, file), social_media_domains, results, browser)
-
-    with open(output_file, 'a') as f:
-        for result in results:
-            f.write(str(result) + '\n')
+    def analyze(browser, kind, file_path):
+        if (browser, file_path) in analyzed:
+            return
+        analyzed.add((browser, file_path))
+        found = len(results)
+        if kind == 'history':
+            analyze_history_file(file_path, SOCIAL_MEDIA_MATCHER, results, browser)
+        else:
+            analyze_cookies_file(file_path, SOCIAL_MEDIA_MATCHER, results, browser)
+        try:
+            size = userspace_fs.getsize(file_path)
+        except OSError:
+            size = 0
+        metrics.record("social", metrics.extension_of(file_path), files=1, bytes=size, rows=len(results) - found)
+
+    for browser, kind, file_path in resolve_browser_files(partition_path, os_type, users):
+        analyze(browser, kind, file_path)
+
+    if not analyzed and entries is None:
+        print("[WARNING] No browser profiles found in the known locations. Use --social-full-scan to search the whole partition.")
+
+    for entry in entries or []:
+        if entry.type != "file" or any(file_path == entry.path for _, file_path in analyzed):
+            continue
+        candidates = [
+            (browser, kind)
+            for browser, file_types in BROWSER_FILES.items()
+            for kind, file_names in file_types.items()
+            if entry.name in [os.path.basename(file_name) for file_name in file_names]
+        ]
+        if candidates:
+            # Chromium browsers share file names; the profile path tells them apart
+            lowered = entry.path.lower()
+            browser, kind = next((c for c in candidates if c[0] in lowered), candidates[0])
+            analyze(browser, kind, entry.path)
+
+    if store:
+        store.add_social(results)
     
     simply_results = [{"browser": result["browser"], "host": result["host"]} for result in results]
     return count_hosts_by_browser(simply_results)
 
-def analyze_history_file(history_file, social_media_domains, results, browser):
+def analyze_history_file(history_file, matcher, results, browser):
     try:
-        temp_folder = './temp'
-        os.makedirs(temp_folder, exist_ok=True)
-
-        history_file_name = os.path.basename(history_file)
-        history_file_copy = os.path.join(temp_folder, history_file_name)
-
-        shutil.copy(history_file, history_file_copy)
-
-        os.chmod(history_file_copy, 0o555)
-
-        conn = sqlite3.connect(history_file_copy)
-        cursor = conn.cursor()
-        print(f"[INFO] Analyzing ({browser}): {history_file_copy}")
-
-        if browser in ['chrome', 'edge', 'opera']:
-            cursor.execute("SELECT url, title, visit_count, last_visit_time FROM urls")
-        elif browser == 'firefox':
-            cursor.execute("SELECT url, title, visit_count FROM moz_places")
-        elif browser == 'safari':
-            cursor.execute("SELECT history_item, visit_count FROM history_visits")
-        else:
-            return
-
-        for row in cursor.fetchall():
-            for domain in social_media_domains:
-                if domain in row[0]:
-                    results.append({
-                        "browser": browser,
-                        "file": history_file,
-                        "host": row[0],
-                        "title": row[1] if len(row) > 1 else None,
-                        "visit_count": row[2] if len(row) > 2 else None,
-                        "last_visit_time": row[3] if len(row) > 3 else None
-                    })
-        conn.close()
-
-        os.remove(history_file_copy)
+        with userspace_fs.local_path(history_file) as db_path:
+            conn = connect_readonly(db_path)
+            print(f"[INFO] Analyzing ({browser}): {history_file}")
+
+            try:
+                if browser in ['chrome', 'edge', 'opera']:
+                    predicate, params = matcher.url_predicate("url")
+                    rows = iter_rows(conn, f"SELECT url, title, visit_count, last_visit_time FROM urls WHERE {predicate}", params)
+                elif browser == 'firefox':
+                    predicate, params = matcher.rev_host_predicate("rev_host")
+                    rows = iter_rows(conn, f"SELECT url, title, visit_count FROM moz_places WHERE {predicate}", params)
+                elif browser == 'safari':
+                    predicate, params = matcher.url_predicate("url")
+                    rows = iter_rows(conn, f"SELECT url, NULL, visit_count FROM history_items WHERE {predicate}", params)
+                else:
+                    return
+
+                for row in rows:
+                    domain = matcher.match_url(row[0])
+                    if domain:
+                        results.append({
+                            "browser": browser,
+                            "file": history_file,
+                            "host": row[0],
+                            "domain": domain,
+                            "title": row[1] if len(row) > 1 else None,
+                            "visit_count": row[2] if len(row) > 2 else None,
+                            "last_visit_time": row[3] if len(row) > 3 else None
+                        })
+            finally:
+                conn.close()
 
     except Exception as e:
         print(f"[ERROR] Error: ({browser}): {history_file}, {e}")
 
 
-def analyze_cookies_file(cookies_file, social_media_domains, results, browser):
+def analyze_cookies_file(cookies_file, matcher, results, browser):
     try:
-        temp_folder = './temp'
-        os.makedirs(temp_folder, exist_ok=True)
-
-        cookies_file_name = os.path.basename(cookies_file)
-        cookies_file_copy = os.path.join(temp_folder, cookies_file_name)
-
-        shutil.copy(cookies_file, cookies_file_copy)
-
-        os.chmod(cookies_file_copy, 0o555)
-
-        if browser == 'safari' and cookies_file_copy.endswith('.binarycookies'):
-            print(f"[INFO] Cookies Safari ({browser}) : {cookies_file_copy}")
-            return
-
-        conn = sqlite3.connect(cookies_file_copy)
-        cursor = conn.cursor()
-        print(f"[INFO] Analyzing cookies ({browser}): {cookies_file_copy}")
-
-        if browser in ['chrome', 'edge', 'opera', 'firefox']:
-            cursor.execute("SELECT host_key, name, value FROM cookies")
-        else:
+        if browser == 'safari' and cookies_file.endswith('.binarycookies'):
+            print(f"[INFO] Cookies Safari ({browser}) : {cookies_file}")
             return
 
-        for row in cursor.fetchall():
-            for domain in social_media_domains:
-                if domain in row[0]:
-                    results.append({
-                        "browser": browser,
-                        "file": cookies_file,
-                        "host": row[0],
-                        "cookie_name": row[1],
-                        "cookie_value": row[2]
-                    })
-        conn.close()
-
-        os.remove(cookies_file_copy)
+        with userspace_fs.local_path(cookies_file) as db_path:
+            conn = connect_readonly(db_path)
+            print(f"[INFO] Analyzing cookies ({browser}): {cookies_file}")
+
+            try:
+                if browser in ['chrome', 'edge', 'opera']:
+                    predicate, params = matcher.host_predicate("host_key")
+                    rows = iter_rows(conn, f"SELECT host_key, name, value FROM cookies WHERE {predicate}", params)
+                elif browser == 'firefox':
+                    predicate, params = matcher.host_predicate("host")
+                    rows = iter_rows(conn, f"SELECT host, name, value FROM moz_cookies WHERE {predicate}", params)
+                else:
+                    return
+
+                for row in rows:
+                    domain = matcher.match_host(row[0])
+                    if domain:
+                        results.append({
+                            "browser": browser,
+                            "file": cookies_file,
+                            "host": row[0],
+                            "domain": domain,
+                            "cookie_name": row[1],
+                            "cookie_value": row[2]
+                        })
+            finally:
+                conn.close()
 
     except Exception as e:
         print(f"[ERROR] Error ({browser}): {cookies_file}, {e}")
@@ -0,0 +1,56 @@
+import os
+import sqlite3
+from urllib.parse import quote
+
+# Declared types that get TEXT affinity in SQLite; untyped columns may hold text as well
+TEXT_TYPES = ("CHAR", "CLOB", "TEXT")
+
+
+def connect_readonly(db_path):
+    # Opens the evidence file in place: no copy, no journal, no locks
+    uri = f"file:{quote(os.path.abspath(db_path))}?mode=ro&immutable=1"
+    return sqlite3.connect(uri, uri=True)
+
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def text_columns(conn, table_name):
+    columns = []
+    for _, name, declared_type, *_ in conn.execute(f"PRAGMA table_info({quote_identifier(table_name)})"):
+        declared_type = (declared_type or "").upper()
+        if not declared_type or any(text_type in declared_type for text_type in TEXT_TYPES):
+            columns.append(name)
+    return columns
+
+
+def iter_rows(conn, query, params=(), batch_size=1000):
+    cursor = conn.execute(query, params)
+    while rows := cursor.fetchmany(batch_size):
+        yield from rows
+
+
+def iter_text_rows(db_path, batch_size=1000):
+    # Yields (table, values) with only the TEXT values of every row; BLOBs never leave SQLite
+    conn = connect_readonly(db_path)
+    try:
+        tables = conn.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
+        for (table_name,) in tables:
+            try:
+                columns = text_columns(conn, table_name)
+                if not columns:
+                    continue
+                selected = ", ".join(
+                    f"CASE WHEN typeof({quote_identifier(column)}) = 'text' THEN {quote_identifier(column)} END"
+                    for column in columns
+                )
+                for row in iter_rows(conn, f"SELECT {selected} FROM {quote_identifier(table_name)}", batch_size=batch_size):
+                    values = [value for value in row if value]
+                    if values:
+                        yield table_name, values
+            except sqlite3.DatabaseError as e:
+                print(f"[WARNING] Cannot read table {table_name} in {db_path}: {e}")
+                continue
+    finally:
+        conn.close()
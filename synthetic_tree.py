@@ -0,0 +1,209 @@
+import os
+import csv
+import json
+import random
+import shutil
+import sqlite3
+
+FIRST_NAMES = ["Anna", "Jan", "Maria", "Piotr", "Katarzyna", "Tomasz", "Olivia", "James", "Emma", "Noah", "Sofia", "Lucas"]
+LAST_NAMES = ["Kowalska", "Nowak", "Wisniewski", "Smith", "Johnson", "Brown", "Garcia", "Muller", "Rossi", "Dubois"]
+STREETS = ["Main Street", "Oak Avenue", "Marszalkowska", "Baker Street", "Elm Road", "Pilsudskiego"]
+CITIES = ["Warsaw", "Krakow", "London", "Berlin", "Paris", "Boston"]
+WORDS = ("report meeting invoice project budget contract delivery schedule review draft final notes "
+         "customer account order payment summary quarter plan update request approval").split()
+SOCIAL_HOSTS = ["www.facebook.com", "twitter.com", "www.linkedin.com", "www.reddit.com", "www.youtube.com", "discord.com"]
+OTHER_HOSTS = ["www.example.com", "docs.python.org", "news.example.org", "shop.example.net", "mail.example.com"]
+
+# Files of each type per user at scale 1
+FILE_COUNTS = {"txt": 20, "pdf": 5, "docx": 5, "csv": 5, "json": 5, "db": 3, "png": 3, "jpg": 2}
+HISTORY_ROWS = 200
+SYSTEM_FILES = 50
+
+# Fixed modification times keep the tree identical between builds (2023-01-01 plus up to a year)
+BASE_MTIME = 1672531200
+
+
+class SyntheticPerson:
+    def __init__(self, rng):
+        self.first = rng.choice(FIRST_NAMES)
+        self.last = rng.choice(LAST_NAMES)
+        self.email = f"{self.first.lower()}.{self.last.lower()}{rng.randint(1, 99)}@example.com"
+        self.phone = f"+48 {rng.randint(500, 799)} {rng.randint(100, 999)} {rng.randint(100, 999)}"
+        self.address = f"{rng.randint(1, 200)} {rng.choice(STREETS)}, {rng.choice(CITIES)}"
+
+    def sentence(self, rng):
+        filler = " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 15)))
+        return (f"{self.first} {self.last} ({self.email}, {self.phone}) lives at {self.address}. "
+                f"The {filler} was sent on {rng.randint(1, 28)}.{rng.randint(1, 12)}.2023.")
+
+
+def paragraphs(rng, count):
+    return [SyntheticPerson(rng).sentence(rng) for _ in range(count)]
+
+
+def write_txt(path, rng):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(paragraphs(rng, rng.randint(5, 40))) + "\n")
+
+
+def write_pdf(path, rng):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+    pdf = canvas.Canvas(path, pagesize=letter, invariant=1)
+    for _ in range(rng.randint(1, 3)):
+        y = 750
+        for text in paragraphs(rng, 12):
+            pdf.drawString(40, y, text[:110])
+            y -= 20
+        pdf.showPage()
+    pdf.save()
+
+
+def write_docx(path, rng):
+    from docx import Document
+    document = Document()
+    for text in paragraphs(rng, rng.randint(5, 30)):
+        document.add_paragraph(text)
+    document.save(path)
+
+
+def write_csv(path, rng):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["first_name", "last_name", "email", "phone", "address"])
+        for _ in range(rng.randint(20, 200)):
+            person = SyntheticPerson(rng)
+            writer.writerow([person.first, person.last, person.email, person.phone, person.address])
+
+
+def write_json(path, rng):
+    people = [SyntheticPerson(rng) for _ in range(rng.randint(10, 100))]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"customers": [vars(person) for person in people]}, f, indent=1)
+
+
+def write_db(path, rng):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE contacts (id INTEGER PRIMARY KEY, name TEXT, email TEXT, phone TEXT, note TEXT, photo BLOB)")
+        for _ in range(rng.randint(20, 200)):
+            person = SyntheticPerson(rng)
+            conn.execute("INSERT INTO contacts (name, email, phone, note, photo) VALUES (?, ?, ?, ?, ?)",
+                         (f"{person.first} {person.last}", person.email, person.phone, person.sentence(rng), rng.randbytes(64)))
+    conn.close()
+
+
+def write_image(path, rng):
+    from PIL import Image, ImageDraw
+    image = Image.new("RGB", (800, 240), "white")
+    draw = ImageDraw.Draw(image)
+    person = SyntheticPerson(rng)
+    for line, text in enumerate([f"{person.first} {person.last}", person.email, person.phone, person.address]):
+        draw.text((20, 20 + line * 50), text, fill="black")
+    image.save(path)
+
+
+WRITERS = {
+    "txt": write_txt, "pdf": write_pdf, "docx": write_docx, "csv": write_csv,
+    "json": write_json, "db": write_db, "png": write_image, "jpg": write_image,
+}
+
+DIRECTORIES = {
+    "txt": "Documents/notes", "pdf": "Documents", "docx": "Documents/work", "csv": "Documents/exports",
+    "json": "Downloads", "db": "Documents/data", "png": "Pictures", "jpg": "Pictures/camera",
+}
+
+
+def visits(rng, count):
+    for _ in range(count):
+        host = rng.choice(SOCIAL_HOSTS if rng.random() < 0.4 else OTHER_HOSTS)
+        path = "/".join(rng.choice(WORDS) for _ in range(rng.randint(0, 3)))
+        yield host, f"https://{host}/{path}", " ".join(rng.choice(WORDS) for _ in range(3)).title(), rng.randint(1, 50)
+
+
+def write_chrome_profile(profile, rng, count):
+    os.makedirs(profile, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(profile, "History"))
+    with conn:
+        conn.execute("CREATE TABLE urls (id INTEGER PRIMARY KEY, url LONGVARCHAR, title LONGVARCHAR, "
+                     "visit_count INTEGER, typed_count INTEGER, last_visit_time INTEGER, hidden INTEGER)")
+        conn.executemany("INSERT INTO urls (url, title, visit_count, typed_count, last_visit_time, hidden) VALUES (?, ?, ?, 0, ?, 0)",
+                         [(url, title, count_, 13300000000000000 + rng.randint(0, 10 ** 13)) for _, url, title, count_ in visits(rng, count)])
+    conn.close()
+
+    conn = sqlite3.connect(os.path.join(profile, "Cookies"))
+    with conn:
+        conn.execute("CREATE TABLE cookies (creation_utc INTEGER, host_key TEXT, name TEXT, value TEXT, path TEXT)")
+        conn.executemany("INSERT INTO cookies VALUES (?, ?, ?, ?, '/')",
+                         [(13300000000000000, "." + host.removeprefix("www."), rng.choice(["sid", "token", "lang"]), rng.randbytes(8).hex())
+                          for host, *_ in visits(rng, count // 4)])
+    conn.close()
+
+
+def write_firefox_profile(profile, rng, count):
+    os.makedirs(profile, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(profile, "places.sqlite"))
+    with conn:
+        conn.execute("CREATE TABLE moz_places (id INTEGER PRIMARY KEY, url LONGVARCHAR, title LONGVARCHAR, "
+                     "rev_host LONGVARCHAR, visit_count INTEGER, last_visit_date INTEGER)")
+        conn.executemany("INSERT INTO moz_places (url, title, rev_host, visit_count, last_visit_date) VALUES (?, ?, ?, ?, ?)",
+                         [(url, title, host[::-1] + ".", count_, 1680000000000000) for host, url, title, count_ in visits(rng, count)])
+    conn.close()
+
+    conn = sqlite3.connect(os.path.join(profile, "cookies.sqlite"))
+    with conn:
+        conn.execute("CREATE TABLE moz_cookies (id INTEGER PRIMARY KEY, host TEXT, name TEXT, value TEXT, path TEXT)")
+        conn.executemany("INSERT INTO moz_cookies (host, name, value, path) VALUES (?, ?, ?, '/')",
+                         [("." + host.removeprefix("www."), rng.choice(["sid", "token", "lang"]), rng.randbytes(8).hex())
+                          for host, *_ in visits(rng, count // 4)])
+    conn.close()
+
+
+def write_system(root, rng, count):
+    # Linux markers for OS and user detection, plus files under system paths that discovery skips by default
+    os.makedirs(os.path.join(root, "etc"), exist_ok=True)
+    with open(os.path.join(root, "etc/os-release"), "w") as f:
+        f.write('NAME="Synthetic Linux"\nID=synthetic\nVERSION_ID="1.0"\n')
+    for number in range(count):
+        directory = os.path.join(root, "usr/share/doc", f"package{number % 10}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"README{number}.txt"), "w") as f:
+            f.write(" ".join(rng.choice(WORDS) for _ in range(200)))
+    os.makedirs(os.path.join(root, "var/log"), exist_ok=True)
+    with open(os.path.join(root, "var/log/syslog.log"), "wb") as f:
+        f.write(rng.randbytes(64 * 1024))
+
+
+def build_tree(root, scale=1, seed=0, users=2):
+    # Builds a Linux-like partition tree under root; the same seed and scale always give the same files and contents.
+    # Returns a manifest with the number and size of the files of each type.
+    rng = random.Random(seed)
+    if os.path.exists(root):
+        shutil.rmtree(root)
+    os.makedirs(root)
+
+    write_system(root, rng, SYSTEM_FILES * scale)
+    names = [f"user{number}" for number in range(users)]
+    with open(os.path.join(root, "etc/passwd"), "w") as f:
+        f.write("root:x:0:0:root:/root:/bin/bash\n")
+        for number, name in enumerate(names):
+            f.write(f"{name}:x:{1000 + number}:{1000 + number}::/home/{name}:/bin/bash\n")
+
+    manifest = {"root": root, "seed": seed, "scale": scale, "users": names, "files": {}, "bytes": {}}
+    for name in names:
+        home = os.path.join(root, "home", name)
+        for file_type, count in FILE_COUNTS.items():
+            directory = os.path.join(home, DIRECTORIES[file_type])
+            os.makedirs(directory, exist_ok=True)
+            for number in range(count * scale):
+                path = os.path.join(directory, f"{file_type}_{number:05d}.{file_type}")
+                WRITERS[file_type](path, rng)
+                mtime = BASE_MTIME + rng.randint(0, 365 * 86400)
+                os.utime(path, (mtime, mtime))
+                manifest["files"][file_type] = manifest["files"].get(file_type, 0) + 1
+                manifest["bytes"][file_type] = manifest["bytes"].get(file_type, 0) + os.path.getsize(path)
+
+        write_chrome_profile(os.path.join(home, ".config/google-chrome/Default"), rng, HISTORY_ROWS * scale)
+        write_firefox_profile(os.path.join(home, ".mozilla/firefox/synthetic.default-release"), rng, HISTORY_ROWS * scale)
+    manifest["history_rows"] = 2 * HISTORY_ROWS * scale * users
+    return manifest
@@ -0,0 +1,75 @@
+import contextlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import analyze
+from findings import FindingsStore
+from paths import FileEntry
+
+# Texts above SPILL_CHARS are spilled to ./temp/extracted; whatever way the analysis ends, none may be left behind
+
+
+class FakePipeline:
+    def tokenizer(self, text, **kwargs):
+        return {"offset_mapping": [match.span() for match in re.finditer(r"\S+", text)]}
+
+    def __call__(self, texts, batch_size=None):
+        return [[] for _ in texts]
+
+
+@pytest.fixture
+def spill_setup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(analyze, "load_ner_backend", lambda backend="torch": None)
+    entries = []
+    for index in range(6):
+        path = tmp_path / f"large_{index}.txt"
+        path.write_text(f"word{index} " * 60000, encoding="utf-8")
+        entries.append(FileEntry(str(path), path.name, "file", path.stat().st_size, 0, index))
+    store = FindingsStore(str(tmp_path / "disk.img"), str(tmp_path / "findings.db"))
+    yield entries, store
+    store.close()
+
+
+def spilled(tmp_path):
+    scratch = tmp_path / "temp" / "extracted"
+    return os.listdir(scratch) if scratch.exists() else []
+
+
+def test_spilled_texts_are_released_when_dispatch_fails(tmp_path, monkeypatch, spill_setup):
+    entries, store = spill_setup
+    monkeypatch.setattr(analyze, "worker_pipeline", lambda backend="torch": contextlib.nullcontext(FakePipeline()))
+
+    def failing(entries):
+        yield from entries[:4]
+        raise RuntimeError("discovery failed")
+
+    with ThreadPoolExecutor(max_workers=2) as extractors, pytest.raises(RuntimeError, match="discovery failed"):
+        analyze.analyze_files(failing(entries), store, extract_workers=2, queue_depth=1, max_chars=1_000_000,
+                              extractors=extractors)
+    assert spilled(tmp_path) == []
+
+
+def test_spilled_texts_are_released_when_inference_fails(tmp_path, monkeypatch, spill_setup):
+    entries, store = spill_setup
+
+    @contextlib.contextmanager
+    def broken(backend="torch"):
+        raise RuntimeError("model failed to load")
+        yield
+
+    monkeypatch.setattr(analyze, "worker_pipeline", broken)
+    with ThreadPoolExecutor(max_workers=2) as extractors, pytest.raises(RuntimeError, match="model failed to load"):
+        analyze.analyze_files(iter(entries), store, extract_workers=2, inference_workers=2, queue_depth=1,
+                              max_chars=1_000_000, extractors=extractors)
+    assert spilled(tmp_path) == []
+
+
+def test_spilled_texts_are_released_after_analysis(tmp_path, monkeypatch, spill_setup):
+    entries, store = spill_setup
+    monkeypatch.setattr(analyze, "worker_pipeline", lambda backend="torch": contextlib.nullcontext(FakePipeline()))
+    with ThreadPoolExecutor(max_workers=2) as extractors:
+        results = analyze.analyze_files(iter(entries), store, extract_workers=2, max_chars=1_000_000, extractors=extractors)
+    assert results == {entry.path: [] for entry in entries}
+    assert spilled(tmp_path) == []
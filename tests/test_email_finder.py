@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+import email_finder
+import userspace_fs
+from email_finder import scan_region, scan_text, scan_virtual_region, search_emails_in_files
+
+EMAILS = ["anna.nowak@example.com", "jan@mail.example.org", "a@b.pl", "x.y+tag@sub.domain.example.com"]
+
+
+def make_file(path):
+    # Addresses next to each other and to other word characters, so most split points fall inside one
+    content = "To: " + " ".join(EMAILS) + ",<" + EMAILS[0] + ">;\n" + "\t".join(reversed(EMAILS)) + "\n"
+    path.write_bytes(content.encode("ascii"))
+    return content
+
+
+def test_every_split_point_finds_each_address_once(tmp_path, monkeypatch):
+    path = tmp_path / "mail.txt"
+    content = make_file(path)
+    expected = scan_text(content)
+    assert expected == set(EMAILS)
+    monkeypatch.setattr(userspace_fs, "open_file", lambda file_path: open(file_path, "rb"))
+
+    for scan in (scan_region, scan_virtual_region):
+        for split in range(len(content) + 1):
+            head, tail = scan(str(path), 0, split), scan(str(path), split, len(content))
+            assert head | tail == expected, (scan.__name__, split)
+            # Matches are never cut in two at the boundary
+            assert head <= expected and tail <= expected, (scan.__name__, split)
+
+
+def test_large_files_are_scanned_in_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(email_finder, "CHUNK_SIZE", 16)
+    path = tmp_path / "mail.txt"
+    make_file(path)
+    plain = tmp_path / "plain.txt"
+    plain.write_text("nothing to see here\n", encoding="ascii")
+
+    tasks = list(email_finder.plan_tasks([str(path)]))
+    assert len(tasks) > 10 and all(chunks == len(tasks) for _, chunks, _ in tasks)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        found = search_emails_in_files([str(path), str(plain)], on_result=results.__setitem__, max_workers=4,
+                                       collector=email_finder.EmailCollector(NullStore(), results.__setitem__),
+                                       executor=executor)
+    assert found == set(EMAILS)
+    assert results == {str(path): sorted(EMAILS), str(plain): []}
+
+
+class NullStore:
+    def add_emails(self, path, emails):
+        pass
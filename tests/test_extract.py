@@ -0,0 +1,56 @@
+import sqlite3
+from email_finder import find_emails, needs_decoding
+from extract import extract_texts
+
+ROWS = 20000
+
+
+def make_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE contacts (name TEXT, email TEXT)")
+    conn.executemany("INSERT INTO contacts VALUES (?, ?)", ((f"User {i}", f"user{i}@example.com") for i in range(ROWS)))
+    conn.commit()
+    conn.close()
+
+
+def test_detectors_read_past_the_text_budget(tmp_path):
+    path = str(tmp_path / "contacts.db")
+    make_database(path)
+
+    [(text, error, detections, stats)] = extract_texts([path], max_chars=10000, detectors={"emails": (find_emails, needs_decoding)})
+    try:
+        assert error is None
+        # NER gets the budgeted text only, the detector sees every row
+        assert len(text) == stats["characters"] == 10000
+        assert sorted(detections["emails"]) == sorted(f"user{i}@example.com" for i in range(ROWS))
+    finally:
+        text.release()
+
+
+def test_detectors_only_run_on_selected_files(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("contact: anna@example.com\n", encoding="utf-8")
+
+    [(text, error, detections, _)] = extract_texts([str(path)], detectors={"emails": (find_emails, needs_decoding)})
+    assert error is None
+    assert text.read() == "contact: anna@example.com\n"
+    assert detections == {}
+
+
+def test_xml_text_is_streamed_in_document_order(tmp_path):
+    path = tmp_path / "contacts.xml"
+    path.write_text(
+        '<?xml version="1.0"?>\n'
+        '<!DOCTYPE contacts [<!ENTITY secret SYSTEM "file:///etc/hostname">]>\n'
+        '<contacts>\n'
+        '  <!-- exported -->\n'
+        '  <contact><first>Anna</first><last>Nowak</last></contact>\n'
+        '  <note>Call <b>Jan Kowalski</b> at jan@example.com<i>today</i>.</note>\n'
+        '  <leak>&secret;</leak>\n'
+        '</contacts>\n',
+        encoding="utf-8"
+    )
+
+    [(text, error, _, _)] = extract_texts([str(path)])
+    assert error is None
+    assert text.read().split() == ["Anna", "Nowak", "Call", "Jan", "Kowalski", "at", "jan@example.com", "today", "."]
@@ -0,0 +1,58 @@
+import hashlib
+import os
+from inventory import FileInventory
+from paths import scan_partition
+
+
+def make_tree(root):
+    for index in range(100):
+        path = root / f"file_{index:03d}.txt"
+        path.write_text(f"content {index % 10}\n", encoding="utf-8")
+
+
+def test_digests_are_hashed_off_discovery_and_stored(tmp_path):
+    partition = tmp_path / "part1"
+    partition.mkdir()
+    make_tree(partition)
+    inventory = FileInventory(str(tmp_path / "disk.img"), str(tmp_path / "inventory.db"))
+
+    discovered = list(inventory.record(str(partition), scan_partition(str(partition), False)))
+    assert all(entry.digest is None for entry in discovered)
+
+    hashed = list(inventory.hash_entries(str(partition), discovered, workers=4, lookahead=8))
+    assert [entry.path for entry in hashed] == [entry.path for entry in discovered]
+    for entry in hashed:
+        with open(entry.path, "rb") as f:
+            assert entry.digest == hashlib.sha256(f.read()).hexdigest()
+    assert len({entry.digest for entry in hashed}) == 10
+
+    # An unchanged file gets its stored digest back, a changed one loses it
+    changed = partition / "file_000.txt"
+    changed.write_text("changed\n", encoding="utf-8")
+    os.utime(changed, (1, 1))
+    digests = {entry.name: entry.digest for entry in inventory.record(str(partition), scan_partition(str(partition), False))}
+    assert digests["file_000.txt"] is None
+    assert digests["file_001.txt"] == next(entry.digest for entry in hashed if entry.name == "file_001.txt")
+    inventory.close()
+
+
+def test_earlier_results_are_kept_only_for_unchanged_files(tmp_path):
+    partition = tmp_path / "part1"
+    partition.mkdir()
+    make_tree(partition)
+    inventory = FileInventory(str(tmp_path / "disk.img"), str(tmp_path / "inventory.db"))
+    for entry in inventory.record(str(partition), scan_partition(str(partition), False)):
+        inventory.mark_done(str(partition), entry.path, "emails", [entry.name])
+    results = inventory.results(str(partition), "emails")
+
+    changed, deleted = partition / "file_000.txt", partition / "file_001.txt"
+    changed.write_text("changed\n", encoding="utf-8")
+    os.utime(changed, (1, 1))
+    deleted.unlink()
+    forgotten = []
+    list(inventory.record(str(partition), scan_partition(str(partition), False), on_changed=forgotten.append))
+    unchanged, missing = inventory.verified(str(partition), results)
+    assert forgotten == [str(changed)]
+    assert list(missing) == [str(deleted)]
+    assert len(unchanged) == 98 and str(changed) not in unchanged
+    inventory.close()
@@ -0,0 +1,71 @@
+import json
+from journal import RunJournal, read_journal
+
+
+def file_record(path):
+    return {"kind": "file", "partition": "part1", "path": path, "stage": "emails", "result": [f"{path}@example.com"]}
+
+
+def crash(journal, record):
+    # A killed run: the records so far are flushed and the next one is cut off halfway
+    journal.close()
+    line = json.dumps(record)
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write(line[:len(line) // 2])
+
+
+def replayed_paths(path, image):
+    return [record["path"] for record in read_journal(path, image)]
+
+
+def test_resume_after_repeated_crashes(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    image = str(tmp_path / "disk.img")
+
+    journal = RunJournal(path, image)
+    journal.append(file_record("a"))
+    crash(journal, file_record("lost_1"))
+
+    journal = RunJournal(path, image, resume=True)
+    assert replayed_paths(path, image) == ["a"]
+    journal.append(file_record("b"))
+    crash(journal, file_record("lost_2"))
+
+    journal = RunJournal(path, image, resume=True)
+    journal.append(file_record("c"))
+    journal.close()
+    assert replayed_paths(path, image) == ["a", "b", "c"]
+    with open(path, encoding="utf-8") as f:
+        assert all(json.loads(line) for line in f)
+
+
+def test_new_run_starts_an_empty_journal(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    image = str(tmp_path / "disk.img")
+
+    journal = RunJournal(path, image)
+    journal.append(file_record("a"))
+    journal.close()
+
+    RunJournal(path, image).close()
+    assert replayed_paths(path, image) == []
+
+
+def test_read_journal_skips_damaged_lines(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    image = str(tmp_path / "disk.img")
+    other = str(tmp_path / "other.img")
+    lines = [
+        {"kind": "run", "image": image},
+        file_record("a"),
+        {"kind": "run", "image": other},
+        file_record("other"),
+        {"kind": "run", "image": image},
+        file_record("b"),
+    ]
+    text = [json.dumps(line) for line in lines]
+    text.insert(2, '{"kind": "file", "pa')
+    path.write_text("\n".join(text) + "\n", encoding="utf-8")
+
+    assert replayed_paths(str(path), image) == ["a", "b"]
+    assert replayed_paths(str(path), other) == ["other"]
@@ -0,0 +1,59 @@
+import re
+import pytest
+from ner_engine import NEREngine
+
+
+class FakePipeline:
+    # Word tokens; every word of a window is reported as an entity with offsets relative to the window
+    def tokenizer(self, text, **kwargs):
+        return {"offset_mapping": words(text)}
+
+    def __call__(self, texts, batch_size=None):
+        return [[{"entity_group": "PER", "word": text[start:end], "score": 0.99, "start": start, "end": end}
+                 for start, end in words(text)] for text in texts]
+
+
+def words(text):
+    return [match.span() for match in re.finditer(r"\S+", text)]
+
+
+def make_text(count):
+    return " ".join(f"word{index}" for index in range(count)) + "\n"
+
+
+@pytest.mark.parametrize("count", [1, 5, 6, 7, 19, 20, 21, 33, 34, 35, 200, 1001])
+def test_windows_own_every_character_once(count):
+    engine = NEREngine(FakePipeline(), max_tokens=20, stride=6)
+    text = make_text(count)
+    windows = engine.split("key", text)
+
+    # Owned ranges tile the text, each inside its window, and the last window reaches the last token
+    assert windows[0].own_start == 0 and windows[-1].own_end == len(text)
+    for window, following in zip(windows, windows[1:]):
+        assert window.own_end == following.own_start
+    for window in windows:
+        assert window.start <= window.own_start < window.own_end
+        assert window.tokens <= 20
+    assert windows[-1].end == words(text)[-1][1]
+    # Every token is inside a window, and tokens owned by a window are whole in it
+    for start, end in words(text):
+        [owner] = [window for window in windows if window.own_start <= start < window.own_end]
+        assert end <= owner.end
+
+
+@pytest.mark.parametrize("count", [7, 20, 21, 47, 1001])
+def test_entities_in_overlaps_are_reported_once(count):
+    engine = NEREngine(FakePipeline(), max_tokens=20, stride=6, batch_size=4)
+    text = make_text(count)
+    entities = engine.analyze(text)
+    assert [(entity["start"], entity["end"]) for entity in entities] == words(text)
+    assert [entity["word"] for entity in entities] == text.split()
+
+
+def test_documents_keep_their_own_entities():
+    engine = NEREngine(FakePipeline(), max_tokens=20, stride=6, batch_size=3, pool_batches=1)
+    texts = {key: make_text(count) for key, count in [("a", 50), ("b", 3), ("c", 0), ("d", 120)]}
+    results = dict(engine.run(texts.items()))
+    assert set(results) == set(texts)
+    for key, text in texts.items():
+        assert [entity["word"] for entity in results[key]] == text.split()
@@ -0,0 +1,42 @@
+import numpy as np
+from ocr import OCREngine
+
+SHAPES = {"a.png": (1200, 1600), "b.png": (1180, 1590), "c.png": (900, 1600), "d.png": (1200, 1600), "e.png": (40, 60)}
+
+
+class FakeReader:
+    def __init__(self):
+        self.batches = []
+
+    def readtext_batched(self, images, batch_size=1):
+        assert len({image.shape for image in images}) == 1
+        self.batches.append([image.shape for image in images])
+        return [[(None, f"text {int(image[0, 0])}", 1.0)] for image in images]
+
+    def readtext(self, image, batch_size=1):
+        self.batches.append([image.shape])
+        return [(None, f"text {int(image[0, 0])}", 1.0)]
+
+
+def test_images_of_similar_size_share_a_batch():
+    engine = OCREngine(bucket=256)
+    engine.reader = FakeReader()
+    # Every image is filled with its own value, so the outputs show which image each text came from
+    engine.preprocess = lambda path: np.full(SHAPES[path], list(SHAPES).index(path), dtype=np.uint8)
+
+    outputs = engine.read_batch(list(SHAPES))
+
+    assert outputs == [(f"text {index}", None, batch) for index, batch in enumerate([3, 3, 1, 3, 1])]
+    assert sorted(engine.reader.batches) == sorted([[(1280, 1792)] * 3, [(900, 1600)], [(40, 60)]])
+
+
+def test_padding_keeps_the_image_and_uses_the_background():
+    engine = OCREngine(bucket=256)
+    image = np.full((100, 200), 255, dtype=np.uint8)
+    image[40:60, 50:150] = 0
+
+    padded = engine.pad(image, engine.bucket_shape(image.shape))
+
+    assert padded.shape == (256, 256)
+    assert (padded[:100, :200] == image).all()
+    assert (padded[100:] == 255).all() and (padded[:, 200:] == 255).all()
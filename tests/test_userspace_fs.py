@@ -0,0 +1,223 @@
+import contextlib
+import hashlib
+import os
+import random
+import shutil
+import struct
+import subprocess
+import pytest
+import userspace_fs
+from partition_table import read_partitions
+
+# Userspace reads of mkfs-built images compared with what the kernel sees when it mounts the same image.
+# Needs root, loop devices and the mkfs tools; whatever is missing is skipped.
+
+MIB = 1024 * 1024
+
+
+def populate(directory, symlinks=True):
+    rng = random.Random(0)
+    os.makedirs(os.path.join(directory, "home/user/Documents/deep/er"))
+    os.makedirs(os.path.join(directory, "empty_dir"))
+    files = {
+        "readme.txt": b"Anna Nowak, anna.nowak@example.com\n",
+        "empty.txt": b"",
+        "home/user/Documents/notes.txt": "Zażółć gęślą jaźń\n".encode("utf-8") * 100,
+        "home/user/Documents/deep/er/small.bin": rng.randbytes(5000),
+        # Spans many blocks: indirect blocks on ext2, several extents or a long cluster chain elsewhere
+        "home/user/Documents/large.bin": rng.randbytes(3 * MIB + 123),
+    }
+    for name in range(40):
+        files[f"home/user/many/file_{name:03d}_with_a_long_name.txt"] = f"{name}\n".encode()
+    for path, content in files.items():
+        os.makedirs(os.path.dirname(os.path.join(directory, path)), exist_ok=True)
+        with open(os.path.join(directory, path), "wb") as f:
+            f.write(content)
+    if symlinks:
+        os.makedirs(os.path.join(directory, "usr/lib"))
+        os.makedirs(os.path.join(directory, "etc"))
+        with open(os.path.join(directory, "usr/lib/os-release"), "w") as f:
+            f.write('NAME="Test Linux"\n')
+        for link, target in LINKS.items():
+            os.symlink(target, os.path.join(directory, link))
+
+
+# Relative targets resolve the same in the kernel mount; absolute ones only inside the image
+LINKS = {
+    "home/user/link": "Documents/notes.txt",
+    "etc/os-release": "../usr/lib/os-release",
+    "home/user/docs": "Documents",
+    "home/user/chain": "docs/deep/../notes.txt",
+    "home/user/broken": "missing.txt",
+    "home/user/loop": "loop",
+    "etc/absolute": "/usr/lib/os-release",
+}
+
+
+def digest(f):
+    return hashlib.sha256(f.read()).hexdigest()
+
+
+def kernel_tree(root):
+    tree = {}
+    for directory, names, files in os.walk(root):
+        for name in names + files:
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, root)
+            info = os.lstat(path)
+            if os.path.islink(path):
+                tree[relative] = ("symlink", info.st_size, None)
+            elif os.path.isdir(path):
+                tree[relative] = ("dir", None, None)
+            else:
+                with open(path, "rb") as f:
+                    tree[relative] = ("file", info.st_size, digest(f))
+    return tree
+
+
+def userspace_tree(root):
+    tree = {}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        for entry in userspace_fs.scandir(directory):
+            relative = os.path.relpath(entry.path, root)
+            if entry.type == "dir":
+                tree[relative] = ("dir", None, None)
+                stack.append(entry.path)
+            elif entry.type == "symlink":
+                tree[relative] = ("symlink", entry.size, None)
+            else:
+                with userspace_fs.open_file(entry.path) as f:
+                    tree[relative] = ("file", entry.size, digest(f))
+    return tree
+
+
+def run(*command):
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+@contextlib.contextmanager
+def kernel_mount(image_path, mount_point, options="ro"):
+    if os.geteuid() != 0:
+        pytest.skip("mounting needs root")
+    os.makedirs(mount_point, exist_ok=True)
+    try:
+        run("mount", "-o", f"loop,{options}", image_path, mount_point)
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip("loop mounts are not available")
+    try:
+        yield mount_point
+    finally:
+        run("umount", mount_point)
+
+
+@contextlib.contextmanager
+def userspace_root(image_path, offset=0, size=None, fs_type=None):
+    root = f"{userspace_fs.USERSPACE_ROOT}/test"
+    userspace_fs.register(root, image_path, offset, size, fs_type)
+    try:
+        yield root
+    finally:
+        userspace_fs.unregister(root)
+
+
+def require(tool):
+    if shutil.which(tool) is None:
+        pytest.skip(f"{tool} is not installed")
+
+
+def build_ext(tmp_path, tool):
+    require(tool)
+    source = tmp_path / "source"
+    populate(source)
+    image_path = str(tmp_path / "ext.img")
+    with open(image_path, "wb") as f:
+        f.truncate(16 * MIB)
+    run(tool, "-q", "-F", "-d", str(source), image_path)
+    return image_path
+
+
+def build_copied(tmp_path, tool, *arguments):
+    # FAT and exFAT mkfs cannot populate the image, so the tree is copied in through a read-write mount
+    require(tool)
+    source = tmp_path / "source"
+    populate(source, symlinks=False)
+    image_path = str(tmp_path / "fs.img")
+    with open(image_path, "wb") as f:
+        f.truncate(16 * MIB)
+    run(tool, *arguments, image_path)
+    with kernel_mount(image_path, str(tmp_path / "rw"), "rw") as mount_point:
+        shutil.copytree(source, mount_point, dirs_exist_ok=True)
+    return image_path
+
+
+@pytest.mark.parametrize("tool, fs_type", [("mkfs.ext2", "ext"), ("mkfs.ext4", "ext")])
+def test_ext_matches_kernel_mount(tmp_path, tool, fs_type):
+    image_path = build_ext(tmp_path, tool)
+    assert userspace_fs.probe(image_path) == fs_type
+    with kernel_mount(image_path, str(tmp_path / "mnt")) as mount_point, userspace_root(image_path) as root:
+        expected = kernel_tree(mount_point)
+        assert userspace_tree(root) == expected
+        assert expected["home/user/link"][0] == "symlink"
+
+
+def test_symlinks_resolve_like_kernel_mount(tmp_path):
+    image_path = build_ext(tmp_path, "mkfs.ext4")
+    with kernel_mount(image_path, str(tmp_path / "mnt")) as mount_point, userspace_root(image_path) as root:
+        paths = [link for link, target in LINKS.items() if not target.startswith("/")]
+        paths += ["home/user/docs/notes.txt", "home/user/docs/deep/er/small.bin", "home/user/docs/../docs/notes.txt"]
+        for path in paths:
+            mounted, virtual = os.path.join(mount_point, path), f"{root}/{path}"
+            assert userspace_fs.exists(virtual) == os.path.exists(mounted), path
+            assert userspace_fs.isfile(virtual) == os.path.isfile(mounted), path
+            assert userspace_fs.isdir(virtual) == os.path.isdir(mounted), path
+            if os.path.isfile(mounted):
+                assert userspace_fs.getsize(virtual) == os.path.getsize(mounted)
+                with open(mounted, "rb") as expected, userspace_fs.open_file(virtual) as f:
+                    assert f.read() == expected.read(), path
+
+        assert userspace_fs.listdir(f"{root}/home/user/docs") == sorted(os.listdir(os.path.join(mount_point, "home/user/docs")))
+        with userspace_fs.open_file(f"{root}/etc/absolute", "r") as f:
+            assert f.read() == 'NAME="Test Linux"\n'
+        with pytest.raises(OSError):
+            userspace_fs.open_file(f"{root}/home/user/loop")
+        # Listings report the links themselves
+        types = {entry.name: entry.type for entry in userspace_fs.scandir(f"{root}/home/user")}
+        assert types["docs"] == types["link"] == types["loop"] == "symlink"
+
+
+@pytest.mark.parametrize("tool, arguments, fs_type", [
+    ("mkfs.vfat", ("-F", "32"), "fat"),
+    ("mkfs.vfat", ("-F", "16"), "fat"),
+    ("mkfs.exfat", (), "exfat"),
+])
+def test_fat_matches_kernel_mount(tmp_path, tool, arguments, fs_type):
+    image_path = build_copied(tmp_path, tool, *arguments)
+    assert userspace_fs.probe(image_path) == fs_type
+    with kernel_mount(image_path, str(tmp_path / "mnt")) as mount_point, userspace_root(image_path) as root:
+        assert userspace_tree(root) == kernel_tree(mount_point)
+
+
+def test_mbr_partition_matches_kernel_mount(tmp_path):
+    filesystem = build_ext(tmp_path, "mkfs.ext4")
+    size = os.path.getsize(filesystem)
+    image_path = str(tmp_path / "disk.img")
+    with open(image_path, "wb") as f, open(filesystem, "rb") as source:
+        f.seek(MIB)
+        shutil.copyfileobj(source, f)
+        # One primary Linux partition starting at sector 2048
+        entry = struct.pack("<B3sB3sII", 0x00, b"\x00" * 3, 0x83, b"\x00" * 3, MIB // 512, size // 512)
+        f.seek(446)
+        f.write(entry)
+        f.seek(510)
+        f.write(b"\x55\xaa")
+
+    partitions = read_partitions(image_path)
+    assert [(p.number, p.offset, p.size, p.scheme, p.fs_type) for p in partitions] == [(1, MIB, size, "mbr", "ext4")]
+    assert read_partitions(filesystem)[0][:3] == (0, 0, size)
+
+    partition = partitions[0]
+    with kernel_mount(image_path, str(tmp_path / "mnt"), f"ro,offset={MIB},sizelimit={size}") as mount_point, \
+            userspace_root(image_path, partition.offset, partition.size, "ext") as root:
+        assert userspace_tree(root) == kernel_tree(mount_point)
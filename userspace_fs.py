@@ -0,0 +1,672 @@
+import io
+import os
+import errno
+import mmap
+import struct
+import shutil
+import calendar
+import tempfile
+import threading
+import posixpath
+import contextlib
+from bisect import bisect_right
+from collections import namedtuple, OrderedDict
+
+# Read-only access to filesystems inside an image file, without losetup or mount.
+# A registered volume is exposed under a virtual root such as /@image/part0, and the helpers
+# below (scandir, open_file, exists, ...) accept both virtual and regular paths.
+
+USERSPACE_ROOT = "/@image"
+SCRATCH_DIR = './temp/userspace'
+# Same limit as the kernel's ELOOP
+MAX_SYMLINKS = 40
+
+# ref is filesystem specific: inode number (ext), first cluster (FAT/exFAT)
+Node = namedtuple("Node", ["type", "size", "mtime", "inode", "ref"])
+DirEntry = namedtuple("DirEntry", ["name", "path", "type", "size", "mtime", "inode"])
+# Maps logical bytes [start, start + length) of a file to a volume offset; physical None is a hole
+Run = namedtuple("Run", ["start", "length", "physical"])
+
+
+class FilesystemError(OSError):
+    pass
+
+
+def dos_timestamp(date, time=0):
+    try:
+        return calendar.timegm((1980 + (date >> 9), (date >> 5) & 0x0F, date & 0x1F,
+                                time >> 11, (time >> 5) & 0x3F, (time & 0x1F) * 2, 0, 0, 0))
+    except (ValueError, OverflowError):
+        return 0
+
+
+def merge_runs(pieces, size):
+    # pieces: (physical offset or None, length) in file order; adjacent pieces are merged and the end clipped to size
+    runs = []
+    start = 0
+    for physical, length in pieces:
+        if start >= size:
+            break
+        length = min(length, size - start)
+        if runs:
+            last = runs[-1]
+            if (physical is None and last.physical is None) or \
+                    (physical is not None and last.physical is not None and last.physical + last.length == physical):
+                runs[-1] = last._replace(length=last.length + length)
+                start += length
+                continue
+        runs.append(Run(start, length, physical))
+        start += length
+    return runs
+
+
+class Volume:
+    case_sensitive = True
+
+    def __init__(self, data, offset, size, cached_directories=256):
+        self.data = data
+        self.offset = offset
+        self.size = size
+        # Path lookups walk the same directories over and over; recent listings are kept
+        self.cached_directories = cached_directories
+        self.directories = OrderedDict()
+        self.directories_lock = threading.Lock()
+
+    def read(self, position, size):
+        if position < 0 or position + size > self.size:
+            raise FilesystemError(f"Read outside of the volume at {position}")
+        start = self.offset + position
+        return self.data[start:start + size]
+
+    def read_runs(self, runs, position, size):
+        # Reads size bytes at position of a file described by runs, filling holes with zeros
+        output = bytearray()
+        index = max(bisect_right([run.start for run in runs], position) - 1, 0)
+        while size > 0 and index < len(runs):
+            run = runs[index]
+            if position < run.start:
+                gap = min(run.start - position, size)
+                output += bytes(gap)
+                position += gap
+                size -= gap
+                continue
+            skip = position - run.start
+            length = min(run.length - skip, size)
+            if length > 0:
+                output += bytes(length) if run.physical is None else self.read(run.physical + skip, length)
+                position += length
+                size -= length
+            index += 1
+        return bytes(output)
+
+    def read_node(self, node):
+        return self.read_runs(self.runs(node), 0, node.size)
+
+    def listing(self, node):
+        with self.directories_lock:
+            children = self.directories.get(node.ref)
+            if children is not None:
+                self.directories.move_to_end(node.ref)
+                return children
+        children = self.children(node)
+        with self.directories_lock:
+            self.directories[node.ref] = children
+            if len(self.directories) > self.cached_directories:
+                self.directories.popitem(last=False)
+        return children
+
+    def lookup(self, relative_path, follow=True, max_links=MAX_SYMLINKS):
+        # Symlinks are resolved in every component, and in the last one too when follow is set: relative targets
+        # from the directory holding the link, absolute ones from the volume root
+        parts = [part for part in relative_path.split("/") if part and part != "."]
+        parents = []
+        node = self.root
+        links = 0
+        while parts:
+            part = parts.pop(0)
+            if part == "..":
+                node = parents.pop() if parents else self.root
+                continue
+            if node.type != "dir":
+                raise FileNotFoundError(relative_path)
+            children = self.listing(node)
+            match = children.get(part)
+            if match is None and not self.case_sensitive:
+                match = next((child for name, child in children.items() if name.lower() == part.lower()), None)
+            if match is None:
+                raise FileNotFoundError(relative_path)
+            if match.type == "symlink" and (parts or follow):
+                links += 1
+                if links > max_links:
+                    raise FilesystemError(errno.ELOOP, "Too many levels of symbolic links", relative_path)
+                target = self.read_node(match).decode("utf-8", errors="surrogateescape")
+                if target.startswith("/"):
+                    parents = []
+                    node = self.root
+                parts = [part for part in target.split("/") if part and part != "."] + parts
+                continue
+            parents.append(node)
+            node = match
+        return node
+
+
+class ExtVolume(Volume):
+    # ext2/3/4: extent trees, block maps and inline data; htree directories are read linearly
+    def __init__(self, data, offset, size):
+        super().__init__(data, offset, size)
+        sb = self.read(1024, 1024)
+        if struct.unpack_from("<H", sb, 56)[0] != 0xEF53:
+            raise FilesystemError("Not an ext filesystem")
+
+        inodes_count, = struct.unpack_from("<I", sb, 0)
+        first_data_block, log_block_size, _, blocks_per_group, _, self.inodes_per_group = struct.unpack_from("<6I", sb, 20)
+        rev_level, = struct.unpack_from("<I", sb, 76)
+        self.inode_size = struct.unpack_from("<H", sb, 88)[0] if rev_level >= 1 else 128
+        incompat, = struct.unpack_from("<I", sb, 96)
+        desc_size = struct.unpack_from("<H", sb, 254)[0] if incompat & 0x80 else 32
+        desc_size = max(desc_size, 32)
+        self.block_size = 1024 << log_block_size
+
+        groups = -(-inodes_count // self.inodes_per_group)
+        table = self.read((first_data_block + 1) * self.block_size, groups * desc_size)
+        self.inode_tables = []
+        for group in range(groups):
+            low, = struct.unpack_from("<I", table, group * desc_size + 8)
+            high = struct.unpack_from("<I", table, group * desc_size + 40)[0] if desc_size >= 64 else 0
+            self.inode_tables.append(low | (high << 32))
+
+        self.root = self.node(2)
+
+    def inode_position(self, number):
+        group, index = divmod(number - 1, self.inodes_per_group)
+        return self.inode_tables[group] * self.block_size + index * self.inode_size
+
+    def node(self, number):
+        raw = self.read(self.inode_position(number), 128)
+        mode, size_low = struct.unpack_from("<HxxI", raw, 0)
+        mtime, = struct.unpack_from("<I", raw, 16)
+        size_high, = struct.unpack_from("<I", raw, 108)
+        node_type = {0x8000: "file", 0x4000: "dir", 0xA000: "symlink"}.get(mode & 0xF000, "other")
+        return Node(node_type, size_low | (size_high << 32), mtime, number, number)
+
+    def extent_pieces(self, raw):
+        magic, entries, _, depth = struct.unpack_from("<4H", raw, 0)
+        if magic != 0xF30A:
+            raise FilesystemError("Corrupted extent header")
+        for index in range(entries):
+            position = 12 + index * 12
+            if depth == 0:
+                logical, length, start_high, start_low = struct.unpack_from("<IHHI", raw, position)
+                initialized = length <= 32768
+                length = length if initialized else length - 32768
+                physical = ((start_high << 32) | start_low) * self.block_size if initialized else None
+                yield logical, length, physical
+            else:
+                _, leaf_low, leaf_high = struct.unpack_from("<IIH", raw, position)
+                yield from self.extent_pieces(self.read(((leaf_high << 32) | leaf_low) * self.block_size, self.block_size))
+
+    def mapped_blocks(self, pointers, level, blocks):
+        # Block map of ext2/3: yields physical block numbers (0 for holes) in file order
+        per_block = self.block_size // 4
+        for pointer in pointers:
+            if blocks[0] <= 0:
+                return
+            if level == 0:
+                blocks[0] -= 1
+                yield pointer
+            elif pointer == 0:
+                for _ in range(min(blocks[0], per_block ** level)):
+                    blocks[0] -= 1
+                    yield 0
+            else:
+                children = struct.unpack(f"<{per_block}I", self.read(pointer * self.block_size, self.block_size))
+                yield from self.mapped_blocks(children, level - 1, blocks)
+
+    def runs(self, node):
+        position = self.inode_position(node.ref)
+        raw = self.read(position, 128)
+        flags, = struct.unpack_from("<I", raw, 32)
+        i_block = raw[40:100]
+
+        if flags & 0x10000000:
+            # Inline data; only the part stored in i_block is read
+            return [Run(0, min(node.size, 60), position + 40)]
+        if node.type == "symlink" and node.size < 60 and not flags & 0x80000:
+            return [Run(0, node.size, position + 40)]
+
+        if flags & 0x80000:
+            pieces = sorted(self.extent_pieces(i_block))
+            runs = []
+            for logical, length, physical in pieces:
+                start = logical * self.block_size
+                if start >= node.size:
+                    break
+                runs.append(Run(start, min(length * self.block_size, node.size - start), physical))
+            return runs
+
+        pointers = struct.unpack("<15I", i_block)
+        blocks = [-(-node.size // self.block_size)]
+        mapped = []
+        for level, group in enumerate([pointers[:12], pointers[12:13], pointers[13:14], pointers[14:15]]):
+            mapped.extend(self.mapped_blocks(group, level, blocks))
+        return merge_runs([(block * self.block_size if block else None, self.block_size) for block in mapped], node.size)
+
+    def children(self, node):
+        data = self.read_node(node)
+        entries = {}
+        position = 0
+        while position + 8 <= len(data):
+            number, record_length, name_length, _ = struct.unpack_from("<IHBB", data, position)
+            if record_length < 8:
+                # Damaged entry: continue with the next block
+                position = (position // self.block_size + 1) * self.block_size
+                continue
+            if number:
+                name = data[position + 8:position + 8 + name_length].decode("utf-8", errors="surrogateescape")
+                if name not in (".", ".."):
+                    entries[name] = self.node(number)
+            position += record_length
+        return entries
+
+
+class FatVolume(Volume):
+    case_sensitive = False
+
+    def __init__(self, data, offset, size):
+        super().__init__(data, offset, size)
+        boot = self.read(0, 512)
+        bytes_per_sector, sectors_per_cluster, reserved, fats, root_entries, total16 = struct.unpack_from("<HBHBHH", boot, 11)
+        fat_size16, = struct.unpack_from("<H", boot, 22)
+        total32, fat_size32, _, _, root_cluster = struct.unpack_from("<IIHHI", boot, 32)
+        if boot[510:512] != b"\x55\xaa" or bytes_per_sector not in (512, 1024, 2048, 4096) \
+                or not sectors_per_cluster or sectors_per_cluster & (sectors_per_cluster - 1) or not fats:
+            raise FilesystemError("Not a FAT filesystem")
+
+        fat_size = fat_size16 or fat_size32
+        total = total16 or total32
+        root_sectors = -(-root_entries * 32 // bytes_per_sector)
+        self.sector = bytes_per_sector
+        self.cluster_size = sectors_per_cluster * bytes_per_sector
+        self.fat_offset = reserved * bytes_per_sector
+        self.root_offset = (reserved + fats * fat_size) * bytes_per_sector
+        self.root_size = root_entries * 32
+        self.data_offset = self.root_offset + root_sectors * bytes_per_sector
+        self.clusters = (total - reserved - fats * fat_size - root_sectors) // sectors_per_cluster
+        self.fat_type = 12 if self.clusters < 4085 else 16 if self.clusters < 65525 else 32
+        root_ref = root_cluster if self.fat_type == 32 else None
+        self.root = Node("dir", 0, 0, 0, root_ref)
+
+    def next_cluster(self, cluster):
+        if self.fat_type == 12:
+            value, = struct.unpack("<H", self.read(self.fat_offset + cluster + cluster // 2, 2))
+            value = value >> 4 if cluster & 1 else value & 0xFFF
+            return value if value < 0xFF7 else None
+        if self.fat_type == 16:
+            value, = struct.unpack("<H", self.read(self.fat_offset + cluster * 2, 2))
+            return value if value < 0xFFF7 else None
+        value = struct.unpack("<I", self.read(self.fat_offset + cluster * 4, 4))[0] & 0x0FFFFFFF
+        return value if value < 0x0FFFFFF7 else None
+
+    def chain(self, cluster):
+        seen = set()
+        while cluster is not None and 2 <= cluster < self.clusters + 2 and cluster not in seen:
+            seen.add(cluster)
+            yield cluster
+            cluster = self.next_cluster(cluster)
+
+    def cluster_position(self, cluster):
+        return self.data_offset + (cluster - 2) * self.cluster_size
+
+    def runs(self, node):
+        if node.ref is None:
+            return [Run(0, self.root_size, self.root_offset)]
+        pieces = [(self.cluster_position(cluster), self.cluster_size) for cluster in self.chain(node.ref)]
+        size = node.size if node.type == "file" else len(pieces) * self.cluster_size
+        return merge_runs(pieces, size)
+
+    def read_node(self, node):
+        if node.type == "dir":
+            node = node._replace(size=sum(run.length for run in self.runs(node)))
+        return super().read_node(node)
+
+    def children(self, node):
+        data = self.read_node(node)
+        runs = self.runs(node)
+        entries = {}
+        long_name = []
+        for position in range(0, len(data) - 31, 32):
+            raw = data[position:position + 32]
+            if raw[0] == 0x00:
+                break
+            if raw[0] == 0xE5:
+                long_name = []
+                continue
+            attributes = raw[11]
+            if attributes & 0x3F == 0x0F:
+                part = (raw[1:11] + raw[14:26] + raw[28:32]).decode("utf-16-le", errors="replace")
+                part = part.split("\x00")[0]
+                long_name = [part] if raw[0] & 0x40 else [part] + long_name
+                continue
+            if attributes & 0x08:
+                long_name = []
+                continue
+
+            if long_name:
+                name = "".join(long_name)
+            else:
+                base = raw[0:8].replace(b"\x05", b"\xe5", 1).decode("cp437").rstrip()
+                extension = raw[8:11].decode("cp437").rstrip()
+                # Windows NT keeps the case of all-lowercase 8.3 names in these flags
+                base = base.lower() if raw[12] & 0x08 else base
+                extension = extension.lower() if raw[12] & 0x10 else extension
+                name = f"{base}.{extension}" if extension else base
+            long_name = []
+            if name in (".", ".."):
+                continue
+
+            cluster_high, time, date, cluster_low, size = struct.unpack_from("<HHHHI", raw, 20)
+            cluster = (cluster_high << 16 if self.fat_type == 32 else 0) | cluster_low
+            node_type = "dir" if attributes & 0x10 else "file"
+            run = runs[max(bisect_right([r.start for r in runs], position) - 1, 0)]
+            entry_position = run.physical + position - run.start
+            entries[name] = Node(node_type, size if node_type == "file" else 0, dos_timestamp(date, time),
+                                 entry_position, (cluster or None) if node_type == "dir" else cluster)
+        return entries
+
+
+class ExFatVolume(Volume):
+    case_sensitive = False
+
+    def __init__(self, data, offset, size):
+        super().__init__(data, offset, size)
+        boot = self.read(0, 512)
+        if boot[3:11] != b"EXFAT   ":
+            raise FilesystemError("Not an exFAT filesystem")
+        fat_offset, _, heap_offset, self.clusters, root_cluster = struct.unpack_from("<5I", boot, 80)
+        sector_shift, cluster_shift = boot[108], boot[109]
+        self.sector = 1 << sector_shift
+        self.cluster_size = 1 << (sector_shift + cluster_shift)
+        self.fat_offset = fat_offset * self.sector
+        self.heap_offset = heap_offset * self.sector
+        self.root = Node("dir", 0, 0, 0, (root_cluster, False, None))
+
+    def chain(self, cluster):
+        seen = set()
+        while 2 <= cluster < self.clusters + 2 and cluster not in seen:
+            seen.add(cluster)
+            yield cluster
+            cluster, = struct.unpack("<I", self.read(self.fat_offset + cluster * 4, 4))
+
+    def cluster_position(self, cluster):
+        return self.heap_offset + (cluster - 2) * self.cluster_size
+
+    def runs(self, node):
+        first, contiguous, valid = node.ref
+        if first == 0:
+            return []
+        size = node.size
+        if contiguous:
+            pieces = [(self.cluster_position(first), -(-size // self.cluster_size) * self.cluster_size)]
+        else:
+            pieces = [(self.cluster_position(cluster), self.cluster_size) for cluster in self.chain(first)]
+            if node.type == "dir" and size == 0:
+                size = len(pieces) * self.cluster_size
+        if valid is not None and valid < size:
+            # Bytes past the valid data length read as zeros
+            runs = merge_runs(pieces, valid)
+            return runs + [Run(valid, size - valid, None)]
+        return merge_runs(pieces, size)
+
+    def read_node(self, node):
+        if node.type == "dir" and node.size == 0:
+            node = node._replace(size=sum(run.length for run in self.runs(node)))
+        return super().read_node(node)
+
+    def children(self, node):
+        data = self.read_node(node)
+        runs = self.runs(node)
+        entries = {}
+        position = 0
+        while position + 32 <= len(data):
+            entry_type = data[position]
+            if entry_type == 0x00:
+                break
+            if entry_type != 0x85:
+                position += 32
+                continue
+
+            secondary_count = data[position + 1]
+            attributes, = struct.unpack_from("<H", data, position + 4)
+            timestamp, = struct.unpack_from("<I", data, position + 12)
+            stream = data[position + 32:position + 64]
+            if len(stream) < 32 or stream[0] != 0xC0:
+                position += 32
+                continue
+            flags, name_length = stream[1], stream[3]
+            valid_length, = struct.unpack_from("<Q", stream, 8)
+            first_cluster, = struct.unpack_from("<I", stream, 20)
+            data_length, = struct.unpack_from("<Q", stream, 24)
+
+            name = ""
+            for index in range(2, secondary_count + 1):
+                name_entry = data[position + index * 32:position + (index + 1) * 32]
+                if len(name_entry) == 32 and name_entry[0] == 0xC1:
+                    name += name_entry[2:32].decode("utf-16-le", errors="replace")
+            name = name[:name_length]
+
+            run = runs[max(bisect_right([r.start for r in runs], position) - 1, 0)]
+            node_type = "dir" if attributes & 0x10 else "file"
+            entries[name] = Node(node_type, data_length, dos_timestamp(timestamp >> 16, timestamp & 0xFFFF),
+                                 run.physical + position - run.start,
+                                 (first_cluster, bool(flags & 0x02), valid_length if node_type == "file" else None))
+            position += (secondary_count + 1) * 32
+        return entries
+
+
+FILESYSTEMS = [("ext", ExtVolume), ("exfat", ExFatVolume), ("fat", FatVolume)]
+# Filesystem names reported by partition_table, mapped to the reader that handles them
+FILESYSTEM_FAMILIES = {
+    "ext2": "ext", "ext3": "ext", "ext4": "ext",
+    "fat12": "fat", "fat16": "fat", "fat32": "fat",
+    "exfat": "exfat",
+}
+
+
+def open_image(image_path):
+    with open(image_path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def open_volume(image_path, offset=0, size=None, fs_type=None, data=None):
+    data = data if data is not None else open_image(image_path)
+    size = size if size is not None else len(data) - offset
+    errors = []
+    for name, volume_class in FILESYSTEMS:
+        if fs_type and fs_type != name:
+            continue
+        try:
+            return volume_class(data, offset, size)
+        except (FilesystemError, struct.error) as e:
+            errors.append(f"{name}: {e}")
+    raise FilesystemError(f"No supported filesystem at offset {offset} of {image_path} ({'; '.join(errors)})")
+
+
+def probe(image_path, offset=0, size=None):
+    # Returns the filesystem name found at offset, or None
+    try:
+        volume = open_volume(image_path, offset, size)
+    except (FilesystemError, ValueError):
+        return None
+    return next(name for name, volume_class in FILESYSTEMS if type(volume) is volume_class)
+
+
+# Registry of virtual roots; worker processes receive it through register_all
+_volumes = {}
+_opened = {}
+_lock = threading.Lock()
+
+
+def register(root, image_path, offset=0, size=None, fs_type=None):
+    with _lock:
+        _volumes[root] = (os.path.realpath(image_path), offset, size, fs_type)
+
+
+def register_all(volumes):
+    for root, arguments in volumes.items():
+        register(root, *arguments)
+
+
+def registered():
+    with _lock:
+        return dict(_volumes)
+
+
+def unregister(root):
+    with _lock:
+        _volumes.pop(root, None)
+        _opened.pop(root, None)
+
+
+def is_virtual(path):
+    return resolve_root(path) is not None
+
+
+def resolve_root(path):
+    if not _volumes or not str(path).startswith(USERSPACE_ROOT):
+        return None
+    path = posixpath.normpath(str(path))
+    for root in _volumes:
+        if path == root or path.startswith(root + "/"):
+            return root
+    return None
+
+
+def volume_for(root):
+    with _lock:
+        volume = _opened.get(root)
+        if volume is None:
+            image_path, offset, size, fs_type = _volumes[root]
+            volume = _opened[root] = open_volume(image_path, offset, size, fs_type)
+        return volume
+
+
+def resolve(path):
+    root = resolve_root(path)
+    if root is None:
+        return None, None
+    volume = volume_for(root)
+    relative = posixpath.relpath(posixpath.normpath(str(path)), root)
+    return volume, volume.lookup("" if relative == "." else relative)
+
+
+class VolumeFile(io.RawIOBase):
+    def __init__(self, volume, node):
+        self.volume = volume
+        self.node = node
+        self.file_runs = volume.runs(node)
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.node.size}[whence]
+        self.position = max(base + offset, 0)
+        return self.position
+
+    def readinto(self, buffer):
+        size = min(len(buffer), max(self.node.size - self.position, 0))
+        data = self.volume.read_runs(self.file_runs, self.position, size)
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+def scandir(path):
+    volume, node = resolve(path)
+    if node.type != "dir":
+        raise NotADirectoryError(path)
+    for name, child in sorted(volume.listing(node).items()):
+        if child.type in ("dir", "file", "symlink"):
+            yield DirEntry(name, posixpath.join(str(path), name), child.type, child.size, child.mtime, child.inode)
+
+
+def open_file(path, mode="rb", encoding=None, errors=None):
+    if not is_virtual(path):
+        return open(path, mode, encoding=encoding, errors=errors)
+    if any(flag in mode for flag in "wax+"):
+        raise PermissionError(f"Read-only filesystem: {path}")
+    volume, node = resolve(path)
+    if node.type == "dir":
+        raise IsADirectoryError(path)
+    raw = io.BufferedReader(VolumeFile(volume, node), buffer_size=1024 * 1024)
+    if "b" in mode:
+        return raw
+    return io.TextIOWrapper(raw, encoding=encoding or "utf-8", errors=errors)
+
+
+@contextlib.contextmanager
+def local_path(path):
+    # For libraries that need a real file (sqlite, OpenCV, mailbox): virtual files are copied to the scratch dir
+    if not is_virtual(path):
+        yield path
+        return
+    os.makedirs(SCRATCH_DIR, exist_ok=True)
+    handle, copy_path = tempfile.mkstemp(suffix=os.path.splitext(str(path))[1], dir=SCRATCH_DIR)
+    try:
+        with open_file(path) as source, os.fdopen(handle, "wb") as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+        yield copy_path
+    finally:
+        try:
+            os.remove(copy_path)
+        except OSError:
+            pass
+
+
+def stat_node(path):
+    try:
+        return resolve(path)[1]
+    except (OSError, KeyError):
+        return None
+
+
+def exists(path):
+    if not is_virtual(path):
+        return os.path.exists(path)
+    return stat_node(path) is not None
+
+
+def isdir(path):
+    if not is_virtual(path):
+        return os.path.isdir(path)
+    node = stat_node(path)
+    return node is not None and node.type == "dir"
+
+
+def isfile(path):
+    if not is_virtual(path):
+        return os.path.isfile(path)
+    node = stat_node(path)
+    return node is not None and node.type == "file"
+
+
+def getsize(path):
+    if not is_virtual(path):
+        return os.path.getsize(path)
+    node = stat_node(path)
+    if node is None:
+        raise FileNotFoundError(path)
+    return node.size
+
+
+def listdir(path):
+    if not is_virtual(path):
+        return os.listdir(path)
+    return [entry.name for entry in scandir(path)]